@@ -0,0 +1,366 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+
+from oslo_serialization import jsonutils
+
+from octavia_lib.api.drivers import data_models
+from octavia_lib.api.drivers import driver_lib
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.api.drivers import readiness
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+
+class AsyncDriverLibrary():
+    """Asyncio version of the DriverLibrary.
+
+    The status and statistics updates and the get methods of DriverLibrary
+    are available as coroutines with the same arguments, return values and
+    exceptions. The same driver agent sockets and JSON message framing are
+    used. The submit_* methods are not provided, as the coroutines can
+    already run concurrently, and neither are iter_nested() and iter_many().
+    The other DriverLibrary options, like caching, connection reuse, lanes
+    or the spool, are not supported either.
+
+    Unlike DriverLibrary the constructor does not wait for the driver agent
+    sockets, await wait_for_driver_agent() for that.
+    """
+
+    def __init__(self, status_socket=driver_lib.DEFAULT_STATUS_SOCKET,
+                 stats_socket=driver_lib.DEFAULT_STATS_SOCKET,
+                 get_socket=driver_lib.DEFAULT_GET_SOCKET, **kwargs):
+        self.status_socket = status_socket
+        self.stats_socket = stats_socket
+        self.get_socket = get_socket
+
+        super().__init__(**kwargs)
+
+    async def wait_for_driver_agent(
+            self, timeout=driver_lib.DRIVER_AGENT_READY_TIMEOUT):
+        """Wait for the driver agent sockets to be available.
+
+        Returns as soon as the last socket appears. The wait runs in the
+        default executor of the event loop.
+
+        :param timeout: Seconds to wait at most.
+        :type timeout: float
+        :raises DriverAgentNotFound: The sockets did not appear in time.
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None, readiness.wait_for_sockets,
+            [self.status_socket, self.stats_socket, self.get_socket],
+            timeout)
+
+    async def _recv(self, reader):
+        try:
+            size_str = await reader.readuntil(framing.HEADER_TERMINATOR)
+            payload = await reader.readexactly(int(size_str))
+        except asyncio.IncompleteReadError as e:
+            raise ConnectionResetError(
+                _('The driver agent closed the connection.')) from e
+        return jsonutils.loads(payload)
+
+    async def _exchange(self, socket_path, data):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(socket_path),
+            driver_lib.SOCKET_TIMEOUT)
+        try:
+            payload = jsonutils.dump_as_bytes(data)
+            writer.writelines([framing.encode_header(len(payload)), payload])
+            await writer.drain()
+            return await self._recv(reader)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def _send(self, socket_path, data, timeout=None):
+        # One deadline for connecting, sending and receiving.
+        if timeout is None:
+            timeout = driver_lib.DRIVER_AGENT_TIMEOUT
+        try:
+            return await asyncio.wait_for(self._exchange(socket_path, data),
+                                          timeout)
+        except asyncio.TimeoutError as e:
+            raise driver_exceptions.DriverAgentTimeout(
+                fault_string=('The driver agent did not respond in {} '
+                              'seconds.'.format(timeout))) from e
+
+    async def update_loadbalancer_status(self, status, timeout=None,
+                                         loadbalancer_id=None):
+        """Update load balancer status.
+
+        See DriverLibrary.update_loadbalancer_status.
+
+        :param status: dictionary defining the provisioning status and
+            operating status for load balancer objects.
+        :type status: dict
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :param loadbalancer_id: Accepted for compatibility with
+          DriverLibrary. There is a single driver agent endpoint, so the
+          update is not routed by it.
+        :type loadbalancer_id: UUID string
+        :raises: UpdateStatusError
+        :returns: None
+        """
+        try:
+            response = await self._send(self.status_socket, status, timeout)
+        except Exception as e:
+            raise driver_exceptions.UpdateStatusError(fault_string=str(e))
+
+        driver_lib.check_status_response(response)
+
+    async def update_listener_statistics(self, statistics, timeout=None,
+                                         loadbalancer_id=None):
+        """Update listener statistics.
+
+        See DriverLibrary.update_listener_statistics.
+
+        :param statistics: Statistics for listeners.
+        :type statistics: dict
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :param loadbalancer_id: Accepted for compatibility with
+          DriverLibrary. There is a single driver agent endpoint, so the
+          update is not routed by it.
+        :type loadbalancer_id: UUID string
+        :raises: UpdateStatisticsError
+        :returns: None
+        """
+        try:
+            response = await self._send(self.stats_socket, statistics,
+                                        timeout)
+        except Exception as e:
+            raise driver_exceptions.UpdateStatisticsError(
+                fault_string=str(e), stats_object=constants.LISTENERS)
+
+        driver_lib.check_statistics_response(response)
+
+    async def _get_resource(self, resource, id, timeout=None):
+        try:
+            return await self._send(self.get_socket,
+                                    {constants.OBJECT: resource,
+                                     constants.ID: id}, timeout)
+        except driver_exceptions.DriverAgentTimeout:
+            raise
+        except Exception as e:
+            raise driver_exceptions.DriverError() from e
+
+    async def _get_object(self, resource, model, id, timeout):
+        data = await self._get_resource(resource, id, timeout)
+        if data:
+            return model.from_dict(data)
+        return None
+
+    async def get_loadbalancer(self, loadbalancer_id, timeout=None):
+        """Get a load balancer object.
+
+        :param loadbalancer_id: The load balancer ID to lookup.
+        :type loadbalancer_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A LoadBalancer object or None if not found.
+        """
+        return await self._get_object(constants.LOADBALANCERS,
+                                      data_models.LoadBalancer,
+                                      loadbalancer_id, timeout)
+
+    async def get_loadbalancer_tree(self, loadbalancer_id, depth=None,
+                                    timeout=None):
+        """Get a load balancer with its nested objects built.
+
+        See DriverLibrary.get_loadbalancer_tree.
+        """
+        data = await self._get_resource(constants.LOADBALANCERS,
+                                        loadbalancer_id, timeout)
+        if data:
+            return driver_lib.hydrate_loadbalancer_tree(data, depth)
+        return None
+
+    async def get_listener(self, listener_id, timeout=None):
+        """Get a listener object.
+
+        :param listener_id: The listener ID to lookup.
+        :type listener_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A Listener object or None if not found.
+        """
+        return await self._get_object(constants.LISTENERS,
+                                      data_models.Listener, listener_id,
+                                      timeout)
+
+    async def get_pool(self, pool_id, timeout=None):
+        """Get a pool object.
+
+        :param pool_id: The pool ID to lookup.
+        :type pool_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A Pool object or None if not found.
+        """
+        return await self._get_object(constants.POOLS, data_models.Pool,
+                                      pool_id, timeout)
+
+    async def get_healthmonitor(self, healthmonitor_id, timeout=None):
+        """Get a health monitor object.
+
+        :param healthmonitor_id: The health monitor ID to lookup.
+        :type healthmonitor_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A HealthMonitor object or None if not found.
+        """
+        return await self._get_object(constants.HEALTHMONITORS,
+                                      data_models.HealthMonitor,
+                                      healthmonitor_id, timeout)
+
+    async def get_member(self, member_id, timeout=None):
+        """Get a member object.
+
+        :param member_id: The member ID to lookup.
+        :type member_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A Member object or None if not found.
+        """
+        return await self._get_object(constants.MEMBERS, data_models.Member,
+                                      member_id, timeout)
+
+    async def get_l7policy(self, l7policy_id, timeout=None):
+        """Get a L7 policy object.
+
+        :param l7policy_id: The L7 policy ID to lookup.
+        :type l7policy_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A L7Policy object or None if not found.
+        """
+        return await self._get_object(constants.L7POLICIES,
+                                      data_models.L7Policy, l7policy_id,
+                                      timeout)
+
+    async def get_l7rule(self, l7rule_id, timeout=None):
+        """Get a L7 rule object.
+
+        :param l7rule_id: The L7 rule ID to lookup.
+        :type l7rule_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A L7Rule object or None if not found.
+        """
+        return await self._get_object(constants.L7RULES, data_models.L7Rule,
+                                      l7rule_id, timeout)
+
+    async def _get_resources(self, resource, ids, timeout=None):
+        try:
+            return await self._send(self.get_socket,
+                                    {constants.OBJECT: resource,
+                                     constants.IDS: ids}, timeout)
+        except driver_exceptions.DriverAgentTimeout:
+            raise
+        except Exception as e:
+            raise driver_exceptions.DriverError() from e
+
+    async def get_many(self, resource, ids, timeout=None):
+        """Get several objects of one type in a single request.
+
+        See DriverLibrary.get_many.
+
+        :param resource: The object type, for example constants.MEMBERS.
+        :type resource: string
+        :param ids: The object IDs to lookup.
+        :type ids: list of UUID strings
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT.
+        :type timeout: float
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A list with, for each ID in order, the object or None if
+          not found.
+        """
+        model = driver_lib.RESOURCE_MODELS[resource]
+        ids = list(ids)
+        if not ids:
+            return []
+        data = await self._get_resources(resource, ids, timeout)
+        return driver_lib.hydrate_many(model, ids, data)
+
+    async def get_loadbalancers(self, loadbalancer_ids, timeout=None):
+        """Get load balancer objects. See get_many."""
+        return await self.get_many(constants.LOADBALANCERS, loadbalancer_ids,
+                                   timeout=timeout)
+
+    async def get_listeners(self, listener_ids, timeout=None):
+        """Get listener objects. See get_many."""
+        return await self.get_many(constants.LISTENERS, listener_ids,
+                                   timeout=timeout)
+
+    async def get_pools(self, pool_ids, timeout=None):
+        """Get pool objects. See get_many."""
+        return await self.get_many(constants.POOLS, pool_ids,
+                                   timeout=timeout)
+
+    async def get_healthmonitors(self, healthmonitor_ids, timeout=None):
+        """Get health monitor objects. See get_many."""
+        return await self.get_many(constants.HEALTHMONITORS,
+                                   healthmonitor_ids,
+                                   timeout=timeout)
+
+    async def get_members(self, member_ids, timeout=None):
+        """Get member objects. See get_many."""
+        return await self.get_many(constants.MEMBERS, member_ids,
+                                   timeout=timeout)
+
+    async def get_l7policies(self, l7policy_ids, timeout=None):
+        """Get L7 policy objects. See get_many."""
+        return await self.get_many(constants.L7POLICIES, l7policy_ids,
+                                   timeout=timeout)
+
+    async def get_l7rules(self, l7rule_ids, timeout=None):
+        """Get L7 rule objects. See get_many."""
+        return await self.get_many(constants.L7RULES, l7rule_ids,
+                                   timeout=timeout)
@@ -0,0 +1,253 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import itertools
+import threading
+import time
+
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+# Returned by LookupCache.get() when nothing usable is cached.
+MISS = object()
+
+# The field of each object type that references its parent object.
+PARENT_REFERENCES = {
+    constants.LISTENERS: ((constants.LOADBALANCER_ID,
+                           constants.LOADBALANCERS),),
+    constants.POOLS: ((constants.LOADBALANCER_ID, constants.LOADBALANCERS),
+                      (constants.LISTENER_ID, constants.LISTENERS)),
+    constants.MEMBERS: ((constants.POOL_ID, constants.POOLS),),
+    constants.HEALTHMONITORS: ((constants.POOL_ID, constants.POOLS),),
+    constants.L7POLICIES: ((constants.LISTENER_ID, constants.LISTENERS),),
+    constants.L7RULES: ((constants.L7POLICY_ID, constants.L7POLICIES),),
+}
+
+# The object type and ID field of the objects nested under each key of a
+# get response, a load balancer tree for example.
+NESTED_OBJECTS = {
+    constants.LISTENERS: (constants.LISTENERS, constants.LISTENER_ID),
+    constants.POOLS: (constants.POOLS, constants.POOL_ID),
+    constants.DEFAULT_POOL: (constants.POOLS, constants.POOL_ID),
+    constants.MEMBERS: (constants.MEMBERS, constants.MEMBER_ID),
+    constants.HEALTHMONITOR: (constants.HEALTHMONITORS,
+                              constants.HEALTHMONITOR_ID),
+    constants.L7POLICIES: (constants.L7POLICIES, constants.L7POLICY_ID),
+    constants.RULES: (constants.L7RULES, constants.L7RULE_ID),
+}
+
+# The object types an object type may be nested in, directly or not.
+ANCESTORS = {
+    constants.LISTENERS: (constants.LOADBALANCERS,),
+    constants.POOLS: (constants.LISTENERS, constants.LOADBALANCERS),
+    constants.MEMBERS: (constants.POOLS, constants.LISTENERS,
+                        constants.LOADBALANCERS),
+    constants.HEALTHMONITORS: (constants.POOLS, constants.LISTENERS,
+                               constants.LOADBALANCERS),
+    constants.L7POLICIES: (constants.LISTENERS, constants.LOADBALANCERS),
+    constants.L7RULES: (constants.L7POLICIES, constants.LISTENERS,
+                        constants.LOADBALANCERS),
+}
+
+# Parent links remembered for each object the cache can hold.
+LINKS_PER_ENTRY = 10
+
+
+class LookupCache():
+    """A bounded, expiring cache of driver agent get responses.
+
+    Entries are evicted least recently used first once max_size entries are
+    cached, and expire after the TTL of their object type. Objects that were
+    not found are cached too, for negative_ttl seconds.
+
+    Cached responses are shared between callers, so the objects built from
+    them must be treated as read-only.
+
+    A response fetched while its object is invalidated may predate the
+    change. Read generation() before fetching and pass it to put(), which
+    then leaves out a response invalidated meanwhile.
+
+    :param max_size: Maximum number of cached objects.
+    :type max_size: int
+    :param ttl: Seconds an object stays cached, either one value for all
+      object types or a dictionary keyed by object type. Object types
+      missing from the dictionary are not cached.
+    :type ttl: float or dict
+    :param negative_ttl: Seconds a not found result stays cached. Defaults
+      to the TTL of the object type.
+    :type negative_ttl: float
+    """
+
+    def __init__(self, max_size, ttl, negative_ttl=None):
+        if max_size < 1:
+            raise ValueError(_('max_size must be at least 1.'))
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        # (object type, ID) to the set of (object type, ID) of its parents,
+        # learned from the cached responses and kept after they expire.
+        self._parents = collections.OrderedDict()
+        # Invalidation generations, of the objects invalidated and of the
+        # object types invalidated as a whole, drawn from one counter. An
+        # object forgotten to stay bounded gets the latest generation
+        # forgotten, newer than any read before its invalidation.
+        self._counter = itertools.count(1)
+        self._generations = collections.OrderedDict()
+        self._type_generations = {}
+        self._forgotten = 0
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def _ttl_for(self, resource, data):
+        if isinstance(self.ttl, dict):
+            ttl = self.ttl.get(resource)
+        else:
+            ttl = self.ttl
+        if ttl and not data and self.negative_ttl is not None:
+            return self.negative_ttl
+        return ttl
+
+    def get(self, resource, id):
+        """Look up a cached object.
+
+        :returns: The cached response, None for a cached not found result or
+          MISS if nothing usable is cached.
+        """
+        key = (resource, id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def generation(self, resource, id):
+        """Return the invalidation generation of an object, see put()."""
+        with self._lock:
+            return self._generation(resource, id)
+
+    def _generation(self, resource, id):
+        # Called with the lock held.
+        return (self._epoch,
+                self._generations.get((resource, id), self._forgotten),
+                self._type_generations.get(resource, 0))
+
+    def put(self, resource, id, data, generation=None):
+        """Cache a get response, an empty response meaning not found.
+
+        :param generation: What generation() returned before the response
+          was fetched. The response is not cached if the object was
+          invalidated since.
+        """
+        ttl = self._ttl_for(resource, data)
+        if not ttl:
+            return
+        with self._lock:
+            if (generation is not None and
+                    generation != self._generation(resource, id)):
+                return
+            self._entries[(resource, id)] = (time.monotonic() + ttl,
+                                             data or None)
+            self._entries.move_to_end((resource, id))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            if data:
+                self._learn(resource, id, data)
+
+    def _link(self, child, parent):
+        # Called with the lock held.
+        parents = self._parents.get(child)
+        if parents is None:
+            parents = self._parents[child] = set()
+            while len(self._parents) > self.max_size * LINKS_PER_ENTRY:
+                self._parents.popitem(last=False)
+        else:
+            self._parents.move_to_end(child)
+        parents.add(parent)
+
+    def _learn(self, resource, id, data):
+        # Called with the lock held. Remembers the parents referenced by an
+        # object, and the objects nested in it.
+        for field, parent in PARENT_REFERENCES.get(resource, ()):
+            parent_id = data.get(field)
+            if parent_id:
+                self._link((resource, id), (parent, parent_id))
+        for key, (child_resource, id_field) in NESTED_OBJECTS.items():
+            children = data.get(key)
+            if isinstance(children, dict):
+                children = [children]
+            if not isinstance(children, list):
+                continue
+            for child in children:
+                if isinstance(child, dict) and child.get(id_field):
+                    self._link((child_resource, child[id_field]),
+                               (resource, id))
+                    self._learn(child_resource, child[id_field], child)
+
+    def invalidate(self, resource, id):
+        """Drop an object and the cached objects above it.
+
+        The parents are found through the references held by the objects
+        cached so far, and the objects nested in them, whether they are
+        still cached or not. Invalidating a member drops its pool and the
+        load balancer of that pool, even if the member itself was never
+        cached. When the parents of an object are not known, every cached
+        object of a type it may be nested in is dropped.
+        """
+        with self._lock:
+            self._invalidate(resource, id, set())
+
+    def _invalidate(self, resource, id, seen):
+        key = (resource, id)
+        if key in seen:
+            return
+        seen.add(key)
+        self._entries.pop(key, None)
+        self._generations[key] = next(self._counter)
+        self._generations.move_to_end(key)
+        while len(self._generations) > self.max_size * LINKS_PER_ENTRY:
+            self._forgotten = self._generations.popitem(last=False)[1]
+        parents = self._parents.get(key)
+        if parents:
+            for parent in list(parents):
+                self._invalidate(*parent, seen)
+        elif ANCESTORS.get(resource):
+            ancestors = ANCESTORS[resource]
+            for ancestor in ancestors:
+                self._type_generations[ancestor] = next(self._counter)
+            for cached in [cached for cached in self._entries
+                           if cached[0] in ancestors]:
+                del self._entries[cached]
+
+    def clear(self):
+        """Drop every cached object."""
+        with self._lock:
+            self._entries.clear()
+            self._parents.clear()
+            self._generations.clear()
+            self._type_generations.clear()
+            self._forgotten = 0
+            self._epoch += 1
+
+    def stats(self):
+        """Return the hit, miss and size counters."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries)}
@@ -0,0 +1,133 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import threading
+import time
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.i18n import _
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HALF_OPEN = 'HALF_OPEN'
+
+
+def is_failure(error):
+    """Return True if error means the driver agent is unavailable.
+
+    Missing sockets, connection errors and timeouts are failures. Any other
+    error, an invalid response for example, means the driver agent did
+    answer.
+    """
+    return isinstance(error, (driver_exceptions.DriverAgentNotFound,
+                              driver_exceptions.DriverAgentTimeout,
+                              OSError))
+
+
+class CircuitBreaker():
+    """Fails calls fast while a driver agent socket is unavailable.
+
+    The breaker starts CLOSED and lets every call through. After
+    failure_threshold consecutive failed calls it opens and before_call()
+    raises right away, DriverAgentTimeout if the last failure was a timeout
+    and DriverAgentNotFound otherwise. reset_timeout seconds later it turns
+    HALF_OPEN and lets a single probe call through, the others still fail
+    fast. The breaker closes again if the probe succeeds and opens for
+    another reset_timeout if it fails.
+
+    :param name: What the breaker protects, used in error messages.
+    :type name: string
+    :param failure_threshold: Consecutive failures that open the breaker.
+    :type failure_threshold: int
+    :param reset_timeout: Seconds to stay open before probing.
+    :type reset_timeout: float
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        if failure_threshold < 1:
+            raise ValueError(_('failure_threshold must be at least 1.'))
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._last_error = None
+        self._opened_at = None
+        self._probing = False
+        self._transitions = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        # Called with the lock held.
+        self.state = state
+        self._transitions[state] += 1
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def before_call(self):
+        """Let a call through, or fail it fast.
+
+        A call that is let through must be followed by after_call().
+
+        :raises DriverAgentNotFound: The breaker is open.
+        :raises DriverAgentTimeout: The breaker is open after timeouts.
+        """
+        with self._lock:
+            if (self.state == OPEN and
+                    time.monotonic() - self._opened_at >= self.reset_timeout):
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self._rejected += 1
+            last_error = self._last_error
+        fault_string = ('The driver agent {} is unavailable, failing fast '
+                        'after {} consecutive failures: {}'.format(
+                            self.name, self.failure_threshold, last_error))
+        if isinstance(last_error, (driver_exceptions.DriverAgentTimeout,
+                                   socket.timeout)):
+            raise driver_exceptions.DriverAgentTimeout(
+                fault_string=fault_string)
+        raise driver_exceptions.DriverAgentNotFound(fault_string=fault_string)
+
+    def after_call(self, error=None):
+        """Record the outcome of a call let through by before_call()."""
+        with self._lock:
+            if error is None or not is_failure(error):
+                self._failures = 0
+                if self.state != CLOSED:
+                    self._transition(CLOSED)
+                return
+            self._failures += 1
+            self._last_error = error
+            if (self.state == HALF_OPEN or
+                    (self.state == CLOSED and
+                     self._failures >= self.failure_threshold)):
+                self._transition(OPEN)
+
+    def stats(self):
+        """Return the state and counters, for monitoring.
+
+        :returns: A dictionary with the state, the consecutive failures,
+          the number of calls failed fast and, for each state, how many
+          times the breaker entered it.
+        """
+        with self._lock:
+            return {'state': self.state,
+                    'consecutive_failures': self._failures,
+                    'rejected': self._rejected,
+                    'transitions': dict(self._transitions)}
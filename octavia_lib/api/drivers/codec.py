@@ -0,0 +1,183 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Payload codecs for the driver agent protocol.
+
+JSON is the driver agent protocol default and needs no negotiation. Other
+codecs are agreed per connection with a hello exchange, sent as the first
+frame of the connection and always encoded as JSON::
+
+    {"hello": {"versions": [1], "codecs": ["msgpack", "json"]}}
+
+The driver agent answers with the protocol version and codec it picked from
+the offered ones, and every following frame on that connection uses it::
+
+    {"hello": {"version": 1, "codec": "msgpack"}}
+
+The hello request may also offer compression, "compression": ["zlib"]. The
+driver agent accepts it with "compression": "zlib" in its answer, and may
+then send compressed frames too. See framing for the compressed frames.
+"""
+
+from oslo_serialization import jsonutils
+from oslo_serialization import msgpackutils
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.i18n import _
+
+PROTOCOL_VERSION = 1
+SUPPORTED_PROTOCOL_VERSIONS = (PROTOCOL_VERSION,)
+
+HELLO = 'hello'
+VERSIONS = 'versions'
+VERSION = 'version'
+CODECS = 'codecs'
+CODEC = 'codec'
+COMPRESSION = 'compression'
+ZLIB = 'zlib'
+
+
+class JSONCodec():
+    """The default JSON codec."""
+
+    name = 'json'
+
+    @staticmethod
+    def dumps(data):
+        return jsonutils.dump_as_bytes(data)
+
+    @staticmethod
+    def loads(payload):
+        # Decode straight from the receive buffer, bytes(payload) would copy
+        # it first.
+        return jsonutils.loads(str(payload, 'utf-8'))
+
+
+class MsgPackCodec():
+    """A compact binary codec, smaller and faster to parse than JSON."""
+
+    name = 'msgpack'
+
+    @staticmethod
+    def dumps(data):
+        return msgpackutils.dumps(data)
+
+    @staticmethod
+    def loads(payload):
+        return msgpackutils.loads(payload)
+
+
+JSON = JSONCodec()
+MSGPACK = MsgPackCodec()
+SUPPORTED_CODECS = {codec.name: codec for codec in (JSON, MSGPACK)}
+
+
+def get_codec(name):
+    """Return the codec called name.
+
+    :raises ValueError: The codec is not supported.
+    """
+    try:
+        return SUPPORTED_CODECS[name]
+    except KeyError as e:
+        raise ValueError(_('Unsupported codec: {}').format(name)) from e
+
+
+class WireFormat():
+    """The codec and compression agreed for one connection.
+
+    :param codec: The payload codec.
+    :param compression_threshold: Compress encoded payloads of at least
+      this many bytes. None disables compression.
+    :type compression_threshold: int
+    """
+
+    def __init__(self, codec, compression_threshold=None):
+        self.codec = codec
+        self.compression_threshold = compression_threshold
+
+    def encode(self, data, fields=None):
+        """Encode, and compress if large enough, a message.
+
+        :returns: A (payload, header fields) tuple for framing.send_frame.
+        """
+        payload = self.codec.dumps(data)
+        if (self.compression_threshold is not None and
+                len(payload) >= self.compression_threshold):
+            return framing.compress(payload, fields)
+        return payload, fields
+
+    def decode(self, payload):
+        """Decode a received, already decompressed, payload."""
+        return self.codec.loads(payload)
+
+
+DEFAULT_WIRE_FORMAT = WireFormat(JSON)
+
+
+def hello_request(names, compression=False):
+    hello = {VERSIONS: list(SUPPORTED_PROTOCOL_VERSIONS),
+             CODECS: list(names)}
+    if compression:
+        hello[COMPRESSION] = [ZLIB]
+    return {HELLO: hello}
+
+
+def check_hello_response(names, response):
+    """Return the codec a driver agent picked in its hello response.
+
+    :param names: The codec names offered in the hello request.
+    :param response: The decoded hello response.
+    :raises DriverError: The driver agent picked a protocol version or a
+      codec that was not offered.
+    """
+    try:
+        hello = response[HELLO]
+        version = hello[VERSION]
+        name = hello[CODEC]
+    except (KeyError, TypeError):
+        version = name = None
+    if version not in SUPPORTED_PROTOCOL_VERSIONS or name not in names:
+        raise driver_exceptions.DriverError(
+            operator_fault_string=(
+                'The driver agent returned an invalid hello response: '
+                '{}'.format(response)))
+    return SUPPORTED_CODECS[name]
+
+
+def negotiate(sock, names, timeout, compression_threshold=None):
+    """Agree on a wire format with the driver agent at the other end of sock.
+
+    Must be called before any other frame is sent on the connection. A
+    connection for which only JSON without compression is offered needs no
+    negotiation, so nothing is sent in that case.
+
+    :param sock: A freshly connected stream socket.
+    :param names: The acceptable codec names, preferred first.
+    :type names: list
+    :param timeout: Seconds to wait for the response.
+    :param compression_threshold: Offer zlib compression, applied to
+      payloads of at least this many bytes. None does not offer it.
+    :type compression_threshold: int
+    :raises DriverError: The driver agent answered with an invalid response.
+    :returns: The WireFormat to use on this connection.
+    """
+    names = list(names)
+    if names == [JSON.name] and compression_threshold is None:
+        return DEFAULT_WIRE_FORMAT
+    compression = compression_threshold is not None
+    framing.send_frame(sock, JSON.dumps(hello_request(names, compression)))
+    response = JSON.loads(framing.recv_frame(sock, timeout))
+    wire_codec = check_hello_response(names, response)
+    if compression and response[HELLO].get(COMPRESSION) == ZLIB:
+        return WireFormat(wire_codec, compression_threshold)
+    return WireFormat(wire_codec)
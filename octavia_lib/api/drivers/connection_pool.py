@@ -0,0 +1,149 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import socket
+import threading
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import timeouts
+from octavia_lib.i18n import _
+
+
+class ConnectionPool():
+    """A bounded pool of persistent connections to a driver agent socket.
+
+    At most max_size connections are open at any time. Idle connections are
+    kept for reuse and are checked for liveness before being handed out
+    again, so a connection the driver agent closed while it was idle is
+    silently replaced with a new one.
+
+    :param socket_path: Path to the driver agent unix socket.
+    :type socket_path: string
+    :param max_size: Maximum number of connections kept open.
+    :type max_size: int
+    :param socket_timeout: Timeout, in seconds, applied to each socket.
+    :type socket_timeout: int
+    :param acquire_timeout: Time, in seconds, to wait for a free connection
+      when max_size connections are already in use.
+    :type acquire_timeout: int
+    """
+
+    def __init__(self, socket_path, max_size, socket_timeout,
+                 acquire_timeout):
+        if max_size < 1:
+            raise ValueError(_('max_size must be at least 1.'))
+        self.socket_path = socket_path
+        self.max_size = max_size
+        self.socket_timeout = socket_timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self, deadline=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.socket_timeout if deadline is None
+                            else deadline.socket_timeout(self.socket_timeout))
+            sock.connect(self.socket_path)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _is_alive(sock):
+        # An idle connection should have nothing to read. A zero length read
+        # means the driver agent closed it, and pending data means the
+        # stream is out of sync with our requests. Either way it is unusable.
+        # A socket with a timeout waits for data before reading, even with
+        # MSG_DONTWAIT, so it is made non blocking for the check.
+        timeout = sock.gettimeout()
+        sock.setblocking(False)
+        try:
+            sock.recv(1, socket.MSG_PEEK)
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        finally:
+            sock.settimeout(timeout)
+        return False
+
+    def acquire(self, timeout=None):
+        """Get a connection from the pool.
+
+        :param timeout: Seconds to wait for a free connection and to open a
+          new one. Defaults to acquire_timeout to wait, and socket_timeout
+          to connect.
+        :type timeout: float
+        :raises DriverAgentTimeout: No connection became free in time.
+        :returns: A (socket, reused) tuple where reused is True if the socket
+          was previously used for another request.
+        """
+        deadline = None
+        if timeout is None:
+            timeout = self.acquire_timeout
+        else:
+            deadline = timeouts.Deadline(timeout)
+        # The slot is held until the connection is released or discarded.
+        acquired = self._slots.acquire(  # pylint: disable=consider-using-with
+            timeout=timeout)
+        if not acquired:
+            raise driver_exceptions.DriverAgentTimeout(
+                fault_string=('No connection to {} became available in {} '
+                              'seconds.'.format(self.socket_path, timeout)))
+        try:
+            while True:
+                with self._lock:
+                    sock = self._idle.pop() if self._idle else None
+                if sock is None:
+                    return self._connect(deadline), False
+                if self._is_alive(sock):
+                    return sock, True
+                sock.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, sock):
+        """Return a healthy connection to the pool for reuse."""
+        with self._lock:
+            self._idle.append(sock)
+        self._slots.release()
+
+    def discard(self, sock):
+        """Close a connection that is broken or in an unknown state."""
+        try:
+            sock.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def after_fork(self):
+        """Let go of the parent's connections in a forked child process.
+
+        The idle connections are closed in the child only, the parent keeps
+        using them, and the pool starts over empty. The lock and the slots
+        are replaced, threads of the parent may have held them.
+        """
+        idle, self._idle = self._idle, collections.deque()
+        for sock in idle:
+            sock.close()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
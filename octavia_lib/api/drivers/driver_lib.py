@@ -12,102 +12,964 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from concurrent import futures
+import functools
 import os
 import socket
+import threading
 import time
+import weakref
 
-from oslo_serialization import jsonutils
-import tenacity
-
+from octavia_lib.api.drivers import cache
+from octavia_lib.api.drivers import circuit_breaker
+from octavia_lib.api.drivers import codec as codec_lib
+from octavia_lib.api.drivers import connection_pool
 from octavia_lib.api.drivers import data_models
 from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.api.drivers import lanes
+from octavia_lib.api.drivers import metrics as metrics_lib
+from octavia_lib.api.drivers import multiplex as multiplex_lib
+from octavia_lib.api.drivers import readiness
+from octavia_lib.api.drivers import sharding
+from octavia_lib.api.drivers import spool as spool_lib
+from octavia_lib.api.drivers import status_dedupe
+from octavia_lib.api.drivers import streaming
+from octavia_lib.api.drivers import timeouts
 from octavia_lib.common import constants
+from octavia_lib.i18n import _
 
 DEFAULT_STATUS_SOCKET = '/var/run/octavia/status.sock'
 DEFAULT_STATS_SOCKET = '/var/run/octavia/stats.sock'
+# The get socket answers {"object": <resource>, "id": <id>} with the object
+# as a dict, or an empty dict if it does not exist. Bulk lookups send
+# {"object": <resource>, "ids": [<id>, ...]} instead and the driver agent
+# answers with a list holding, in request order, the object dict for each id
+# or an empty dict (or null) for ids that do not exist. Bulk lookups require
+# a driver agent that supports them.
 DEFAULT_GET_SOCKET = '/var/run/octavia/get.sock'
 SOCKET_TIMEOUT = 5
 DRIVER_AGENT_TIMEOUT = 30
+# The lowest timeout in adaptive timeout mode.
+MIN_ADAPTIVE_TIMEOUT = 1
+# How long to wait for the driver agent sockets to appear.
+DRIVER_AGENT_READY_TIMEOUT = 140
+
+RESOURCE_MODELS = {
+    constants.LOADBALANCERS: data_models.LoadBalancer,
+    constants.LISTENERS: data_models.Listener,
+    constants.POOLS: data_models.Pool,
+    constants.HEALTHMONITORS: data_models.HealthMonitor,
+    constants.MEMBERS: data_models.Member,
+    constants.L7POLICIES: data_models.L7Policy,
+    constants.L7RULES: data_models.L7Rule,
+}
+
+# The lane of the calls to each endpoint socket.
+LANE_OF_SOCKET = {
+    'status_socket': lanes.STATUS,
+    'stats_socket': lanes.STATS,
+    'get_socket': lanes.GET,
+}
+
+# The data model of the objects nested under each key of a get response.
+NESTED_MODELS = {
+    constants.LISTENERS: data_models.Listener,
+    constants.POOLS: data_models.Pool,
+    constants.DEFAULT_POOL: data_models.Pool,
+    constants.MEMBERS: data_models.Member,
+    constants.HEALTHMONITOR: data_models.HealthMonitor,
+    constants.L7POLICIES: data_models.L7Policy,
+    constants.RULES: data_models.L7Rule,
+}
+
+
+def check_bulk_response(ids, data):
+    """Raise DriverError if a bulk get response does not match the request.
+
+    :param ids: The requested object IDs.
+    :param data: The decoded driver agent response.
+    :raises: DriverError
+    """
+    if not isinstance(data, list) or len(data) != len(ids):
+        raise driver_exceptions.DriverError(
+            operator_fault_string=('The driver agent returned an invalid '
+                                   'bulk get response.'))
+
+
+def hydrate_many(model, ids, data):
+    """Build the objects of a bulk get response.
+
+    :param model: The data model class of the objects.
+    :param ids: The requested object IDs.
+    :param data: The decoded driver agent response.
+    :raises DriverError: The response does not match the request.
+    :returns: A list with the object, or None if not found, for each ID.
+    """
+    check_bulk_response(ids, data)
+    return [model.from_dict(item) if item else None for item in data]
+
+
+def hydrate_loadbalancer_tree(data, depth=None):
+    """Build a load balancer and the objects nested in a get response.
+
+    The driver agent returns a load balancer with its listeners and pools
+    nested, the pools with their members and health monitor and the
+    listeners with their default pool and L7 policies, which hold their
+    rules. Each nested dict is turned into its data model object and a pool
+    is built only once, so a listener default_pool is the same object as the
+    matching entry of LoadBalancer.pools.
+
+    :param data: The load balancer dict returned by the driver agent.
+    :type data: dict
+    :param depth: How many levels of nested objects to build: 1 for the
+      listeners and pools, 2 to add the members, health monitors and L7
+      policies and 3 to add the L7 rules. None builds everything. Nested
+      objects below the depth are left Unset.
+    :type depth: int
+    :returns: A LoadBalancer object.
+    """
+    def expand(level):
+        return depth is None or level <= depth
+
+    def nested(fields, key, model, level):
+        items = fields.pop(key, data_models.Unset)
+        if not expand(level):
+            return data_models.Unset
+        if isinstance(items, list):
+            return [model.from_dict(item) for item in items]
+        return items
+
+    pools = {}
+
+    def build_pool(pool_data):
+        pool_id = pool_data.get(constants.POOL_ID)
+        if pool_id in pools:
+            return pools[pool_id]
+        fields = dict(pool_data)
+        members = nested(fields, constants.MEMBERS, data_models.Member, 2)
+        healthmonitor = fields.pop(constants.HEALTHMONITOR,
+                                   data_models.Unset)
+        pool = data_models.Pool.from_dict(fields)
+        pool.members = members
+        if not expand(2):
+            healthmonitor = data_models.Unset
+        elif isinstance(healthmonitor, dict):
+            healthmonitor = data_models.HealthMonitor.from_dict(healthmonitor)
+        pool.healthmonitor = healthmonitor
+        if pool_id:
+            pools[pool_id] = pool
+        return pool
+
+    def build_l7policy(l7policy_data):
+        fields = dict(l7policy_data)
+        rules = nested(fields, constants.RULES, data_models.L7Rule, 3)
+        l7policy = data_models.L7Policy.from_dict(fields)
+        l7policy.rules = rules
+        return l7policy
+
+    def build_listener(listener_data):
+        fields = dict(listener_data)
+        default_pool = fields.pop(constants.DEFAULT_POOL, data_models.Unset)
+        l7policies = fields.pop(constants.L7POLICIES, data_models.Unset)
+        listener = data_models.Listener.from_dict(fields)
+        if isinstance(default_pool, dict):
+            default_pool = build_pool(default_pool)
+        listener.default_pool = default_pool
+        if not expand(2):
+            l7policies = data_models.Unset
+        elif isinstance(l7policies, list):
+            l7policies = [build_l7policy(item) for item in l7policies]
+        listener.l7policies = l7policies
+        return listener
+
+    fields = dict(data)
+    listeners = fields.pop(constants.LISTENERS, data_models.Unset)
+    lb_pools = fields.pop(constants.POOLS, data_models.Unset)
+    loadbalancer = data_models.LoadBalancer.from_dict(fields)
+    if expand(1):
+        # Pools first, so the listener default pools resolve to them
+        if isinstance(lb_pools, list):
+            lb_pools = [build_pool(item) for item in lb_pools]
+        if isinstance(listeners, list):
+            listeners = [build_listener(item) for item in listeners]
+        loadbalancer.pools = lb_pools
+        loadbalancer.listeners = listeners
+    return loadbalancer
+
+
+def routing_key(update):
+    """Return the key a status or statistics update is routed by.
+
+    :param update: A status or statistics update.
+    :type update: dict
+    :returns: The ID of the first load balancer of the update or, without
+      any, of its first object. None for an empty update.
+    """
+    records = update.get(constants.LOADBALANCERS)
+    if records:
+        return records[0].get(constants.ID)
+    for records in update.values():
+        if records:
+            return records[0].get(constants.ID)
+    return None
+
+
+def _unreachable(error):
+    # Errors raised before anything was sent.
+    return isinstance(error, (driver_exceptions.DriverAgentNotFound,
+                              FileNotFoundError, ConnectionRefusedError))
+
+
+def _retriable(error):
+    # Errors after which the driver agent may take the update later.
+    return (isinstance(error, driver_exceptions.DriverAgentBusy) or
+            circuit_breaker.is_failure(error))
+
+
+# The result of an update spooled instead of sent.
+_SPOOLED = object()
+
+
+def chain_future(future, callback):
+    """Return a Future resolving to callback(future) once future is done.
+
+    An exception raised by the callback fails the returned Future.
+    """
+    chained = futures.Future()
+
+    def done(future):
+        try:
+            chained.set_result(callback(future))
+        except Exception as e:
+            chained.set_exception(e)
+
+    future.add_done_callback(done)
+    return chained
+
+
+def check_status_response(response):
+    """Raise UpdateStatusError if the driver agent rejected a status update.
+
+    :param response: The decoded driver agent response.
+    :type response: dict
+    :raises: UpdateStatusError
+    """
+    if response[constants.STATUS_CODE] != constants.DRVR_STATUS_CODE_OK:
+        raise driver_exceptions.UpdateStatusError(
+            fault_string=response.pop(constants.FAULT_STRING, None),
+            status_object=response.pop(constants.STATUS_OBJECT, None),
+            status_object_id=response.pop(constants.STATUS_OBJECT_ID,
+                                          None),
+            status_record=response.pop(constants.STATUS_RECORD, None))
+
+
+def check_statistics_response(response):
+    """Raise UpdateStatisticsError if the driver agent rejected statistics.
+
+    :param response: The decoded driver agent response.
+    :type response: dict
+    :raises: UpdateStatisticsError
+    """
+    if response[constants.STATUS_CODE] != constants.DRVR_STATUS_CODE_OK:
+        raise driver_exceptions.UpdateStatisticsError(
+            fault_string=response.pop(constants.FAULT_STRING, None),
+            stats_object=response.pop(constants.STATS_OBJECT, None),
+            stats_object_id=response.pop(constants.STATS_OBJECT_ID, None),
+            stats_record=response.pop(constants.STATS_RECORD, None))
+
+
+# Live DriverLibrary instances, reset in forked children.
+_instances = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    for driver_library in list(_instances):
+        driver_library._after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
 
 
 class DriverLibrary():
+    """The driver agent client for provider drivers.
+
+    A DriverLibrary is thread safe and meant to be shared by all the threads
+    of a process: connections are only ever used by one call at a time,
+    from a lock protected pool or behind the multiplexed connection, and
+    the cache, circuit breakers and adaptive timeouts are lock protected.
 
-    @tenacity.retry(
-        stop=tenacity.stop_after_attempt(30), reraise=True,
-        wait=tenacity.wait_exponential(multiplier=1, min=1, max=5),
-        retry=tenacity.retry_if_exception_type(
-            driver_exceptions.DriverAgentNotFound))
-    def _check_for_socket_ready(self, socket):
-        if not os.path.exists(socket):
-            raise driver_exceptions.DriverAgentNotFound(
-                fault_string=('Unable to open the driver agent '
-                              'socket: {}'.format(socket)))
+    It is also safe to fork, with multiprocessing for example. A forked
+    child lets go of the connections inherited from its parent without
+    disturbing them, and starts over with its own connections, empty cache
+    and fresh circuit breakers and adaptive timeouts on first use.
+    """
+
+    def _check_for_socket_ready(self, *sockets):
+        # One deadline for all the sockets.
+        readiness.wait_for_sockets(sockets, DRIVER_AGENT_READY_TIMEOUT)
 
     def __init__(self, status_socket=DEFAULT_STATUS_SOCKET,
                  stats_socket=DEFAULT_STATS_SOCKET,
-                 get_socket=DEFAULT_GET_SOCKET, **kwargs):
+                 get_socket=DEFAULT_GET_SOCKET, connection_pool_size=0,
+                 cache_size=0, cache_ttl=5, cache_negative_ttl=None,
+                 multiplex=False, codecs=None, compression_threshold=None,
+                 adaptive_timeout=False, circuit_breaker_threshold=0,
+                 circuit_breaker_reset_timeout=SOCKET_TIMEOUT, lazy=False,
+                 status_dedupe_size=0, status_resync_interval=None,
+                 metrics=None, endpoints=None,
+                 endpoint_down_interval=SOCKET_TIMEOUT, channel_socket=None,
+                 lane_workers=0, lane_queue_limit=None, spool=None,
+                 spool_retry_interval=SOCKET_TIMEOUT, **kwargs):
+        """Create a driver library instance.
+
+        :param status_socket: Path to the driver agent status socket.
+        :param stats_socket: Path to the driver agent statistics socket.
+        :param get_socket: Path to the driver agent get socket.
+        :param connection_pool_size: When greater than zero, keep up to this
+          many persistent connections open per driver agent socket and reuse
+          them across calls instead of connecting for every call. Connections
+          closed by the driver agent are detected and replaced transparently.
+        :type connection_pool_size: int
+        :param cache_size: When greater than zero, cache up to this many get
+          responses. Cached objects are shared and must not be modified.
+          An object, and the cached objects above it, are dropped from the
+          cache when a status update for it is sent.
+        :type cache_size: int
+        :param cache_ttl: Seconds a get response stays cached, either one
+          value or a dictionary keyed by object type, for example
+          constants.MEMBERS. Object types missing from the dictionary are
+          not cached.
+        :type cache_ttl: float or dict
+        :param cache_negative_ttl: Seconds a not found result stays cached.
+          Defaults to cache_ttl.
+        :type cache_negative_ttl: float
+        :param multiplex: Send every request over one persistent
+          multiplexed connection per driver agent socket, so requests from
+          many threads, or from the submit_* methods, are in flight at the
+          same time. Requires a driver agent that supports multiplexed
+          connections. Takes precedence over connection_pool_size.
+        :type multiplex: bool
+        :param codecs: The payload codecs to offer the driver agent,
+          preferred first, for example ['msgpack', 'json']. The codec is
+          agreed with a hello exchange on each new connection, so this is
+          best combined with connection_pool_size or multiplex. Requires a
+          driver agent that supports codec negotiation. Defaults to JSON
+          without negotiation.
+        :type codecs: list
+        :param compression_threshold: Offer the driver agent zlib
+          compression of payloads of at least this many bytes, in both
+          directions. Agreed in the same hello exchange as codecs. Defaults
+          to no compression.
+        :type compression_threshold: int
+        :param adaptive_timeout: Derive the timeout of each call from the
+          latencies observed on its driver agent socket instead of using
+          DRIVER_AGENT_TIMEOUT, so calls to a driver agent that stopped
+          responding fail within a few times its usual latency. See
+          timeouts.AdaptiveTimeout. A timeout passed to a method takes
+          precedence.
+        :type adaptive_timeout: bool
+        :param circuit_breaker_threshold: When greater than zero, once this
+          many consecutive calls to a driver agent socket failed to connect
+          or timed out, fail the following calls right away with
+          DriverAgentNotFound or DriverAgentTimeout instead of waiting on
+          the driver agent. See circuit_breaker.CircuitBreaker. The
+          breakers are in the circuit_breakers attribute, keyed by socket
+          path, for monitoring.
+        :type circuit_breaker_threshold: int
+        :param circuit_breaker_reset_timeout: Seconds an open circuit
+          breaker waits before letting a single probe call through.
+        :type circuit_breaker_reset_timeout: float
+        :param lazy: Return right away instead of waiting, up to
+          DRIVER_AGENT_READY_TIMEOUT, for the driver agent sockets to
+          appear. The first call on each socket then waits for it, within
+          the call timeout. See also wait_for_driver_agent.
+        :type lazy: bool
+        :param status_dedupe_size: When greater than zero, remember the
+          last status sent for up to this many objects and leave the objects
+          whose status did not change out of status updates. An update in
+          which nothing changed is not sent at all. See
+          status_dedupe.StatusDeduplicator, available in the status_dedupe
+          attribute.
+        :type status_dedupe_size: int
+        :param status_resync_interval: Seconds after which the status of an
+          object is sent again even if unchanged. Defaults to never.
+        :type status_resync_interval: float
+        :param metrics: Record the latency of each call, broken down by
+          phase, its payload sizes, retries and errors in this registry. The
+          phases of multiplexed calls are not broken down, and streamed
+          lookups, whose duration depends on their consumer, are not
+          measured. Defaults to no instrumentation.
+        :type metrics: metrics.MetricsRegistry
+        :param endpoints: Spread the requests over several driver agents,
+          given as a list of (status socket, stats socket, get socket)
+          tuples, instead of the single driver agent of status_socket,
+          stats_socket and get_socket. Requests are routed over a consistent
+          hash ring, status and statistics updates by load balancer ID, so
+          the updates of a load balancer stay in order on one driver agent,
+          and lookups by object ID. See sharding.ShardRouter, available in
+          the shards attribute.
+        :type endpoints: list
+        :param endpoint_down_interval: Seconds a driver agent that could not
+          be reached or timed out is passed over, its load balancers going
+          to the next driver agents on the ring.
+        :type endpoint_down_interval: float
+        :param channel_socket: Path to a driver agent socket taking the
+          status, stats and get requests alike. Every request is then sent
+          over one multiplexed connection to it, its message type in the
+          frame header, instead of over a connection per socket, and
+          status updates and gets waiting to be sent go before statistics.
+          Implies multiplex. Requires a driver agent that supports it.
+          Cannot be combined with endpoints.
+        :type channel_socket: string
+        :param lane_workers: Send the status updates, gets and statistics
+          updates from worker threads of their own lane, this many for each
+          lane, instead of from the calling thread, so a flood of one kind
+          of call cannot delay the others. Either one value or a dictionary
+          keyed by lane, for example {lanes.STATS: 2}. Lanes missing from
+          the dictionary, or with no workers, are sent from the calling
+          thread. Streamed lookups always are. The status lane has at most
+          one worker, so status updates are sent in the order they were
+          submitted. See lanes.Lane, the lanes are in the lanes attribute,
+          keyed by lane, for monitoring.
+        :type lane_workers: int or dict
+        :param lane_queue_limit: Calls waiting for a worker of a lane at
+          most, further calls fail right away with DriverAgentBusy, wrapped
+          in UpdateStatusError or UpdateStatisticsError for updates. Either
+          one value or a dictionary keyed by lane. Defaults to no limit.
+        :type lane_queue_limit: int or dict
+        :param spool: Keep the status and statistics updates the driver
+          agent could not take, because it could not be reached, timed out
+          or was busy, in this spool instead of failing them, and send them
+          once it is back, oldest first. While updates are spooled, new
+          ones are spooled behind them. The spool is replayed by the next
+          update once spool_retry_interval passed, for no longer than the
+          timeout of that update, or by replay_spool().
+          Updates that timed out may reach the driver agent twice. The
+          spool must not be used by forked children.
+        :type spool: spool.Spool
+        :param spool_retry_interval: Seconds between attempts to replay the
+          spool.
+        :type spool_retry_interval: float
+        """
+        if endpoints and channel_socket is not None:
+            raise ValueError(_('endpoints and channel_socket cannot be used '
+                               'together.'))
+        if endpoints:
+            self.endpoints = [sharding.Endpoint(*endpoint)
+                              for endpoint in endpoints]
+            status_socket, stats_socket, get_socket = self.endpoints[0]
+        else:
+            self.endpoints = [sharding.Endpoint(status_socket, stats_socket,
+                                                get_socket)]
+        self.endpoint_down_interval = endpoint_down_interval
         self.status_socket = status_socket
         self.stats_socket = stats_socket
         self.get_socket = get_socket
+        self._sockets = tuple(socket_path for endpoint in self.endpoints
+                              for socket_path in endpoint)
+        self._status_sockets = {endpoint.status_socket
+                                for endpoint in self.endpoints}
+        self._stats_sockets = {endpoint.stats_socket
+                               for endpoint in self.endpoints}
+        self._endpoint_of = {socket_path: endpoint
+                             for endpoint in self.endpoints
+                             for socket_path in endpoint}
+        self.channel_socket = channel_socket
+        self._message_types = {status_socket: multiplex_lib.STATUS,
+                               stats_socket: multiplex_lib.STATS,
+                               get_socket: multiplex_lib.GET}
+        # The socket files the driver agent creates.
+        self._agent_sockets = (self._sockets if channel_socket is None
+                               else (channel_socket,))
 
-        self._check_for_socket_ready(status_socket)
-        self._check_for_socket_ready(stats_socket)
-        self._check_for_socket_ready(get_socket)
+        # The sockets not seen yet, to wait for on first use.
+        self._unready = set()
+        if lazy:
+            self._unready.update(self._agent_sockets)
+        else:
+            self._check_for_socket_ready(*self._agent_sockets)
+
+        self.connection_pool_size = connection_pool_size
+        self.codecs = [codec_lib.get_codec(name).name
+                       for name in codecs or [codec_lib.JSON.name]]
+        self.compression_threshold = compression_threshold
+        self.adaptive_timeout = adaptive_timeout
+        self.circuit_breaker_threshold = circuit_breaker_threshold
+        self.circuit_breaker_reset_timeout = circuit_breaker_reset_timeout
+        self.multiplex = multiplex or channel_socket is not None
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache_negative_ttl = cache_negative_ttl
+        self.status_dedupe_size = status_dedupe_size
+        self.status_resync_interval = status_resync_interval
+        self.metrics = metrics
+        self.lane_workers = lane_workers
+        self.lane_queue_limit = lane_queue_limit
+        self.spool = spool
+        self.spool_retry_interval = spool_retry_interval
+        self._spool_retry_at = 0
+        self._init_process_state()
+        _instances.add(self)
 
         super().__init__(**kwargs)
 
-    def _recv(self, sock):
-        size_str = b''
-        begin = time.time()
+    def _init_process_state(self):
+        # Everything a forked child must not share with its parent:
+        # connections, and locks a thread of the parent may hold.
+        self._connection_pools = {}
+        if self.connection_pool_size > 0:
+            for socket_path in self._sockets:
+                self._connection_pools[socket_path] = (
+                    connection_pool.ConnectionPool(
+                        socket_path, self.connection_pool_size,
+                        socket_timeout=SOCKET_TIMEOUT,
+                        acquire_timeout=DRIVER_AGENT_TIMEOUT))
+
+        self._wire_formats = weakref.WeakKeyDictionary()
+
+        self._adaptive_timeouts = {}
+        if self.adaptive_timeout:
+            for socket_path in self._sockets:
+                self._adaptive_timeouts[socket_path] = (
+                    timeouts.AdaptiveTimeout(MIN_ADAPTIVE_TIMEOUT,
+                                             DRIVER_AGENT_TIMEOUT))
+
+        self.circuit_breakers = {}
+        if self.circuit_breaker_threshold > 0:
+            for socket_path in self._sockets:
+                self.circuit_breakers[socket_path] = (
+                    circuit_breaker.CircuitBreaker(
+                        socket_path, self.circuit_breaker_threshold,
+                        self.circuit_breaker_reset_timeout))
+
+        self._multiplexed_connections = {}
+        self._multiplex_lock = threading.Lock()
+        # Socket path to the lock held while connecting to it.
+        self._connect_locks = {}
+
+        self.shards = None
+        if len(self.endpoints) > 1:
+            self.shards = sharding.ShardRouter(self.endpoints,
+                                               self.endpoint_down_interval)
+
+        # The metrics_lib.Call of the call in progress in each thread.
+        self._local = threading.local()
+
+        self.lanes = {}
+        for lane in lanes.LANES:
+            workers = self.lane_workers
+            if isinstance(workers, dict):
+                workers = workers.get(lane, 0)
+            if lane == lanes.STATUS:
+                # Status updates must reach the driver agent in order.
+                workers = min(workers, 1)
+            queue_limit = self.lane_queue_limit
+            if isinstance(queue_limit, dict):
+                queue_limit = queue_limit.get(lane)
+            if workers > 0:
+                self.lanes[lane] = lanes.Lane(lane, workers, queue_limit,
+                                              self.metrics)
+
+        self.cache = None
+        if self.cache_size > 0:
+            self.cache = cache.LookupCache(
+                self.cache_size, self.cache_ttl,
+                negative_ttl=self.cache_negative_ttl)
+
+        self.status_dedupe = None
+        if self.status_dedupe_size > 0:
+            self.status_dedupe = status_dedupe.StatusDeduplicator(
+                self.status_dedupe_size, self.status_resync_interval)
+
+    def _after_fork(self):
+        # Runs in the child only, before any other thread exists.
+        for pool in self._connection_pools.values():
+            pool.after_fork()
+        for connection in self._multiplexed_connections.values():
+            connection.after_fork()
+        self._init_process_state()
+
+    def wait_for_driver_agent(self, timeout=DRIVER_AGENT_READY_TIMEOUT):
+        """Wait for the driver agent sockets to be available.
+
+        Returns as soon as the last socket appears.
+
+        :param timeout: Seconds to wait at most.
+        :type timeout: float
+        :raises DriverAgentNotFound: The sockets did not appear in time.
+        """
+        readiness.wait_for_sockets(self._agent_sockets, timeout)
+        self._unready.clear()
+
+    def _wait_ready(self, socket_path, deadline):
+        if socket_path in self._unready:
+            readiness.wait_for_sockets([socket_path], deadline.remaining())
+            self._unready.discard(socket_path)
+
+    def close(self):
+        """Close any persistent driver agent connections.
+
+        Waits for the calls queued in the lanes first.
+        """
+        for lane in self.lanes.values():
+            lane.close()
+        for pool in self._connection_pools.values():
+            pool.close()
+        with self._multiplex_lock:
+            connections = list(self._multiplexed_connections.values())
+            self._multiplexed_connections.clear()
+        for connection in connections:
+            connection.close()
+
+    def _recv(self, sock, wire_format=codec_lib.DEFAULT_WIRE_FORMAT,
+              timeout=DRIVER_AGENT_TIMEOUT):
+        payload = framing.recv_frame(sock, timeout)
+        return wire_format.decode(payload)
+
+    def _deadline(self, socket_path, timeout):
+        if timeout is None:
+            adaptive = self._adaptive_timeouts.get(socket_path)
+            timeout = (DRIVER_AGENT_TIMEOUT if adaptive is None
+                       else adaptive.timeout())
+        return timeouts.Deadline(timeout)
+
+    def _before_call(self, socket_path):
+        breaker = self.circuit_breakers.get(socket_path)
+        if breaker is not None:
+            breaker.before_call()
+
+    def _after_call(self, socket_path, start, error=None):
+        # Must follow every _before_call that did not raise. A start of None
+        # records no latency.
+        breaker = self.circuit_breakers.get(socket_path)
+        if breaker is not None:
+            breaker.after_call(error)
+        if self.shards is not None:
+            self.shards.report(self._endpoint_of[socket_path], error)
+        adaptive = self._adaptive_timeouts.get(socket_path)
+        if adaptive is None or start is None:
+            return
+        if error is None:
+            adaptive.observe(time.monotonic() - start)
+        elif isinstance(error, driver_exceptions.DriverAgentTimeout):
+            adaptive.timed_out()
+
+    def _start_call(self, socket_path, data):
+        if socket_path in self._status_sockets:
+            return self.metrics.start_call('update_loadbalancer_status')
+        if socket_path in self._stats_sockets:
+            return self.metrics.start_call('update_listener_statistics')
+        return self.metrics.start_call(
+            'get_many' if constants.IDS in data else 'get',
+            data.get(constants.OBJECT))
+
+    def _current_call(self):
+        if self.metrics is None:
+            return None
+        return getattr(self._local, 'call', None)
+
+    def _hydrate(self, operation, resource, build, data):
+        # Returns build(data), timed as the hydrate phase of operation.
+        if self.metrics is None:
+            return build(data)
+        start = time.perf_counter()
+        try:
+            return build(data)
+        finally:
+            self.metrics.observe(
+                metrics_lib.CALL_SECONDS, time.perf_counter() - start,
+                operation=operation, resource=resource,
+                phase=metrics_lib.HYDRATE)
+
+    def _connect(self, socket_path, deadline):
+        start = time.perf_counter()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+            sock.connect(socket_path)
+        except Exception:
+            sock.close()
+            raise
+        call = self._current_call()
+        if call is not None:
+            call.timed(metrics_lib.CONNECT, start)
+        return sock
+
+    def _wire_format_for(self, sock, deadline=None):
+        if (self.codecs == [codec_lib.JSON.name] and
+                self.compression_threshold is None):
+            return codec_lib.DEFAULT_WIRE_FORMAT
+        wire_format = self._wire_formats.get(sock)
+        if wire_format is None:
+            if deadline is not None:
+                # The hello exchange is bounded by the call deadline too.
+                sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+            wire_format = codec_lib.negotiate(
+                sock, self.codecs,
+                DRIVER_AGENT_TIMEOUT if deadline is None
+                else deadline.remaining(),
+                compression_threshold=self.compression_threshold)
+            self._wire_formats[sock] = wire_format
+        return wire_format
+
+    def _request(self, sock, data, deadline=None):
+        if deadline is None:
+            deadline = timeouts.Deadline(DRIVER_AGENT_TIMEOUT)
+        call = self._current_call()
+        if call is not None:
+            return self._measured_request(call, sock, data, deadline)
+        wire_format = self._wire_format_for(sock, deadline)
+        sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+        framing.send_frame(sock, *wire_format.encode(data))
+        sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+        return self._recv(sock, wire_format, deadline.remaining())
+
+    def _measured_request(self, call, sock, data, deadline):
+        # _request, timing each phase.
+        start = time.perf_counter()
+        wire_format = self._wire_format_for(sock, deadline)
+        start = call.timed(metrics_lib.CONNECT, start)
+        payload, fields = wire_format.encode(data)
+        start = call.timed(metrics_lib.ENCODE, start)
+        sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+        framing.send_frame(sock, payload, fields)
+        call.bytes_sent += len(payload)
+        start = call.timed(metrics_lib.SEND, start)
+        sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+        payload = framing.recv_frame(sock, deadline.remaining())
+        call.bytes_received += len(payload)
+        start = call.timed(metrics_lib.RECEIVE, start)
+        response = wire_format.decode(payload)
+        call.timed(metrics_lib.DECODE, start)
+        return response
+
+    def _multiplexed_connection(self, socket_path, deadline):
+        with self._multiplex_lock:
+            connection = self._multiplexed_connections.get(socket_path)
+            if connection is not None and not connection.closed():
+                return connection
+            connect_lock = self._connect_locks.setdefault(socket_path,
+                                                          threading.Lock())
+        # Connecting may be slow, only the calls to this socket wait for it,
+        # and no longer than their deadline.
+        if not connect_lock.acquire(timeout=deadline.remaining()):
+            raise driver_exceptions.DriverAgentTimeout(
+                fault_string=('The driver agent did not respond in {} '
+                              'seconds.'.format(deadline.timeout)))
+        try:
+            with self._multiplex_lock:
+                old = self._multiplexed_connections.get(socket_path)
+            if old is not None and not old.closed():
+                return old
+            connection = multiplex_lib.MultiplexedConnection(
+                socket_path, socket_timeout=SOCKET_TIMEOUT,
+                request_timeout=DRIVER_AGENT_TIMEOUT,
+                codecs=self.codecs,
+                compression_threshold=self.compression_threshold,
+                deadline=deadline)
+            with self._multiplex_lock:
+                self._multiplexed_connections[socket_path] = connection
+        finally:
+            connect_lock.release()
+        if old is not None:
+            old.close()
+        return connection
+
+    def _route(self, key, exclude=()):
+        # The endpoint serving key.
+        if self.shards is None:
+            return self.endpoints[0]
+        return self.shards.route(key, exclude)
+
+    def _submit_routed(self, socket_name, key, data, timeout=None):
+        # _submit_to from a worker of the lane of socket_name, if it has one.
+        lane = self.lanes.get(LANE_OF_SOCKET[socket_name])
+        if lane is None:
+            return self._submit_to(socket_name, key, data, timeout)
+        if timeout is None:
+            return lane.submit(self._send_routed, socket_name, key, data)
+        # The wait for a worker counts in the timeout.
+        return lane.submit(self._send_routed, socket_name, key, data,
+                           timeouts.Deadline(timeout))
+
+    def _send_routed(self, socket_name, key, data, deadline=None):
+        return self._submit_to(
+            socket_name, key, data,
+            None if deadline is None else deadline.remaining()).result()
+
+    def _submit_to(self, socket_name, key, data, timeout=None):
+        # _submit to the socket_name socket of the endpoint serving key. A
+        # request that could not reach its endpoint moves on to the next
+        # one, nothing was sent yet.
+        tried = set()
         while True:
+            endpoint = self._route(key, tried)
+            future = self._submit(getattr(endpoint, socket_name), data,
+                                  timeout)
+            if (self.shards is None or not future.done() or
+                    not _unreachable(future.exception())):
+                return future
+            tried.add(endpoint)
+            if len(tried) == len(self.endpoints):
+                return future
+
+    def _submit(self, socket_path, data, timeout=None):
+        """Send a request and return a Future with the response.
+
+        Without multiplexing the request is sent and answered before this
+        returns.
+        """
+        if not self.multiplex:
+            future = futures.Future()
             try:
-                char = sock.recv(1)
-            except socket.timeout:
-                # We could have an overloaded DB and the query may take too
-                # long, so as long as DRIVER_AGENT_TIMEOUT hasn't expired,
-                # let's keep trying while not blocking everything.
-                pass
+                future.set_result(self._send(socket_path, data, timeout))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        call = None
+        if self.metrics is not None:
+            call = self._start_call(socket_path, data)
+        try:
+            self._before_call(socket_path)
+        except Exception as e:
+            if call is not None:
+                self.metrics.finish_call(call, e)
+            future = futures.Future()
+            future.set_exception(e)
+            return future
+        start = time.monotonic()
+        try:
+            deadline = self._deadline(socket_path, timeout)
+            if self.channel_socket is None:
+                self._wait_ready(socket_path, deadline)
+                connection = self._multiplexed_connection(socket_path,
+                                                          deadline)
+                future = connection.request(data, deadline.remaining())
             else:
-                if char == b'\n':
-                    break
-                size_str += char
-            if time.time() - begin > DRIVER_AGENT_TIMEOUT:
-                raise driver_exceptions.DriverAgentTimeout(
-                    fault_string=('The driver agent did not respond in {} '
-                                  'seconds.'.format(DRIVER_AGENT_TIMEOUT)))
-            # Give the CPU a break from polling
-            time.sleep(0.01)
-        payload_size = int(size_str)
-        mv_buffer = memoryview(bytearray(payload_size))
-        next_offset = 0
-        begin = time.time()
-        while payload_size - next_offset > 0:
-            recv_size = sock.recv_into(mv_buffer[next_offset:],
-                                       payload_size - next_offset)
-            next_offset += recv_size
-            if time.time() - begin > DRIVER_AGENT_TIMEOUT:
-                raise driver_exceptions.DriverAgentTimeout(
-                    fault_string=('The driver agent did not respond in {} '
-                                  'seconds.'.format(DRIVER_AGENT_TIMEOUT)))
-            # Give the CPU a break from polling
-            time.sleep(0.01)
-        return jsonutils.loads(mv_buffer.tobytes())
-
-    def _send(self, socket_path, data):
-        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-        sock.settimeout(SOCKET_TIMEOUT)
-        sock.connect(socket_path)
+                self._wait_ready(self.channel_socket, deadline)
+                connection = self._multiplexed_connection(
+                    self.channel_socket, deadline)
+                future = connection.request(
+                    data, deadline.remaining(),
+                    message_type=self._message_types[socket_path])
+        except Exception as e:
+            future = futures.Future()
+            future.set_exception(e)
+
+        def done(future):
+            error = future.exception()
+            self._after_call(socket_path, start, error)
+            if call is not None:
+                self.metrics.finish_call(call, error)
+
+        future.add_done_callback(done)
+        return future
+
+    def _send(self, socket_path, data, timeout=None):
+        if self.multiplex:
+            return self._submit(socket_path, data, timeout).result()
+        if self.metrics is None:
+            return self._exchange(socket_path, data, timeout)
+        call = self._start_call(socket_path, data)
+        self._local.call = call
         try:
-            json_data = jsonutils.dump_as_bytes(data)
-            len_str = '{}\n'.format(len(json_data)).encode('utf-8')
-            sock.send(len_str)
-            sock.sendall(json_data)
-            response = self._recv(sock)
+            response = self._exchange(socket_path, data, timeout)
+        except Exception as e:
+            self.metrics.finish_call(call, e)
+            raise
         finally:
-            sock.close()
+            self._local.call = None
+        self.metrics.finish_call(call)
         return response
 
-    def update_loadbalancer_status(self, status):
+    def _exchange(self, socket_path, data, timeout):
+        # Sends a request on a connection of its own or from the pool.
+        self._before_call(socket_path)
+        start = time.monotonic()
+        try:
+            deadline = self._deadline(socket_path, timeout)
+            self._wait_ready(socket_path, deadline)
+            pool = self._connection_pools.get(socket_path)
+            if pool is not None:
+                response = self._send_pooled(pool, data, deadline)
+            else:
+                sock = self._connect(socket_path, deadline)
+                try:
+                    response = self._request(sock, data, deadline)
+                finally:
+                    sock.close()
+        except Exception as e:
+            self._after_call(socket_path, start, e)
+            raise
+        self._after_call(socket_path, start)
+        return response
+
+    def _stream(self, socket_path, data, path, timeout=None):
+        # Streams the response on a connection of its own, a pool or
+        # multiplexed connection could not be shared while it is read.
+        self._before_call(socket_path)
+        error = None
+        try:
+            deadline = self._deadline(socket_path, timeout)
+            agent_socket = self.channel_socket or socket_path
+            self._wait_ready(agent_socket, deadline)
+            sock = self._connect(agent_socket, deadline)
+            try:
+                wire_format = self._wire_format_for(sock, deadline)
+                payload, fields = wire_format.encode(data)
+                if self.channel_socket is not None:
+                    fields = {**(fields or {}),
+                              multiplex_lib.MESSAGE_TYPE: multiplex_lib.GET}
+                sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+                framing.send_frame(sock, payload, fields)
+                sock.settimeout(deadline.socket_timeout(SOCKET_TIMEOUT))
+                chunks = framing.iter_frame(sock, deadline.remaining())
+                if wire_format.codec is codec_lib.JSON:
+                    yield from streaming.iter_json(chunks, path)
+                else:
+                    payload = bytearray()
+                    for chunk in chunks:
+                        payload += chunk
+                    yield from streaming.iter_decoded(
+                        wire_format.decode(payload), path)
+            finally:
+                sock.close()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # The duration of a streamed call depends on its consumer, it is
+            # no latency sample.
+            self._after_call(socket_path, None, error)
+
+    def _send_pooled(self, pool, data, deadline):
+        # The driver agent may close a connection while it sits idle in the
+        # pool, so a request that fails on a reused connection is retried on
+        # another one. A failure on a fresh connection is a real failure.
+        call = self._current_call()
+        while True:
+            start = time.perf_counter()
+            sock, reused = pool.acquire(deadline.remaining())
+            if call is not None:
+                call.timed(metrics_lib.CONNECT, start)
+            try:
+                response = self._request(sock, data, deadline)
+            except ConnectionError:
+                pool.discard(sock)
+                if reused:
+                    if call is not None:
+                        call.retries += 1
+                    continue
+                raise
+            except BaseException:
+                pool.discard(sock)
+                raise
+            pool.release(sock)
+            return response
+
+    def update_loadbalancer_status(self, status, timeout=None,
+                                   loadbalancer_id=None):
         """Update load balancer status.
 
         :param status: dictionary defining the provisioning status and
@@ -117,23 +979,72 @@ class DriverLibrary():
             provisioning_status (string): Provisioning status for the object.
             operating_status (string): Operating status for the object.
         :type status: dict
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :param loadbalancer_id: The load balancer the objects belong to,
+          which the update is routed by with several endpoints. Defaults to
+          routing_key(status), pass it for updates that do not include
+          the load balancer.
+        :type loadbalancer_id: UUID string
         :raises: UpdateStatusError
         :returns: None
         """
-        try:
-            response = self._send(self.status_socket, status)
-        except Exception as e:
-            raise driver_exceptions.UpdateStatusError(fault_string=str(e))
+        self.submit_loadbalancer_status(status, timeout,
+                                        loadbalancer_id).result()
+
+    def submit_loadbalancer_status(self, status, timeout=None,
+                                   loadbalancer_id=None):
+        """Update load balancer status without waiting for the response.
+
+        See update_loadbalancer_status. With multiplex enabled the update is
+        still in flight when this returns.
+
+        :returns: A concurrent.futures.Future resolving to None, or failing
+          with UpdateStatusError.
+        """
+        if loadbalancer_id is None and self.shards is not None:
+            loadbalancer_id = routing_key(status)
+        if self.status_dedupe is not None:
+            status = self.status_dedupe.filter(status)
+            if not status:
+                future = futures.Future()
+                future.set_result(None)
+                return future
+
+        def done(future):
+            try:
+                response = future.result()
+            except Exception as e:
+                if self._spooled(spool_lib.STATUS, status, loadbalancer_id,
+                                 e):
+                    return
+                raise driver_exceptions.UpdateStatusError(fault_string=str(e))
+            finally:
+                if self.cache is not None:
+                    self._invalidate_cache(status)
+
+            if response is _SPOOLED:
+                return
+            check_status_response(response)
+            if self.status_dedupe is not None:
+                self.status_dedupe.sent(status)
 
-        if response[constants.STATUS_CODE] != constants.DRVR_STATUS_CODE_OK:
-            raise driver_exceptions.UpdateStatusError(
-                fault_string=response.pop(constants.FAULT_STRING, None),
-                status_object=response.pop(constants.STATUS_OBJECT, None),
-                status_object_id=response.pop(constants.STATUS_OBJECT_ID,
-                                              None),
-                status_record=response.pop(constants.STATUS_RECORD, None))
+        if self.spool is not None and self.spool.pending():
+            future = self._submit_spooled(spool_lib.STATUS, status,
+                                          loadbalancer_id, timeout)
+        else:
+            future = self._submit_routed('status_socket', loadbalancer_id,
+                                         status, timeout)
+        return chain_future(future, done)
 
-    def update_listener_statistics(self, statistics):
+    def _invalidate_cache(self, status):
+        for resource, records in status.items():
+            for record in records:
+                self.cache.invalidate(resource, record.get(constants.ID))
+
+    def update_listener_statistics(self, statistics, timeout=None,
+                                   loadbalancer_id=None):
         """Update listener statistics.
 
         :param statistics: Statistics for listeners:
@@ -144,132 +1055,547 @@ class DriverLibrary():
               request_errors (int): Total requests not fulfilled.
               total_connections (int): The total connections handled.
         :type statistics: dict
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :param loadbalancer_id: The load balancer the listeners belong to,
+          which the update is routed by with several endpoints. Defaults to
+          routing_key(statistics).
+        :type loadbalancer_id: UUID string
         :raises: UpdateStatisticsError
         :returns: None
         """
+        self.submit_listener_statistics(statistics, timeout,
+                                        loadbalancer_id).result()
+
+    def submit_listener_statistics(self, statistics, timeout=None,
+                                   loadbalancer_id=None):
+        """Update listener statistics without waiting for the response.
+
+        See update_listener_statistics. With multiplex enabled the update is
+        still in flight when this returns.
+
+        :returns: A concurrent.futures.Future resolving to None, or failing
+          with UpdateStatisticsError.
+        """
+        if loadbalancer_id is None and self.shards is not None:
+            loadbalancer_id = routing_key(statistics)
+
+        def done(future):
+            try:
+                response = future.result()
+            except Exception as e:
+                if self._spooled(spool_lib.STATS, statistics,
+                                 loadbalancer_id, e):
+                    return
+                raise driver_exceptions.UpdateStatisticsError(
+                    fault_string=str(e), stats_object=constants.LISTENERS)
+
+            if response is not _SPOOLED:
+                check_statistics_response(response)
+
+        if self.spool is not None and self.spool.pending():
+            future = self._submit_spooled(spool_lib.STATS, statistics,
+                                          loadbalancer_id, timeout)
+        else:
+            future = self._submit_routed('stats_socket', loadbalancer_id,
+                                         statistics, timeout)
+        return chain_future(future, done)
+
+    def _spooled(self, kind, update, key, error):
+        # Spools an update that failed with error if the driver agent may
+        # take it later, returns whether it did. Runs in the thread that
+        # completed the call, possibly a multiplexed connection reader, so
+        # the spool is replayed later.
+        if self.spool is None or not _retriable(error):
+            return False
+        self._spool_retry_at = time.monotonic() + self.spool_retry_interval
         try:
-            response = self._send(self.stats_socket, statistics)
-        except Exception as e:
-            raise driver_exceptions.UpdateStatisticsError(
-                fault_string=str(e), stats_object=constants.LISTENERS)
+            self._append_to_spool(kind, update, key)
+        except driver_exceptions.SpoolError:
+            return False
+        return True
 
-        if response[constants.STATUS_CODE] != constants.DRVR_STATUS_CODE_OK:
-            raise driver_exceptions.UpdateStatisticsError(
-                fault_string=response.pop(constants.FAULT_STRING, None),
-                stats_object=response.pop(constants.STATS_OBJECT, None),
-                stats_object_id=response.pop(constants.STATS_OBJECT_ID, None),
-                stats_record=response.pop(constants.STATS_RECORD, None))
+    def _append_to_spool(self, kind, update, key):
+        # A spool failure is no driver agent failure, it must not be taken
+        # for one and retried.
+        try:
+            self.spool.append(kind, update, key)
+        except (OSError, ValueError) as e:
+            raise driver_exceptions.SpoolError(fault_string=str(e)) from e
 
-    def _get_resource(self, resource, id):
+    def _submit_spooled(self, kind, update, key, timeout=None):
+        # Spools an update behind the updates already spooled, and replays
+        # the spool once spool_retry_interval passed, for no longer than
+        # the update itself may take.
+        future = futures.Future()
         try:
-            return self._send(self.get_socket, {constants.OBJECT: resource,
-                                                constants.ID: id})
-        except driver_exceptions.DriverAgentTimeout:
-            raise
+            self._append_to_spool(kind, update, key)
+        except driver_exceptions.SpoolError as e:
+            future.set_exception(e)
+            return future
+        if time.monotonic() >= self._spool_retry_at:
+            self.replay_spool(DRIVER_AGENT_TIMEOUT if timeout is None
+                              else timeout)
+        future.set_result(_SPOOLED)
+        return future
+
+    def _send_spooled(self, kind, update, key, deadline=None):
+        if kind == spool_lib.STATUS:
+            socket_name, check = 'status_socket', check_status_response
+        else:
+            socket_name, check = 'stats_socket', check_statistics_response
+        try:
+            check(self._submit_routed(
+                socket_name, key, update,
+                None if deadline is None else deadline.remaining()).result())
         except Exception as e:
-            raise driver_exceptions.DriverError() from e
+            # An update the driver agent rejected would be rejected again.
+            return not _retriable(e)
+        finally:
+            if kind == spool_lib.STATUS and self.cache is not None:
+                self._invalidate_cache(update)
+        if kind == spool_lib.STATUS and self.status_dedupe is not None:
+            self.status_dedupe.sent(update)
+        return True
+
+    def replay_spool(self, timeout=None):
+        """Send the spooled status and statistics updates, oldest first.
+
+        Stops at the first update the driver agent cannot take yet. Updates
+        the driver agent rejects are dropped. Call it periodically to send
+        the spooled updates when no new update would.
+
+        :param timeout: Seconds the replay may take. The updates left when
+          it runs out stay spooled. Defaults to replaying every update,
+          each one with the default timeout.
+        :type timeout: float
+        :returns: The number of updates sent.
+        """
+        if self.spool is None:
+            return 0
+        send = self._send_spooled
+        if timeout is not None:
+            send = functools.partial(self._send_spooled,
+                                     deadline=timeouts.Deadline(timeout))
+        sent = self.spool.replay(send)
+        if self.spool.pending():
+            self._spool_retry_at = (time.monotonic() +
+                                    self.spool_retry_interval)
+        return sent
+
+    def _get_resource(self, resource, id, timeout=None):
+        return self._submit_resource(resource, id, timeout).result()
+
+    def _submit_resource(self, resource, id, timeout=None):
+        generation = None
+        if self.cache is not None:
+            data = self.cache.get(resource, id)
+            if data is not cache.MISS:
+                future = futures.Future()
+                future.set_result(data)
+                return future
+            generation = self.cache.generation(resource, id)
+
+        def done(future):
+            try:
+                data = future.result()
+            except (driver_exceptions.DriverAgentNotFound,
+                    driver_exceptions.DriverAgentTimeout,
+                    driver_exceptions.DriverAgentBusy):
+                raise
+            except Exception as e:
+                raise driver_exceptions.DriverError() from e
+            if self.cache is not None:
+                self.cache.put(resource, id, data, generation)
+            return data
+
+        return chain_future(
+            self._submit_routed('get_socket', id,
+                                {constants.OBJECT: resource,
+                                 constants.ID: id}, timeout), done)
+
+    def submit_get(self, resource, id, timeout=None):
+        """Get an object without waiting for the response.
+
+        With multiplex enabled many lookups can be in flight at once, for
+        example::
+
+            futures = [driver_lib.submit_get(constants.MEMBERS, member_id)
+                       for member_id in member_ids]
+            members = [future.result() for future in futures]
 
-    def get_loadbalancer(self, loadbalancer_id):
+        :param resource: The object type, for example constants.MEMBERS.
+        :type resource: string
+        :param id: The object ID to lookup.
+        :type id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :returns: A concurrent.futures.Future resolving to the object or None
+          if not found, or failing with DriverAgentNotFound,
+          DriverAgentTimeout or DriverError.
+        """
+        model = RESOURCE_MODELS[resource]
+
+        def done(future):
+            data = future.result()
+            if data:
+                return self._hydrate('get', resource, model.from_dict, data)
+            return None
+
+        return chain_future(self._submit_resource(resource, id, timeout),
+                            done)
+
+    def get_loadbalancer(self, loadbalancer_id, timeout=None):
         """Get a load balancer object.
 
         :param loadbalancer_id: The load balancer ID to lookup.
         :type loadbalancer_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A LoadBalancer object or None if not found.
+        """
+        data = self._get_resource(constants.LOADBALANCERS, loadbalancer_id,
+                                  timeout=timeout)
+        if data:
+            return self._hydrate('get', constants.LOADBALANCERS,
+                                 data_models.LoadBalancer.from_dict, data)
+        return None
+
+    def get_loadbalancer_tree(self, loadbalancer_id, depth=None,
+                              timeout=None):
+        """Get a load balancer with its nested objects built.
+
+        The whole graph comes back in the single load balancer get response,
+        see hydrate_loadbalancer_tree.
+
+        :param loadbalancer_id: The load balancer ID to lookup.
+        :type loadbalancer_id: UUID string
+        :param depth: How many levels of nested objects to build, None for
+          all of them.
+        :type depth: int
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A LoadBalancer object or None if not found.
         """
-        data = self._get_resource(constants.LOADBALANCERS, loadbalancer_id)
+        data = self._get_resource(constants.LOADBALANCERS, loadbalancer_id,
+                                  timeout=timeout)
         if data:
-            return data_models.LoadBalancer.from_dict(data)
+            return self._hydrate(
+                'get', constants.LOADBALANCERS,
+                lambda data: hydrate_loadbalancer_tree(data, depth), data)
         return None
 
-    def get_listener(self, listener_id):
+    def get_listener(self, listener_id, timeout=None):
         """Get a listener object.
 
         :param listener_id: The listener ID to lookup.
         :type listener_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A Listener object or None if not found.
         """
-        data = self._get_resource(constants.LISTENERS, listener_id)
+        data = self._get_resource(constants.LISTENERS, listener_id,
+                                  timeout=timeout)
         if data:
-            return data_models.Listener.from_dict(data)
+            return self._hydrate('get', constants.LISTENERS,
+                                 data_models.Listener.from_dict, data)
         return None
 
-    def get_pool(self, pool_id):
+    def get_pool(self, pool_id, timeout=None):
         """Get a pool object.
 
         :param pool_id: The pool ID to lookup.
         :type pool_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A Pool object or None if not found.
         """
-        data = self._get_resource(constants.POOLS, pool_id)
+        data = self._get_resource(constants.POOLS, pool_id,
+                                  timeout=timeout)
         if data:
-            return data_models.Pool.from_dict(data)
+            return self._hydrate('get', constants.POOLS,
+                                 data_models.Pool.from_dict, data)
         return None
 
-    def get_healthmonitor(self, healthmonitor_id):
+    def get_healthmonitor(self, healthmonitor_id, timeout=None):
         """Get a health monitor object.
 
         :param healthmonitor_id: The health monitor ID to lookup.
         :type healthmonitor_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A HealthMonitor object or None if not found.
         """
-        data = self._get_resource(constants.HEALTHMONITORS, healthmonitor_id)
+        data = self._get_resource(constants.HEALTHMONITORS, healthmonitor_id,
+                                  timeout=timeout)
         if data:
-            return data_models.HealthMonitor.from_dict(data)
+            return self._hydrate('get', constants.HEALTHMONITORS,
+                                 data_models.HealthMonitor.from_dict, data)
         return None
 
-    def get_member(self, member_id):
+    def get_member(self, member_id, timeout=None):
         """Get a member object.
 
         :param member_id: The member ID to lookup.
         :type member_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A Member object or None if not found.
         """
-        data = self._get_resource(constants.MEMBERS, member_id)
+        data = self._get_resource(constants.MEMBERS, member_id,
+                                  timeout=timeout)
         if data:
-            return data_models.Member.from_dict(data)
+            return self._hydrate('get', constants.MEMBERS,
+                                 data_models.Member.from_dict, data)
         return None
 
-    def get_l7policy(self, l7policy_id):
+    def get_l7policy(self, l7policy_id, timeout=None):
         """Get a L7 policy object.
 
         :param l7policy_id: The L7 policy ID to lookup.
         :type l7policy_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A L7Policy object or None if not found.
         """
-        data = self._get_resource(constants.L7POLICIES, l7policy_id)
+        data = self._get_resource(constants.L7POLICIES, l7policy_id,
+                                  timeout=timeout)
         if data:
-            return data_models.L7Policy.from_dict(data)
+            return self._hydrate('get', constants.L7POLICIES,
+                                 data_models.L7Policy.from_dict, data)
         return None
 
-    def get_l7rule(self, l7rule_id):
+    def get_l7rule(self, l7rule_id, timeout=None):
         """Get a L7 rule object.
 
         :param l7rule_id: The L7 rule ID to lookup.
         :type l7rule_id: UUID string
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
         :raises DriverAgentTimeout: The driver agent did not respond
           inside the timeout.
         :raises DriverError: An unexpected error occurred.
         :returns: A L7Rule object or None if not found.
         """
-        data = self._get_resource(constants.L7RULES, l7rule_id)
+        data = self._get_resource(constants.L7RULES, l7rule_id,
+                                  timeout=timeout)
         if data:
-            return data_models.L7Rule.from_dict(data)
+            return self._hydrate('get', constants.L7RULES,
+                                 data_models.L7Rule.from_dict, data)
         return None
+
+    def _get_resources(self, resource, ids, timeout=None):
+        try:
+            return self._submit_routed(
+                'get_socket', ids[0], {constants.OBJECT: resource,
+                                       constants.IDS: ids}, timeout).result()
+        except (driver_exceptions.DriverAgentNotFound,
+                driver_exceptions.DriverAgentTimeout,
+                driver_exceptions.DriverAgentBusy):
+            raise
+        except Exception as e:
+            raise driver_exceptions.DriverError() from e
+
+    def get_many(self, resource, ids, timeout=None):
+        """Get several objects of one type in a single request.
+
+        :param resource: The object type, for example constants.MEMBERS.
+        :type resource: string
+        :param ids: The object IDs to lookup.
+        :type ids: list of UUID strings
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: A list with, for each ID in order, the object or None if
+          not found.
+        """
+        model = RESOURCE_MODELS[resource]
+        ids = list(ids)
+        if self.cache is None:
+            if not ids:
+                return []
+            data = self._get_resources(resource, ids, timeout)
+            return self._hydrate(
+                'get_many', resource,
+                lambda data: hydrate_many(model, ids, data), data)
+
+        results = [self.cache.get(resource, id) for id in ids]
+        missing = [id for id, data in zip(ids, results)
+                   if data is cache.MISS]
+        if missing:
+            generations = [self.cache.generation(resource, id)
+                           for id in missing]
+            fetched = self._get_resources(resource, missing, timeout)
+            check_bulk_response(missing, fetched)
+            fetched = iter(zip(fetched, generations))
+            for index, data in enumerate(results):
+                if data is cache.MISS:
+                    data, generation = next(fetched)
+                    self.cache.put(resource, ids[index], data, generation)
+                    results[index] = data
+        return self._hydrate(
+            'get_many', resource,
+            lambda results: [model.from_dict(data) if data else None
+                             for data in results], results)
+
+    def _iter_response(self, data, path, timeout):
+        try:
+            yield from self._stream(
+                self._route(data.get(constants.ID) or
+                            data[constants.IDS][0]).get_socket,
+                data, path, timeout)
+        except (driver_exceptions.DriverAgentNotFound,
+                driver_exceptions.DriverAgentTimeout,
+                driver_exceptions.DriverAgentBusy):
+            raise
+        except Exception as e:
+            raise driver_exceptions.DriverError() from e
+
+    def iter_nested(self, resource, id, path, timeout=None):
+        """Get the objects nested in an object, one at a time.
+
+        The response is decoded as it arrives and each nested object is
+        built as soon as it is complete, so memory use stays bounded however
+        large the response is. For example, to walk the members of every
+        pool of a load balancer::
+
+            for member in driver_lib.iter_nested(
+                    constants.LOADBALANCERS, loadbalancer_id,
+                    (constants.POOLS, constants.MEMBERS)):
+                ...
+
+        Only JSON responses are decoded incrementally, with other codecs the
+        response is decoded whole first. The lookup does not use the cache.
+
+        :param resource: The object type, for example constants.POOLS.
+        :type resource: string
+        :param id: The object ID to lookup.
+        :type id: UUID string
+        :param path: The keys leading to the nested objects, the last one a
+          key of NESTED_MODELS.
+        :type path: tuple
+        :param timeout: Seconds the whole call may take. Defaults to
+          DRIVER_AGENT_TIMEOUT, or the adaptive timeout.
+        :type timeout: float
+        :raises DriverAgentNotFound: The circuit breaker is open.
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred.
+        :returns: An iterator of the nested objects. Nothing is yielded if
+          the object is not found.
+        """
+        path = tuple(path)
+        model = NESTED_MODELS[path[-1]]
+        for data in self._iter_response({constants.OBJECT: resource,
+                                         constants.ID: id}, path, timeout):
+            if data:
+                yield model.from_dict(data)
+
+    def iter_many(self, resource, ids, timeout=None):
+        """Get several objects of one type, one at a time.
+
+        Like get_many, but each object is built as soon as it is decoded
+        from the response instead of once the whole response is in. See
+        iter_nested. The lookup does not use the cache.
+
+        :raises DriverAgentNotFound: The circuit breaker is open.
+        :raises DriverAgentTimeout: The driver agent did not respond
+          inside the timeout.
+        :raises DriverError: An unexpected error occurred, or the response
+          does not match the request.
+        :returns: An iterator with, for each ID in order, the object or None
+          if not found.
+        """
+        model = RESOURCE_MODELS[resource]
+        ids = list(ids)
+        if not ids:
+            return
+        count = 0
+        for data in self._iter_response({constants.OBJECT: resource,
+                                         constants.IDS: ids}, (), timeout):
+            count += 1
+            if count > len(ids):
+                break
+            yield model.from_dict(data) if data else None
+        if count != len(ids):
+            raise driver_exceptions.DriverError(
+                operator_fault_string=('The driver agent returned an invalid '
+                                       'bulk get response.'))
+
+    def get_loadbalancers(self, loadbalancer_ids, timeout=None):
+        """Get load balancer objects. See get_many."""
+        return self.get_many(constants.LOADBALANCERS, loadbalancer_ids,
+                             timeout=timeout)
+
+    def get_listeners(self, listener_ids, timeout=None):
+        """Get listener objects. See get_many."""
+        return self.get_many(constants.LISTENERS, listener_ids,
+                             timeout=timeout)
+
+    def get_pools(self, pool_ids, timeout=None):
+        """Get pool objects. See get_many."""
+        return self.get_many(constants.POOLS, pool_ids,
+                             timeout=timeout)
+
+    def get_healthmonitors(self, healthmonitor_ids, timeout=None):
+        """Get health monitor objects. See get_many."""
+        return self.get_many(constants.HEALTHMONITORS, healthmonitor_ids,
+                             timeout=timeout)
+
+    def get_members(self, member_ids, timeout=None):
+        """Get member objects. See get_many."""
+        return self.get_many(constants.MEMBERS, member_ids,
+                             timeout=timeout)
+
+    def get_l7policies(self, l7policy_ids, timeout=None):
+        """Get L7 policy objects. See get_many."""
+        return self.get_many(constants.L7POLICIES, l7policy_ids,
+                             timeout=timeout)
+
+    def get_l7rules(self, l7rule_ids, timeout=None):
+        """Get L7 rule objects. See get_many."""
+        return self.get_many(constants.L7RULES, l7rule_ids,
+                             timeout=timeout)
@@ -229,3 +229,37 @@ class Conflict(Exception):
         self.operator_fault_string = kwargs.pop('operator_fault_string',
                                                 self.operator_fault_string)
         super().__init__(self.user_fault_string, *args, **kwargs)
+
+
+class DriverAgentBusy(Exception):
+    """Exception raised when a request is refused to bound queueing.
+
+    Raised when too many requests of the same kind already wait to be sent
+    to the driver agent.
+    Each exception will include a message field that describes the
+    error.
+    :param fault_string: String describing the fault.
+    :type fault_string: string
+    """
+    fault_string = _("Too many driver-agent requests are queued.")
+
+    def __init__(self, *args, **kwargs):
+        self.fault_string = kwargs.pop('fault_string', self.fault_string)
+        super().__init__(self.fault_string, *args, **kwargs)
+
+
+class SpoolError(Exception):
+    """Exception raised when an update could not be spooled.
+
+    Raised when the spool cannot store an update, because of an error
+    writing the spool files or an update larger than the spool.
+    Each exception will include a message field that describes the
+    error.
+    :param fault_string: String describing the fault.
+    :type fault_string: string
+    """
+    fault_string = _("The update could not be spooled.")
+
+    def __init__(self, *args, **kwargs):
+        self.fault_string = kwargs.pop('fault_string', self.fault_string)
+        super().__init__(self.fault_string, *args, **kwargs)
@@ -0,0 +1,273 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Message framing for the driver agent sockets.
+
+Every message exchanged with the driver agent is the decimal size of the
+payload, a newline and then the payload itself::
+
+    20\\n{"status_code": 200}
+
+Protocol extensions add space separated key=value fields to the header,
+after the size, for example a request id used to match responses to
+requests on a multiplexed connection::
+
+    20 id=7\\n{"status_code": 200}
+
+A payload sent with the z=1 field is zlib compressed and the size is the
+compressed size. Compressed payloads are decompressed while they are
+received, one chunk at a time, so the compressed frame is never held in
+memory in full. iter_frame goes one step further and hands out the payload
+chunk by chunk, for decoders that do not need all of it at once.
+
+The reader below never reads past the end of the frame it was asked for, so
+it can be used on persistent connections, and it never sleeps: each receive
+blocks in the kernel until data arrives or the socket timeout expires.
+"""
+
+import socket
+import time
+import zlib
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.i18n import _
+
+HEADER_TERMINATOR = b'\n'
+HEADER_FIELD_SEPARATOR = b' '
+# Plenty for the decimal size of any payload we could allocate and a few
+# header fields.
+MAX_HEADER_SIZE = 128
+# Responses that fit in one peek are consumed with a single receive.
+PEEK_SIZE = 8192
+# Header field flagging a zlib compressed payload.
+COMPRESSED = 'z'
+# Favor speed, the driver agent is a local peer.
+COMPRESSION_LEVEL = 1
+# Compressed payloads and streamed payloads are handled in chunks of this
+# size.
+CHUNK_SIZE = 65536
+
+
+def encode_header(payload_size, fields=None):
+    if not fields:
+        return b'%d\n' % payload_size
+    return b'%d %s\n' % (payload_size, HEADER_FIELD_SEPARATOR.join(
+        f'{key}={value}'.encode() for key, value in fields.items()))
+
+
+def decode_header(header):
+    """Parse a frame header, without its terminator.
+
+    :param header: The header bytes.
+    :type header: bytes
+    :raises ValueError: The header is invalid.
+    :returns: A (payload size, fields) tuple, fields being a dictionary of
+      strings.
+    """
+    size, *tokens = header.split(HEADER_FIELD_SEPARATOR)
+    fields = {}
+    for token in tokens:
+        key, sep, value = token.decode().partition('=')
+        if not sep:
+            raise ValueError(_('Invalid driver agent message header.'))
+        fields[key] = value
+    return int(size), fields
+
+
+def compress(payload, fields=None):
+    """Compress a payload and flag it in the header fields.
+
+    :returns: A (compressed payload, fields) tuple.
+    """
+    fields = dict(fields or {})
+    fields[COMPRESSED] = 1
+    return zlib.compress(payload, COMPRESSION_LEVEL), fields
+
+
+def send_frame(sock, payload, fields=None):
+    """Send one framed payload.
+
+    The header and payload go out in a single scatter/gather system call
+    without being concatenated first.
+
+    :param sock: A connected stream socket.
+    :param payload: The encoded payload.
+    :type payload: bytes
+    :param fields: Optional header fields. Keys and values must not contain
+      spaces, equal signs or newlines.
+    :type fields: dict
+    """
+    header = encode_header(len(payload), fields)
+    sent = sock.sendmsg([header, payload])
+    if sent < len(header):
+        sock.sendall(header[sent:])
+        sock.sendall(payload)
+    elif sent < len(header) + len(payload):
+        sock.sendall(memoryview(payload)[sent - len(header):])
+
+
+def _check_deadline(deadline, timeout):
+    if time.monotonic() >= deadline:
+        raise driver_exceptions.DriverAgentTimeout(
+            fault_string=('The driver agent did not respond in {} '
+                          'seconds.'.format(timeout)))
+
+
+def _closed():
+    return ConnectionResetError(_('The driver agent closed the connection.'))
+
+
+def _peek(sock, deadline, timeout):
+    while True:
+        try:
+            data = sock.recv(PEEK_SIZE, socket.MSG_PEEK)
+        except socket.timeout:
+            # We could have an overloaded DB and the query may take too
+            # long, so keep waiting until the deadline expires.
+            _check_deadline(deadline, timeout)
+            continue
+        if not data:
+            raise _closed()
+        return data
+
+
+def _recv_into(sock, buffer, deadline, timeout):
+    view = memoryview(buffer)
+    offset = 0
+    while offset < len(view):
+        try:
+            received = sock.recv_into(view[offset:])
+        except socket.timeout:
+            _check_deadline(deadline, timeout)
+            continue
+        if not received:
+            raise _closed()
+        offset += received
+        if offset < len(view):
+            # A slow trickle of data must not outlast the deadline either.
+            _check_deadline(deadline, timeout)
+
+
+def _iter_payload(sock, size, compressed, deadline, timeout):
+    # Yields the payload in chunks of at most CHUNK_SIZE bytes. The chunks
+    # share one buffer, each is only valid until the next one is requested.
+    chunk = memoryview(bytearray(min(size, CHUNK_SIZE)))
+    decompressor = zlib.decompressobj() if compressed else None
+    remaining = size
+    try:
+        while remaining:
+            received = chunk[:min(remaining, len(chunk))]
+            _recv_into(sock, received, deadline, timeout)
+            remaining -= len(received)
+            if decompressor is None:
+                yield received
+                continue
+            data = decompressor.decompress(received, CHUNK_SIZE)
+            while data:
+                yield data
+                data = decompressor.decompress(decompressor.unconsumed_tail,
+                                               CHUNK_SIZE)
+        if decompressor is not None:
+            data = decompressor.flush()
+            if data:
+                yield data
+    except zlib.error as e:
+        raise ValueError(_('Invalid compressed driver agent message.')) from e
+    if decompressor is not None and not decompressor.eof:
+        raise ValueError(_('Invalid compressed driver agent message.'))
+
+
+def _recv_header(sock, deadline, timeout):
+    # Returns the payload size, the header fields, the header size and the
+    # peeked data, leaving the header unconsumed.
+    header = b''
+    while True:
+        data = _peek(sock, deadline, timeout)
+        index = data.find(HEADER_TERMINATOR)
+        if index < 0:
+            header += data
+            if len(header) > MAX_HEADER_SIZE:
+                raise ValueError(_('Invalid driver agent message header.'))
+            # Consume the partial header so the next peek waits for more.
+            _recv_into(sock, bytearray(len(data)), deadline, timeout)
+            continue
+        payload_size, fields = decode_header(header + data[:index])
+        return payload_size, fields, index + 1, data
+
+
+def recv_frame(sock, timeout):
+    """Receive one framed payload.
+
+    :param sock: A connected stream socket.
+    :param timeout: Seconds to wait for the complete frame.
+    :type timeout: int
+    :raises DriverAgentTimeout: The frame did not arrive in time.
+    :raises ConnectionResetError: The peer closed the connection.
+    :raises ValueError: The frame header is invalid.
+    :returns: The payload as a bytearray.
+    """
+    return recv_frame_with_fields(sock, timeout)[1]
+
+
+def recv_frame_with_fields(sock, timeout):
+    """Receive one framed payload and its header fields.
+
+    See recv_frame.
+
+    :returns: A (fields, payload) tuple.
+    """
+    deadline = time.monotonic() + timeout
+    payload_size, fields, header_size, data = _recv_header(sock, deadline,
+                                                           timeout)
+
+    if fields.get(COMPRESSED) == '1':
+        _recv_into(sock, bytearray(header_size), deadline, timeout)
+        payload = bytearray()
+        for chunk in _iter_payload(sock, payload_size, True, deadline,
+                                   timeout):
+            payload += chunk
+        return fields, payload
+
+    if header_size + payload_size <= len(data):
+        # The whole frame is already waiting, take it in one go.
+        frame = bytearray(header_size + payload_size)
+        _recv_into(sock, frame, deadline, timeout)
+        return fields, frame[header_size:]
+
+    _recv_into(sock, bytearray(header_size), deadline, timeout)
+    payload = bytearray(payload_size)
+    _recv_into(sock, payload, deadline, timeout)
+    return fields, payload
+
+
+def iter_frame(sock, timeout):
+    """Receive one framed payload in chunks, as it arrives.
+
+    Only one chunk is held in memory at a time, whatever the payload size.
+    Each chunk is only valid until the next one is requested. A caller that
+    stops iterating early leaves the rest of the frame unread and must close
+    the connection.
+
+    :param sock: A connected stream socket.
+    :param timeout: Seconds to wait for the complete frame.
+    :type timeout: int
+    :raises DriverAgentTimeout: The frame did not arrive in time.
+    :raises ConnectionResetError: The peer closed the connection.
+    :raises ValueError: The frame header is invalid.
+    :returns: An iterator of bytes-like payload chunks, decompressed if the
+      frame was compressed.
+    """
+    deadline = time.monotonic() + timeout
+    payload_size, fields, header_size, data = _recv_header(sock, deadline,
+                                                           timeout)
+    _recv_into(sock, bytearray(header_size), deadline, timeout)
+    yield from _iter_payload(sock, payload_size,
+                             fields.get(COMPRESSED) == '1', deadline, timeout)
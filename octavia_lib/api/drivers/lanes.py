@@ -0,0 +1,144 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from concurrent import futures
+import threading
+import time
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import metrics as metrics_lib
+from octavia_lib.i18n import _
+
+# The lanes of the DriverLibrary calls.
+STATUS = 'status'
+GET = 'get'
+STATS = 'stats'
+LANES = (STATUS, GET, STATS)
+
+
+class Lane():
+    """Runs one kind of call on worker threads of its own.
+
+    At most workers calls run at once, the others wait in a queue for a
+    free worker. When queue_limit calls are already waiting, submit()
+    refuses the call with DriverAgentBusy instead of letting the queue, and
+    the latency of the calls in it, grow without bound. Giving each kind of
+    call a lane of its own keeps a flood of one kind from delaying the
+    others.
+
+    :param name: The lane name, for example STATS.
+    :type name: string
+    :param workers: Calls running at once.
+    :type workers: int
+    :param queue_limit: Calls waiting for a worker at most. Defaults to no
+      limit.
+    :type queue_limit: int
+    :param metrics: Record the queue depth seen by each call, its wait for
+      a worker and the refused calls in this registry, labeled with the
+      lane name.
+    :type metrics: metrics.MetricsRegistry
+    """
+
+    def __init__(self, name, workers, queue_limit=None, metrics=None):
+        if workers < 1:
+            raise ValueError(_('workers must be at least 1.'))
+        if queue_limit is not None and queue_limit < 0:
+            raise ValueError(_('queue_limit cannot be negative.'))
+        self.name = name
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.metrics = metrics
+        self._executor = None
+        self._queued = 0
+        self._running = 0
+        self._max_queued = 0
+        self._rejected = 0
+        self._completed = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on a worker of the lane.
+
+        :returns: A concurrent.futures.Future resolving to the result of
+          fn, or failing with its exception, or with DriverAgentBusy if the
+          queue is full.
+        """
+        executor = None
+        with self._lock:
+            queued = self._queued
+            if (self.queue_limit is not None and
+                    queued + self._running >= self.workers +
+                    self.queue_limit):
+                self._rejected += 1
+            else:
+                self._queued += 1
+                self._max_queued = max(self._max_queued, self._queued)
+                if self._executor is None:
+                    self._executor = futures.ThreadPoolExecutor(
+                        self.workers,
+                        thread_name_prefix='octavia-lane-{}'.format(
+                            self.name))
+                executor = self._executor
+        if self.metrics is not None:
+            self.metrics.observe(metrics_lib.LANE_QUEUE_DEPTH, queued,
+                                 metrics_lib.DEPTH_BUCKETS, lane=self.name)
+        if executor is None:
+            # Rejected
+            if self.metrics is not None:
+                self.metrics.increment(metrics_lib.LANE_REJECTED,
+                                       lane=self.name)
+            future = futures.Future()
+            future.set_exception(driver_exceptions.DriverAgentBusy(
+                fault_string=_('The {} lane queue is full.').format(
+                    self.name)))
+            return future
+        return executor.submit(self._run, time.monotonic(), fn, args,
+                               kwargs)
+
+    def _run(self, submitted, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        if self.metrics is not None:
+            self.metrics.observe(metrics_lib.LANE_WAIT_SECONDS,
+                                 time.monotonic() - submitted,
+                                 lane=self.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def stats(self):
+        """Return the lane counters.
+
+        :returns: A dictionary with the workers, the calls queued and
+          running now, the most calls ever queued, and the calls rejected
+          and completed so far.
+        """
+        with self._lock:
+            return {'workers': self.workers, 'queued': self._queued,
+                    'running': self._running,
+                    'max_queued': self._max_queued,
+                    'rejected': self._rejected,
+                    'completed': self._completed}
+
+    def close(self):
+        """Wait for the submitted calls and stop the worker threads.
+
+        The lane stays usable, new workers start on the next submit().
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
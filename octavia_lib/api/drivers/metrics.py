@@ -0,0 +1,255 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import threading
+import time
+
+# The phases of a driver agent call. CONNECT covers connecting, or taking a
+# connection from the pool, and the codec negotiation. RECEIVE covers waiting
+# for the driver agent and reading its response. HYDRATE is building the data
+# model objects once the call returned.
+CONNECT = 'connect'
+ENCODE = 'encode'
+SEND = 'send'
+RECEIVE = 'receive'
+DECODE = 'decode'
+HYDRATE = 'hydrate'
+TOTAL = 'total'
+
+# Metrics recorded for each driver agent call, labeled with its operation
+# and, for gets, resource. CALL_SECONDS is also labeled with the phase and
+# ERRORS with the exception class name.
+CALLS = 'calls'
+ERRORS = 'errors'
+RETRIES = 'retries'
+BYTES_SENT = 'bytes_sent'
+BYTES_RECEIVED = 'bytes_received'
+CALL_SECONDS = 'call_seconds'
+REQUEST_BYTES = 'request_bytes'
+RESPONSE_BYTES = 'response_bytes'
+
+# Metrics recorded by the lanes.Lane of each kind of call, labeled with the
+# lane: how many calls were waiting for a worker when each call was
+# submitted, how long each waited and how many were refused.
+LANE_QUEUE_DEPTH = 'lane_queue_depth'
+LANE_WAIT_SECONDS = 'lane_wait_seconds'
+LANE_REJECTED = 'lane_rejected'
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576,
+                4194304, 16777216)
+DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram():
+    """Counts observed values in fixed buckets.
+
+    :param buckets: The upper bounds of the buckets, in increasing order.
+      Larger values land in an implicit +Inf bucket.
+    :type buckets: tuple
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Return the count, sum and cumulative bucket counts.
+
+        :returns: A dictionary with the count, the sum and the buckets as a
+          list of [upper bound, count of values up to it] pairs, the last
+          one with a '+Inf' bound.
+        """
+        buckets = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            buckets.append([bound, total])
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class Call():
+    """The measurements of one driver agent call.
+
+    Passed to the MetricsRegistry hooks once the call is over.
+
+    :ivar operation: The DriverLibrary operation, for example 'get'.
+    :ivar resource: The object type of a get, None otherwise.
+    :ivar phases: Seconds spent in each phase, keyed by phase.
+    :ivar duration: Seconds the whole call took.
+    :ivar bytes_sent: Payload bytes sent to the driver agent.
+    :ivar bytes_received: Payload bytes received from the driver agent.
+    :ivar retries: Requests sent again on another connection.
+    :ivar error: The exception the call failed with, or None.
+    """
+
+    def __init__(self, operation, resource=None):
+        self.operation = operation
+        self.resource = resource
+        self.phases = {}
+        self.duration = None
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.error = None
+        self._start = time.perf_counter()
+
+    def timed(self, phase, start):
+        """Add the time since start to a phase.
+
+        :param phase: The phase, for example CONNECT.
+        :param start: When the phase started, from time.perf_counter().
+        :returns: The current time.perf_counter(), to start the next phase.
+        """
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0) + now - start
+        return now
+
+
+class MetricsRegistry():
+    """In-process counters and histograms of the DriverLibrary calls.
+
+    Pass a registry to DriverLibrary to instrument it, without one nothing
+    is measured. Each call is counted and its latency, overall and for each
+    phase, its payload sizes, retries and errors are recorded, labeled with
+    the operation and resource. snapshot() returns everything as a
+    dictionary, ready to be handed to an exporter.
+
+    Hooks are called with the Call object of each call once it is over, in
+    the thread that completed it, for tracing or exporting calls one by
+    one. They must be quick and must not raise.
+
+    :param latency_buckets: Histogram bucket bounds of the latencies, in
+      seconds.
+    :type latency_buckets: tuple
+    :param size_buckets: Histogram bucket bounds of the payload sizes, in
+      bytes.
+    :type size_buckets: tuple
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS,
+                 size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self._hooks = []
+        # (name, sorted label items) to value, or to Histogram
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """Call hook(call) with the Call object of every call."""
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook):
+        with self._lock:
+            self._hooks = [item for item in self._hooks if item != hook]
+
+    def _increment(self, name, labels, value):
+        # Called with the lock held.
+        key = (name, labels)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _observe(self, name, labels, value, buckets):
+        # Called with the lock held.
+        key = (name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+    def increment(self, name, value=1, **labels):
+        """Add value to a counter."""
+        with self._lock:
+            self._increment(name, tuple(sorted(labels.items())), value)
+
+    def observe(self, name, value, buckets=None, **labels):
+        """Record a value in a histogram.
+
+        :param buckets: The histogram bucket bounds, when it is created.
+          Defaults to the latency buckets.
+        """
+        with self._lock:
+            self._observe(name, tuple(sorted(labels.items())), value,
+                          buckets or self.latency_buckets)
+
+    def start_call(self, operation, resource=None):
+        """Return the Call object measuring a call that starts now."""
+        return Call(operation, resource)
+
+    def finish_call(self, call, error=None):
+        """Record a call that is over and pass it to the hooks."""
+        call.duration = time.perf_counter() - call._start
+        call.error = error
+        labels = ((('operation', call.operation),) if call.resource is None
+                  else (('operation', call.operation),
+                        ('resource', call.resource)))
+        with self._lock:
+            self._increment(CALLS, labels, 1)
+            if error is not None:
+                self._increment(ERRORS, labels + (
+                    ('error', type(error).__name__),), 1)
+            if call.retries:
+                self._increment(RETRIES, labels, call.retries)
+            self._observe(CALL_SECONDS, labels + (('phase', TOTAL),),
+                          call.duration, self.latency_buckets)
+            for phase, seconds in call.phases.items():
+                self._observe(CALL_SECONDS, labels + (('phase', phase),),
+                              seconds, self.latency_buckets)
+            if call.bytes_sent:
+                self._increment(BYTES_SENT, labels, call.bytes_sent)
+                self._observe(REQUEST_BYTES, labels, call.bytes_sent,
+                              self.size_buckets)
+            if call.bytes_received:
+                self._increment(BYTES_RECEIVED, labels, call.bytes_received)
+                self._observe(RESPONSE_BYTES, labels, call.bytes_received,
+                              self.size_buckets)
+            hooks = self._hooks
+        for hook in hooks:
+            hook(call)
+
+    def snapshot(self):
+        """Return every metric recorded so far.
+
+        :returns: A dictionary with 'counters' and 'histograms', each
+          mapping a metric name to a list of {'labels': {...}, ...}
+          dictionaries, one per set of labels, holding the 'value' of a
+          counter or the Histogram.snapshot() of a histogram.
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, histogram.snapshot())
+                          for key, histogram in self._histograms.items()]
+        result = {'counters': {}, 'histograms': {}}
+        for (name, labels), value in counters:
+            result['counters'].setdefault(name, []).append(
+                {'labels': dict(labels), 'value': value})
+        for (name, labels), histogram in histograms:
+            result['histograms'].setdefault(name, []).append(
+                {'labels': dict(labels), **histogram})
+        return result
+
+    def reset(self):
+        """Forget every metric recorded so far."""
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
@@ -0,0 +1,292 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Pipelined requests over a single driver agent connection.
+
+Each request frame carries a request id in its header and the driver agent
+echoes that id in the header of the matching response::
+
+    34 id=7\\n{"object": "pools", "id": "..."}
+
+so any number of requests can be in flight on one connection and the
+responses can come back in any order. This requires a driver agent that
+supports multiplexed connections.
+
+On a unified channel, a single connection carrying the status, stats and
+get requests alike, each request frame also carries its message type::
+
+    34 id=7 t=get\n{"object": "pools", "id": "..."}
+
+Requests of a higher priority type are sent first when several wait for the
+connection, so status updates and gets never queue behind statistics.
+"""
+
+import collections
+from concurrent import futures
+import heapq
+import itertools
+import select
+import socket
+import threading
+import time
+
+from octavia_lib.api.drivers import codec as codec_lib
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.api.drivers import timeouts
+from octavia_lib.i18n import _
+
+REQUEST_ID = 'id'
+MESSAGE_TYPE = 't'
+
+# The message types of a unified channel.
+STATUS = 'status'
+STATS = 'stats'
+GET = 'get'
+MESSAGE_TYPES = (STATUS, STATS, GET)
+# Send priority of each message type, lower first.
+PRIORITIES = {STATUS: 0, GET: 0, STATS: 1}
+
+
+class PriorityLock():
+    """A lock handed to the waiting thread of lowest priority value first.
+
+    Threads waiting with the same priority get the lock in no particular
+    order. A thread of a higher priority value waits for as long as threads
+    of a lower one are waiting.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._held = False
+        self._waiting = collections.Counter()
+
+    def acquire(self, priority=0):
+        with self._condition:
+            self._waiting[priority] += 1
+            try:
+                while self._held or any(
+                        count for waiting, count in self._waiting.items()
+                        if waiting < priority):
+                    self._condition.wait()
+            finally:
+                self._waiting[priority] -= 1
+            self._held = True
+
+    def release(self):
+        with self._condition:
+            self._held = False
+            self._condition.notify_all()
+
+
+class MultiplexedConnection():
+    """A driver agent connection carrying many concurrent requests.
+
+    request() sends a request and returns a concurrent.futures.Future right
+    away. A reader thread receives the responses and resolves the futures
+    in whatever order the driver agent answers.
+
+    A request not answered within its timeout, request_timeout by default,
+    fails with DriverAgentTimeout. If the connection breaks every pending
+    request fails with the error and the connection is closed, closed()
+    then returns True.
+
+    :param socket_path: Path to the driver agent unix socket.
+    :type socket_path: string
+    :param socket_timeout: Timeout, in seconds, to connect and to send.
+    :type socket_timeout: int
+    :param request_timeout: Default seconds to wait for each response.
+    :type request_timeout: int
+    :param codecs: The payload codecs to offer the driver agent, preferred
+      first. Defaults to JSON without negotiation.
+    :type codecs: list
+    :param compression_threshold: Offer zlib compression of payloads of at
+      least this many bytes. Defaults to no compression.
+    :type compression_threshold: int
+    :param deadline: The timeouts.Deadline by which connecting and the codec
+      negotiation must be done. Defaults to request_timeout from now.
+    :type deadline: Deadline
+    """
+
+    def __init__(self, socket_path, socket_timeout, request_timeout,
+                 codecs=None, compression_threshold=None, deadline=None):
+        self.socket_path = socket_path
+        self.request_timeout = request_timeout
+        if deadline is None:
+            deadline = timeouts.Deadline(request_timeout)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.settimeout(deadline.socket_timeout(socket_timeout))
+            self._sock.connect(socket_path)
+            self._sock.settimeout(deadline.socket_timeout(socket_timeout))
+            self.wire_format = codec_lib.negotiate(
+                self._sock, codecs or [codec_lib.JSON.name],
+                deadline.remaining(),
+                compression_threshold=compression_threshold)
+            self._sock.settimeout(socket_timeout)
+        except Exception:
+            self._sock.close()
+            raise
+        self._ids = itertools.count()
+        # Request id to (future, timeout), and a heap of (deadline, request
+        # id) that may still hold answered requests.
+        self._pending = {}
+        self._deadlines = []
+        # Written to when a request expires before the reader would wake up.
+        self._wakeup_recv, self._wakeup_send = socket.socketpair()
+        self._wakeup_send.setblocking(False)
+        self._wakeup_at = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._send_lock = PriorityLock()
+        self._reader = threading.Thread(target=self._read, daemon=True,
+                                        name='octavia-multiplex-reader')
+        self._reader.start()
+
+    def closed(self):
+        """Return True once the connection can no longer be used."""
+        with self._lock:
+            return self._error is not None
+
+    def request(self, data, timeout=None, message_type=None):
+        """Send a request without waiting for its response.
+
+        :param data: The request, encoded with the connection codec.
+        :param timeout: Seconds to wait for the response. Defaults to
+          request_timeout.
+        :type timeout: float
+        :param message_type: STATUS, STATS or GET on a unified channel,
+          None otherwise.
+        :type message_type: string
+        :returns: A Future resolving to the decoded response.
+        """
+        if timeout is None:
+            timeout = self.request_timeout
+        future = futures.Future()
+        payload, fields = self.wire_format.encode(data)
+        fields = dict(fields or {})
+        if message_type is not None:
+            fields[MESSAGE_TYPE] = message_type
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if self._error is not None:
+                future.set_exception(self._error)
+                return future
+            request_id = next(self._ids)
+            self._pending[request_id] = (future, timeout)
+            heapq.heappush(self._deadlines, (deadline, request_id))
+            wakeup = (self._wakeup_at is not None and
+                      deadline < self._wakeup_at)
+            if wakeup:
+                self._wakeup_at = deadline
+        if wakeup:
+            try:
+                self._wakeup_send.send(b'\0')
+            except OSError:
+                # Already woken up, or closed.
+                pass
+        fields[REQUEST_ID] = request_id
+        self._send_lock.acquire(PRIORITIES.get(message_type, 0))
+        try:
+            framing.send_frame(self._sock, payload, fields)
+        except Exception as e:
+            # A partial frame leaves the stream unusable for everyone.
+            self._fail(e)
+        finally:
+            self._send_lock.release()
+        return future
+
+    def _expire(self):
+        # Fails the expired requests and returns when the reader must wake up
+        # next.
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._deadlines:
+                deadline, request_id = self._deadlines[0]
+                if request_id in self._pending and deadline > now:
+                    break
+                heapq.heappop(self._deadlines)
+                if request_id in self._pending:
+                    expired.append(self._pending.pop(request_id))
+            else:
+                deadline = now + self.request_timeout
+            self._wakeup_at = deadline
+        for future, timeout in expired:
+            future.set_exception(driver_exceptions.DriverAgentTimeout(
+                fault_string=('The driver agent did not respond in {} '
+                              'seconds.'.format(timeout))))
+        return deadline
+
+    def _read(self):
+        try:
+            while True:
+                # A request expiring earlier than wakeup_at writes to the
+                # wakeup socket.
+                wait = max(self._expire() - time.monotonic(), 0)
+                readable, _w, _x = select.select(
+                    [self._sock, self._wakeup_recv], [], [], wait)
+                if self._wakeup_recv in readable:
+                    self._wakeup_recv.recv(4096)
+                if self._sock not in readable:
+                    continue
+                fields, payload = framing.recv_frame_with_fields(
+                    self._sock, self.request_timeout)
+                response = self.wire_format.decode(payload)
+                with self._lock:
+                    entry = self._pending.pop(
+                        int(fields.get(REQUEST_ID, -1)), None)
+                # Responses to expired requests are dropped.
+                if entry is not None:
+                    entry[0].set_result(response)
+        except Exception as e:
+            self._fail(e)
+
+    def _fail(self, error):
+        with self._lock:
+            if self._error is None:
+                self._error = error
+            pending, self._pending = self._pending, {}
+            self._deadlines = []
+        try:
+            # Wakes up the reader thread
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        for future, timeout in pending.values():
+            future.set_exception(error)
+
+    def close(self):
+        """Close the connection, failing the pending requests."""
+        self._fail(ConnectionResetError(
+            _('The multiplexed connection was closed.')))
+        if threading.current_thread() is not self._reader:
+            self._reader.join()
+        self._sock.close()
+        self._wakeup_recv.close()
+        self._wakeup_send.close()
+
+    def after_fork(self):
+        """Let go of the parent's connection in a forked child process.
+
+        The reader thread does not exist in the child, so the connection is
+        closed in the child only, without shutting it down as the parent
+        keeps using it. The pending requests are the parent's and are
+        dropped. closed() then returns True.
+        """
+        self._lock = threading.Lock()
+        self._send_lock = PriorityLock()
+        self._error = ConnectionResetError(
+            _('The multiplexed connection belongs to the parent process.'))
+        self._pending = {}
+        self._deadlines = []
+        for sock in (self._sock, self._wakeup_recv, self._wakeup_send):
+            sock.close()
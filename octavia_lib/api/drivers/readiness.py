@@ -0,0 +1,112 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Waiting for the driver agent sockets to appear.
+
+On Linux the socket directories are watched with inotify, so the wait ends
+as soon as the last socket is created. Elsewhere, or when a socket
+directory does not exist yet, the sockets are polled every POLL_INTERVAL
+seconds instead.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+
+POLL_INTERVAL = 0.1
+
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+
+_libc = None
+
+
+def _inotify_libc():
+    # Returns the C library if it provides inotify, None otherwise.
+    global _libc
+    if _libc is None:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        except OSError:
+            libc = False
+        if libc and not (hasattr(libc, 'inotify_init1') and
+                         hasattr(libc, 'inotify_add_watch')):
+            libc = False
+        _libc = libc
+    return _libc or None
+
+
+def _watch(directories):
+    # Returns an inotify file descriptor watching the directories for new
+    # entries, or None if that is not possible.
+    libc = _inotify_libc()
+    if libc is None:
+        return None
+    fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    if fd < 0:
+        return None
+    for directory in directories:
+        if libc.inotify_add_watch(fd, os.fsencode(directory),
+                                  _IN_CREATE | _IN_MOVED_TO) < 0:
+            os.close(fd)
+            return None
+    return fd
+
+
+def wait_for_sockets(paths, timeout, use_inotify=True):
+    """Wait until all the paths exist.
+
+    :param paths: The socket paths.
+    :type paths: list
+    :param timeout: Seconds to wait at most.
+    :type timeout: float
+    :param use_inotify: Watch with inotify when available, poll otherwise.
+    :type use_inotify: bool
+    :raises DriverAgentNotFound: A socket did not appear in time.
+    """
+    deadline = time.monotonic() + timeout
+    missing = [path for path in paths if not os.path.exists(path)]
+    if not missing:
+        return
+    fd = None
+    if use_inotify:
+        fd = _watch({os.path.dirname(os.path.abspath(path))
+                     for path in missing})
+    try:
+        while True:
+            # Checked after the watch is set up, so no creation is missed.
+            missing = [path for path in missing if not os.path.exists(path)]
+            if not missing:
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise driver_exceptions.DriverAgentNotFound(
+                    fault_string=('Unable to open the driver agent '
+                                  'socket: {}'.format(missing[0])))
+            if fd is None:
+                time.sleep(min(POLL_INTERVAL, remaining))
+                continue
+            readable, _w, _x = select.select([fd], [], [], remaining)
+            if readable:
+                # The events only tell us to check again.
+                try:
+                    os.read(fd, 4096)
+                except BlockingIOError:
+                    pass
+    finally:
+        if fd is not None:
+            os.close(fd)
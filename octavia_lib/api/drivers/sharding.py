@@ -0,0 +1,155 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import collections
+import hashlib
+import threading
+import time
+
+from octavia_lib.api.drivers import circuit_breaker
+from octavia_lib.i18n import _
+
+# Points of each endpoint on the hash ring. More points spread the keys more
+# evenly.
+REPLICAS = 100
+
+UP = 'UP'
+DOWN = 'DOWN'
+
+# The sockets of one driver agent.
+Endpoint = collections.namedtuple(
+    'Endpoint', ['status_socket', 'stats_socket', 'get_socket'])
+
+
+def _hash(value):
+    digest = hashlib.md5(value.encode('utf-8'), usedforsecurity=False)
+    return int.from_bytes(digest.digest()[:8], 'big')
+
+
+class HashRing():
+    """Maps keys to endpoints with consistent hashing.
+
+    Each endpoint is placed at replicas points of a ring, hashed from its
+    status socket path so every process builds the same ring whatever the
+    order of the endpoints. A key belongs to the endpoint of the first point
+    at or after its own hash. Skipping an endpoint only moves the keys it
+    owns, spread over the other endpoints, and they move back once it is no
+    longer skipped.
+
+    :param endpoints: The Endpoint objects.
+    :type endpoints: list
+    :param replicas: Points of each endpoint on the ring.
+    :type replicas: int
+    """
+
+    def __init__(self, endpoints, replicas=REPLICAS):
+        if not endpoints:
+            raise ValueError(_('At least one endpoint is required.'))
+        points = sorted(
+            (_hash('{}-{}'.format(endpoint.status_socket, replica)),
+             endpoint)
+            for endpoint in endpoints for replica in range(replicas))
+        self._hashes = [point[0] for point in points]
+        self._endpoints = [point[1] for point in points]
+
+    def lookup(self, key, skip=()):
+        """Return the endpoint owning key, or None if all are skipped.
+
+        :param key: The routing key, a load balancer ID for example.
+        :type key: string
+        :param skip: Endpoints to pass over.
+        """
+        start = bisect.bisect_left(self._hashes, _hash(str(key)))
+        for index in range(len(self._endpoints)):
+            endpoint = self._endpoints[(start + index) % len(self._endpoints)]
+            if endpoint not in skip:
+                return endpoint
+        return None
+
+
+class ShardRouter():
+    """Routes requests over driver agent endpoints, avoiding failed ones.
+
+    route() picks the endpoint of a key on a HashRing. An endpoint that
+    failed a call, because it could not be reached or timed out, is marked
+    DOWN and passed over for down_interval seconds, its keys going to the
+    next endpoints on the ring meanwhile. Then it gets its keys back, and is
+    marked DOWN again if it still fails. When every endpoint is DOWN, keys
+    go to their own endpoint.
+
+    :param endpoints: The Endpoint objects.
+    :type endpoints: list
+    :param down_interval: Seconds a failed endpoint is passed over.
+    :type down_interval: float
+    :param replicas: Points of each endpoint on the ring.
+    :type replicas: int
+    """
+
+    def __init__(self, endpoints, down_interval, replicas=REPLICAS):
+        self.endpoints = list(endpoints)
+        self.down_interval = down_interval
+        self.ring = HashRing(self.endpoints, replicas)
+        # Endpoint to when it comes back up
+        self._down_until = {}
+        self._failures = {endpoint: 0 for endpoint in self.endpoints}
+        self._lock = threading.Lock()
+
+    def _down(self):
+        # Called with the lock held.
+        now = time.monotonic()
+        for endpoint, until in list(self._down_until.items()):
+            if until <= now:
+                del self._down_until[endpoint]
+        return self._down_until.keys()
+
+    def route(self, key, exclude=()):
+        """Return the endpoint to send a request for key to.
+
+        :param key: The routing key, a load balancer ID for example.
+        :type key: string
+        :param exclude: Endpoints not to return, unless all of them are.
+        """
+        with self._lock:
+            down = set(self._down())
+        if exclude:
+            down.update(exclude)
+        endpoint = self.ring.lookup(key, down) if down else None
+        if endpoint is None:
+            endpoint = (self.ring.lookup(key, exclude) or
+                        self.ring.lookup(key))
+        return endpoint
+
+    def report(self, endpoint, error=None):
+        """Record the outcome of a call to endpoint."""
+        if error is not None and not circuit_breaker.is_failure(error):
+            # The driver agent did answer.
+            error = None
+        with self._lock:
+            if error is None:
+                self._down_until.pop(endpoint, None)
+                return
+            self._failures[endpoint] += 1
+            self._down_until[endpoint] = (time.monotonic() +
+                                          self.down_interval)
+
+    def stats(self):
+        """Return the state and failure count of each endpoint.
+
+        :returns: A dictionary keyed by endpoint status socket path.
+        """
+        with self._lock:
+            down = self._down()
+            return {endpoint.status_socket: {
+                'state': DOWN if endpoint in down else UP,
+                'failures': self._failures[endpoint]}
+                for endpoint in self.endpoints}
@@ -0,0 +1,457 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import contextlib
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from oslo_serialization import jsonutils
+
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+SEGMENT_SIZE = 1024 * 1024
+MAX_BYTES = 64 * 1024 * 1024
+
+# The kinds of spooled updates.
+STATUS = 1
+STATS = 2
+KINDS = (STATUS, STATS)
+
+SEGMENT_SUFFIX = '.seg'
+INDEX_FILE = 'index'
+LOCK_FILE = 'lock'
+
+# Payload length, CRC32 of the kind and payload, kind. A zero length marks
+# the end of the records of a segment.
+_HEADER = struct.Struct('>IIB')
+# Segment number and offset of the first record not replayed yet.
+_INDEX = struct.Struct('>QQ')
+
+# A spooled update. fields holds the (object type, object ID, field)
+# triples a status update sets.
+_Entry = collections.namedtuple(
+    '_Entry', ['number', 'segment', 'offset', 'kind', 'key', 'fields'])
+
+
+def _fields(data):
+    return frozenset((object_type, record[constants.ID], field)
+                     for object_type, records in data.items()
+                     for record in records
+                     if record.get(constants.ID) is not None
+                     for field in record if field != constants.ID)
+
+
+def _encode(key, data):
+    return jsonutils.dump_as_bytes([key, data], separators=(',', ':'))
+
+
+def _crc(kind, payload):
+    return zlib.crc32(payload, zlib.crc32(bytes((kind,))))
+
+
+@contextlib.contextmanager
+def _try_acquire(lock):
+    # Yields whether the lock was free, holding it if so. A with statement
+    # on the lock itself would wait for it.
+    acquired = lock.acquire(False)  # pylint: disable=consider-using-with
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            lock.release()
+
+
+class _Segment():
+    """A memory-mapped segment file of records appended one by one."""
+
+    def __init__(self, path, number, size=None):
+        self.path = path
+        self.number = number
+        with open(path, 'w+b' if size else 'r+b') as segment_file:
+            if size:
+                segment_file.truncate(size)
+            self.mmap = mmap.mmap(segment_file.fileno(), 0)
+        self.size = len(self.mmap)
+        # Where the next record goes.
+        self.end = 0
+
+    def scan(self):
+        """Yield the offset, kind and payload of each record.
+
+        Stops at the end of the records, or at a record torn by a crash.
+        """
+        offset = 0
+        while offset + _HEADER.size <= self.size:
+            length, crc, kind = _HEADER.unpack_from(self.mmap, offset)
+            start = offset + _HEADER.size
+            if not length or start + length > self.size:
+                break
+            payload = self.mmap[start:start + length]
+            if kind not in KINDS or crc != _crc(kind, payload):
+                break
+            yield offset, kind, payload
+            offset = start + length
+        self.end = offset
+
+    def append(self, kind, payload, sync):
+        """Write a record, return its offset or None if it does not fit."""
+        offset = self.end
+        start = offset + _HEADER.size
+        if start + len(payload) > self.size:
+            return None
+        self.mmap[start:start + len(payload)] = payload
+        # The header last, a crash leaves no half written record behind.
+        _HEADER.pack_into(self.mmap, offset, len(payload),
+                          _crc(kind, payload), kind)
+        if sync:
+            self.mmap.flush()
+        self.end = start + len(payload)
+        return offset
+
+    def read(self, offset):
+        length = _HEADER.unpack_from(self.mmap, offset)[0]
+        start = offset + _HEADER.size
+        return self.mmap[start:start + length]
+
+    def remove(self):
+        self.mmap.close()
+        os.unlink(self.path)
+
+
+class Spool():
+    """A durable, append-only store of status and statistics updates.
+
+    Holds the updates that could not be sent to the driver agent so they
+    are sent once it is back, see replay(). The updates are appended to
+    memory-mapped segment files of segment_size bytes in directory, so they
+    survive a restart. A small index file records how far the updates were
+    replayed. Segments are deleted once replayed.
+
+    A status update supersedes the fields it sets of the same objects in
+    older updates: replay() leaves those fields out, and the objects left
+    without any, and compact() rewrites the segments without them. At most
+    max_bytes of segments are kept, once compacting is not enough the
+    oldest segments are dropped to make room.
+
+    A spool directory can only be opened by one process at a time.
+
+    :param directory: Directory of the spool files, created if needed.
+    :type directory: string
+    :param segment_size: Size of each segment file, in bytes. A larger
+      update gets a segment of its own.
+    :type segment_size: int
+    :param max_bytes: Total size of the segment files at most, in bytes.
+    :type max_bytes: int
+    :param sync: Flush every update to disk before append() returns.
+    :type sync: bool
+    :raises BlockingIOError: Another process uses the spool directory.
+    """
+
+    def __init__(self, directory, segment_size=SEGMENT_SIZE,
+                 max_bytes=MAX_BYTES, sync=True):
+        if segment_size <= _HEADER.size:
+            raise ValueError(_('segment_size must be greater than {}.')
+                             .format(_HEADER.size))
+        if max_bytes < segment_size:
+            raise ValueError(_('max_bytes must be at least segment_size.'))
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.sync = sync
+        self.appended = 0
+        self.replayed = 0
+        self.superseded = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+        # Closed by close(), which releases the lock.
+        self._lock_fd = os.open(os.path.join(directory, LOCK_FILE),
+                                os.O_WRONLY | os.O_CREAT | os.O_CLOEXEC,
+                                0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self._lock_fd)
+            raise
+        # Segment number to _Segment, oldest first
+        self._segments = collections.OrderedDict()
+        self._next_segment = 0
+        self._entries = collections.deque()
+        self._next_entry = 0
+        # (object type, object ID, field) to the number of the latest entry
+        # setting it
+        self._latest = {}
+        # Superseded fields compact() would reclaim.
+        self._stale = 0
+        self._lock = threading.Lock()
+        # Held while updates are replayed or compacted.
+        self._replay_lock = threading.Lock()
+        self._load()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory,
+                            '{:020d}{}'.format(number, SEGMENT_SUFFIX))
+
+    def _load(self):
+        numbers = sorted(int(name[:-len(SEGMENT_SUFFIX)])
+                         for name in os.listdir(self.directory)
+                         if name.endswith(SEGMENT_SUFFIX))
+        first = (0, 0)
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), 'rb') as f:
+                first = _INDEX.unpack(f.read(_INDEX.size))
+        except (FileNotFoundError, struct.error):
+            pass
+        for number in numbers:
+            path = self._segment_path(number)
+            if number < first[0] or not os.path.getsize(path):
+                # Replayed, or created by a crash before its first update.
+                os.unlink(path)
+                continue
+            segment = _Segment(path, number)
+            self._segments[number] = segment
+            for offset, kind, payload in segment.scan():
+                if (number, offset) >= first:
+                    key, data = jsonutils.loads(payload)
+                    self._add_entry(segment, offset, kind, key, data)
+        self._next_segment = max([first[0]] +
+                                 [number + 1 for number in numbers])
+
+    def _add_entry(self, segment, offset, kind, key, data):
+        # Called with the lock held.
+        fields = _fields(data) if kind == STATUS else frozenset()
+        entry = _Entry(self._next_entry, segment, offset, kind, key, fields)
+        self._next_entry += 1
+        for field in fields:
+            if field in self._latest:
+                self.superseded += 1
+                self._stale += 1
+            self._latest[field] = entry.number
+        self._entries.append(entry)
+
+    def _new_segment(self, size):
+        # Called with the lock held.
+        number = self._next_segment
+        self._next_segment += 1
+        segment = _Segment(self._segment_path(number), number, size)
+        self._segments[number] = segment
+        return segment
+
+    def _size(self):
+        # Called with the lock held.
+        return sum(segment.size for segment in self._segments.values())
+
+    def _drop_oldest_segment(self):
+        # Called with the lock held.
+        number, segment = self._segments.popitem(last=False)
+        while self._entries and self._entries[0].segment is segment:
+            self._forget(self._entries.popleft())
+            self.dropped += 1
+        segment.remove()
+
+    def _forget(self, entry):
+        # Called with the lock held.
+        for field in entry.fields:
+            if self._latest.get(field) == entry.number:
+                del self._latest[field]
+
+    def _write(self, kind, payload):
+        # Called with the lock held. Returns the segment and offset of the
+        # record.
+        if self._segments:
+            segment = next(reversed(self._segments.values()))
+            offset = segment.append(kind, payload, self.sync)
+            if offset is not None:
+                return segment, offset
+        size = max(self.segment_size, _HEADER.size + len(payload))
+        if size > self.max_bytes:
+            raise ValueError(_('The update is larger than max_bytes.'))
+        if self._size() + size > self.max_bytes and self._stale:
+            with _try_acquire(self._replay_lock) as compacting:
+                if compacting:
+                    # Reclaim the superseded fields before dropping
+                    # anything.
+                    self._compact()
+            if compacting:
+                return self._write(kind, payload)
+        while self._size() + size > self.max_bytes:
+            self._drop_oldest_segment()
+        segment = self._new_segment(size)
+        return segment, segment.append(kind, payload, self.sync)
+
+    def append(self, kind, data, key=None):
+        """Spool an update, after the ones already spooled.
+
+        :param kind: STATUS or STATS.
+        :param data: The status or statistics update.
+        :type data: dict
+        :param key: The load balancer ID the update is routed by.
+        :type key: string
+        :raises ValueError: The update is larger than max_bytes.
+        """
+        payload = _encode(key, data)
+        with self._lock:
+            segment, offset = self._write(kind, payload)
+            self._add_entry(segment, offset, kind, key, data)
+            self.appended += 1
+
+    def _live(self, entry):
+        # Called with the lock held. The update of entry without the
+        # superseded fields, or None if nothing is left of it.
+        key, data = jsonutils.loads(entry.segment.read(entry.offset))
+        if not entry.fields:
+            return key, data
+        live = {}
+        for object_type, records in data.items():
+            live_records = []
+            for record in records:
+                object_id = record.get(constants.ID)
+                if object_id is not None:
+                    live_record = {
+                        field: value for field, value in record.items()
+                        if field == constants.ID or self._latest.get(
+                            (object_type, object_id, field)) == entry.number}
+                    if len(live_record) == 1 < len(record):
+                        # Every field was superseded, only the ID is left.
+                        continue
+                    record = live_record
+                live_records.append(record)
+            if live_records:
+                live[object_type] = live_records
+        return key, live or None
+
+    def _write_index(self):
+        # Called with the lock held.
+        if self._entries:
+            first = (self._entries[0].segment.number,
+                     self._entries[0].offset)
+        else:
+            first = (self._next_segment, 0)
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'wb') as index_file:
+            index_file.write(_INDEX.pack(*first))
+            if self.sync:
+                os.fsync(index_file.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _consumed(self, entry):
+        # Called with the lock held.
+        if not self._entries or self._entries[0] is not entry:
+            # Dropped meanwhile.
+            return
+        self._entries.popleft()
+        self._forget(entry)
+        if not self._entries:
+            # Everything was replayed, start over on a new segment.
+            self._next_segment = max(self._next_segment,
+                                     entry.segment.number + 1)
+            self._write_index()
+            for segment in self._segments.values():
+                segment.remove()
+            self._segments.clear()
+            return
+        self._write_index()
+        while next(iter(self._segments)) < self._entries[0].segment.number:
+            self._segments.popitem(last=False)[1].remove()
+
+    def replay(self, send):
+        """Pass the spooled updates to send, oldest first.
+
+        Each update is removed from the spool once send(kind, data, key)
+        returns True. Replay stops at the first update for which it returns
+        False, the update stays in the spool. Status updates are passed
+        without the objects a later spooled update has the status of.
+        Returns right away if another thread is replaying.
+
+        :param send: Called with the kind, the update and the key of each
+          spooled update.
+        :returns: The number of updates sent.
+        """
+        with _try_acquire(self._replay_lock) as replaying:
+            if not replaying:
+                return 0
+            sent = 0
+            while True:
+                with self._lock:
+                    if not self._entries:
+                        return sent
+                    entry = self._entries[0]
+                    key, data = self._live(entry)
+                if data is not None:
+                    if not send(entry.kind, data, key):
+                        return sent
+                    sent += 1
+                with self._lock:
+                    self._consumed(entry)
+                    if data is not None:
+                        self.replayed += 1
+
+    def _compact(self):
+        # Called with both locks held.
+        live = [(entry.kind, entry.key, self._live(entry)[1])
+                for entry in self._entries]
+        old = list(self._segments.values())
+        self._segments.clear()
+        self._entries.clear()
+        self._latest.clear()
+        self._stale = 0
+        for kind, key, data in live:
+            if data is not None:
+                segment, offset = self._write(kind, _encode(key, data))
+                self._add_entry(segment, offset, kind, key, data)
+        # Point the index past the old segments before they go.
+        self._write_index()
+        for segment in old:
+            segment.remove()
+
+    def compact(self):
+        """Rewrite the spooled updates without the superseded objects."""
+        with self._replay_lock, self._lock:
+            self._compact()
+
+    def pending(self):
+        """Return the number of spooled updates."""
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """Return the spool counters.
+
+        :returns: A dictionary with the updates and segments in the spool
+          and their size in bytes, the updates appended and replayed, the
+          object fields superseded by a later status and the updates
+          dropped to stay under max_bytes so far.
+        """
+        with self._lock:
+            return {'pending': len(self._entries),
+                    'segments': len(self._segments),
+                    'bytes': self._size(),
+                    'appended': self.appended,
+                    'replayed': self.replayed,
+                    'superseded': self.superseded,
+                    'dropped': self.dropped}
+
+    def close(self):
+        """Unmap the segments and release the spool directory."""
+        with self._lock:
+            for segment in self._segments.values():
+                segment.mmap.close()
+            self._segments.clear()
+            self._entries.clear()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
@@ -0,0 +1,178 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import array
+import threading
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+STATISTICS_FIELDS = (constants.ACTIVE_CONNECTIONS, constants.BYTES_IN,
+                     constants.BYTES_OUT, constants.REQUEST_ERRORS,
+                     constants.TOTAL_CONNECTIONS)
+# Fields that are a point in time value rather than a counter.
+GAUGE_FIELDS = (constants.ACTIVE_CONNECTIONS,)
+
+
+class ListenerStatisticsAggregator():
+    """Fold listener statistics reports and send them on an interval.
+
+    Statistics dictionaries passed to add() use the
+    update_listener_statistics format. Reports for the same listener are
+    folded together and every interval seconds all listeners reported since
+    the previous flush are sent in one update_listener_statistics call.
+
+    With cumulative set, as documented for update_listener_statistics, the
+    counters in each report are running totals and the latest report wins.
+    Without it the counters are deltas and are summed. active_connections is
+    always the latest reported value.
+
+    Values are kept in one flat array of 64 bit integers, five per listener,
+    rather than in a dictionary per listener. Float values are truncated and
+    a None value counts as 0 in the first report of a listener and as
+    unchanged in the later ones.
+
+    Errors from background flushes are passed to on_error(error, batch) or,
+    without an on_error callback, raised by the next call to add() or
+    flush().
+
+    :param driver_library: The DriverLibrary used to send the statistics.
+    :param interval: Seconds between flushes. None disables the background
+      flusher, call flush() instead.
+    :type interval: float
+    :param cumulative: Whether reported counters are running totals.
+    :type cumulative: bool
+    :param on_error: Optional callable for background flush failures.
+    """
+
+    def __init__(self, driver_library, interval=10, cumulative=True,
+                 on_error=None):
+        self.driver_library = driver_library
+        self.interval = interval
+        self.cumulative = cumulative
+        self.on_error = on_error
+        self._summed = tuple(not cumulative and field not in GAUGE_FIELDS
+                             for field in STATISTICS_FIELDS)
+        self._slots = {}
+        self._ids = []
+        self._values = array.array('q')
+        self._deferred_error = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _raise_deferred_error(self):
+        error, self._deferred_error = self._deferred_error, None
+        if error is not None:
+            raise error
+
+    def add(self, statistics):
+        """Fold a statistics report into the pending batch.
+
+        :param statistics: Statistics in the update_listener_statistics
+          format.
+        :type statistics: dict
+        :raises: UpdateStatisticsError
+        """
+        self._raise_deferred_error()
+        values = self._values
+        width = len(STATISTICS_FIELDS)
+        with self._lock:
+            if self._stop.is_set():
+                raise driver_exceptions.UpdateStatisticsError(
+                    fault_string=_('The statistics aggregator is closed.'),
+                    stats_object=constants.LISTENERS)
+            for record in statistics.get(constants.LISTENERS, ()):
+                listener_id = record[constants.ID]
+                slot = self._slots.get(listener_id)
+                if slot is None:
+                    self._slots[listener_id] = len(self._ids)
+                    self._ids.append(listener_id)
+                    values.extend(int(record.get(field) or 0)
+                                  for field in STATISTICS_FIELDS)
+                    continue
+                offset = slot * width
+                for index, field in enumerate(STATISTICS_FIELDS):
+                    value = record.get(field)
+                    if value is None:
+                        continue
+                    value = int(value)
+                    if self._summed[index]:
+                        values[offset + index] += value
+                    else:
+                        values[offset + index] = value
+            if self.interval is not None and self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True,
+                    name='octavia-stats-aggregator')
+                self._thread.start()
+
+    def _take(self):
+        width = len(STATISTICS_FIELDS)
+        values = self._values
+        records = []
+        for slot, listener_id in enumerate(self._ids):
+            record = {constants.ID: listener_id}
+            record.update(zip(STATISTICS_FIELDS,
+                              values[slot * width:(slot + 1) * width]))
+            records.append(record)
+        self._slots = {}
+        self._ids = []
+        self._values = array.array('q')
+        return records
+
+    def _flush(self):
+        with self._flush_lock:
+            with self._lock:
+                records = self._take()
+            if records:
+                batch = {constants.LISTENERS: records}
+                try:
+                    self.driver_library.update_listener_statistics(batch)
+                except driver_exceptions.UpdateStatisticsError as e:
+                    return e, batch
+        return None, None
+
+    def flush(self):
+        """Send the folded statistics now.
+
+        :raises: UpdateStatisticsError
+        """
+        self._raise_deferred_error()
+        error, _batch = self._flush()
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            error, batch = self._flush()
+            if error is not None:
+                if self.on_error is not None:
+                    self.on_error(error, batch)
+                else:
+                    self._deferred_error = error
+
+    def close(self):
+        """Flush the folded statistics and stop the background flusher.
+
+        :raises: UpdateStatisticsError
+        """
+        with self._lock:
+            self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
@@ -0,0 +1,146 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import threading
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+OVERFLOW_DROP_OLDEST = 'drop-oldest'
+OVERFLOW_DROP_NEWEST = 'drop-newest'
+OVERFLOW_BLOCK = 'block'
+SUPPORTED_OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST,
+                               OVERFLOW_BLOCK)
+
+
+class BackgroundStatisticsSender():
+    """Send listener statistics from a background thread.
+
+    submit() queues a statistics update and returns immediately, so a slow
+    driver agent does not stall the caller. A sender thread delivers the
+    queued updates through DriverLibrary.update_listener_statistics in
+    submission order.
+
+    When max_queue_size updates are already queued the overflow policy
+    decides what happens: drop-oldest discards the oldest queued update,
+    drop-newest discards the submitted one and block waits for space.
+
+    :param driver_library: The DriverLibrary used to send the statistics.
+    :param max_queue_size: Maximum number of queued updates.
+    :type max_queue_size: int
+    :param overflow_policy: One of SUPPORTED_OVERFLOW_POLICIES.
+    :type overflow_policy: string
+    :param on_error: Optional callable called with the UpdateStatisticsError
+      and the statistics of each failed update.
+    """
+
+    def __init__(self, driver_library, max_queue_size=1000,
+                 overflow_policy=OVERFLOW_DROP_OLDEST, on_error=None):
+        if overflow_policy not in SUPPORTED_OVERFLOW_POLICIES:
+            raise ValueError(_('Unsupported overflow policy: {}').format(
+                overflow_policy))
+        if max_queue_size < 1:
+            raise ValueError(_('max_queue_size must be at least 1.'))
+        self.driver_library = driver_library
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.on_error = on_error
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = collections.deque()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='octavia-stats-sender')
+        self._thread.start()
+
+    @property
+    def counters(self):
+        """A snapshot of the sent, dropped, failed and queued counters."""
+        with self._lock:
+            return {'sent': self.sent, 'dropped': self.dropped,
+                    'failed': self.failed, 'queued': len(self._queue)}
+
+    def submit(self, statistics, timeout=None):
+        """Queue a statistics update for the sender thread.
+
+        :param statistics: Statistics in the update_listener_statistics
+          format.
+        :type statistics: dict
+        :param timeout: With the block policy, seconds to wait for space
+          before dropping the update. None waits forever.
+        :type timeout: float
+        :raises UpdateStatisticsError: The sender is closed.
+        :returns: True if the update was queued, False if it was dropped.
+        """
+        with self._lock:
+            if self._closed:
+                raise driver_exceptions.UpdateStatisticsError(
+                    fault_string=_('The statistics sender is closed.'),
+                    stats_object=constants.LISTENERS)
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    has_space = self._not_full.wait_for(
+                        lambda: (len(self._queue) < self.max_queue_size or
+                                 self._closed), timeout)
+                    if not has_space or self._closed:
+                        self.dropped += 1
+                        return False
+            self._queue.append(statistics)
+            self._not_empty.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._not_empty.wait_for(
+                    lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                statistics = self._queue.popleft()
+                self._not_full.notify()
+            try:
+                self.driver_library.update_listener_statistics(statistics)
+            except driver_exceptions.UpdateStatisticsError as e:
+                with self._lock:
+                    self.failed += 1
+                if self.on_error is not None:
+                    self.on_error(e, statistics)
+            else:
+                with self._lock:
+                    self.sent += 1
+
+    def close(self, timeout=None):
+        """Stop accepting updates and wait for the queued ones to be sent.
+
+        :param timeout: Seconds to wait for the queue to drain. None waits
+          forever.
+        :type timeout: float
+        :returns: True if the sender thread finished.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
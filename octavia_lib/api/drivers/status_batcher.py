@@ -0,0 +1,169 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+
+class StatusBatcher():
+    """Coalesce load balancer status updates before sending them.
+
+    Status dictionaries passed to add() use the update_loadbalancer_status
+    format. They are merged per object type and object ID, the latest value
+    of each field winning, and sent as a single update when max_objects
+    distinct objects are buffered, when the oldest buffered update is
+    flush_interval seconds old, or when flush() is called.
+
+    Batches are sent one at a time in the order they were collected, so an
+    update added after a batch was taken is never sent before it.
+
+    Errors from explicit flush() calls are raised to the caller. Errors from
+    background flushes are passed to on_error(error, batch) or, without an
+    on_error callback, raised by the next call to add() or flush().
+
+    :param driver_library: The DriverLibrary used to send the updates.
+    :param max_objects: Number of buffered objects that triggers a flush.
+    :type max_objects: int
+    :param flush_interval: Maximum age, in seconds, of a buffered update.
+      None disables time based flushing.
+    :type flush_interval: float
+    :param on_error: Optional callable for background flush failures.
+    """
+
+    def __init__(self, driver_library, max_objects=100, flush_interval=1.0,
+                 on_error=None):
+        self.driver_library = driver_library
+        self.max_objects = max_objects
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self._pending = {}
+        self._pending_count = 0
+        self._first_pending = None
+        self._deferred_error = None
+        self._closed = False
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # Held while a batch is taken and sent so batches go out in order.
+        self._flush_lock = threading.Lock()
+
+    def _raise_deferred_error(self):
+        error, self._deferred_error = self._deferred_error, None
+        if error is not None:
+            raise error
+
+    def add(self, status):
+        """Buffer a status update.
+
+        :param status: Status update in the update_loadbalancer_status
+          format.
+        :type status: dict
+        :raises: UpdateStatusError
+        """
+        self._raise_deferred_error()
+        with self._lock:
+            if self._closed:
+                raise driver_exceptions.UpdateStatusError(
+                    fault_string=_('The status batcher is closed.'))
+            for object_type, records in status.items():
+                objects = self._pending.setdefault(object_type, {})
+                for record in records:
+                    current = objects.get(record[constants.ID])
+                    if current is None:
+                        objects[record[constants.ID]] = dict(record)
+                        self._pending_count += 1
+                    else:
+                        current.update(record)
+            if self._first_pending is None and self._pending_count:
+                self._first_pending = time.monotonic()
+                self._start_flusher()
+            flush_now = self._pending_count >= self.max_objects
+        if flush_now:
+            self.flush()
+
+    def _start_flusher(self):
+        if self.flush_interval is None:
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='octavia-status-batcher')
+            self._thread.start()
+        else:
+            self._wakeup.notify()
+
+    def _take(self):
+        batch = {object_type: list(objects.values())
+                 for object_type, objects in self._pending.items()
+                 if objects}
+        self._pending = {}
+        self._pending_count = 0
+        self._first_pending = None
+        return batch
+
+    def _flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch = self._take()
+            if batch:
+                try:
+                    self.driver_library.update_loadbalancer_status(batch)
+                except driver_exceptions.UpdateStatusError as e:
+                    return e, batch
+        return None, None
+
+    def flush(self):
+        """Send all buffered updates now.
+
+        :raises: UpdateStatusError
+        """
+        self._raise_deferred_error()
+        error, _batch = self._flush()
+        if error is not None:
+            raise error
+
+    def _wait_time(self):
+        if self._first_pending is None:
+            return None
+        return self._first_pending + self.flush_interval - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closed:
+                    wait_time = self._wait_time()
+                    if wait_time is not None and wait_time <= 0:
+                        break
+                    self._wakeup.wait(wait_time)
+                if self._closed:
+                    return
+            error, batch = self._flush()
+            if error is not None:
+                if self.on_error is not None:
+                    self.on_error(error, batch)
+                else:
+                    self._deferred_error = error
+
+    def close(self):
+        """Flush the buffered updates and stop the background flusher.
+
+        :raises: UpdateStatusError
+        """
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
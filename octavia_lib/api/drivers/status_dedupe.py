@@ -0,0 +1,123 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import threading
+import time
+
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+# Never equal to a status field value.
+_UNKNOWN = object()
+
+
+class StatusDeduplicator():
+    """Leaves unchanged objects out of load balancer status updates.
+
+    The last status sent for each object is remembered, and filter()
+    removes from a status update the objects whose fields all still have
+    the values last sent, whether they were sent together or not. An object
+    is only remembered once sent() confirms the driver agent accepted it,
+    so a failed update is sent again in full.
+
+    At most max_size objects are remembered, the least recently sent are
+    forgotten first and simply sent again next time. With resync_interval,
+    an object is also sent again once its status was last sent that many
+    seconds ago, even if unchanged, in case Octavia changed it behind our
+    back.
+
+    :param max_size: Maximum number of objects remembered.
+    :type max_size: int
+    :param resync_interval: Seconds after which an unchanged status is sent
+      again anyway. None never resends it.
+    :type resync_interval: float
+    """
+
+    def __init__(self, max_size, resync_interval=None):
+        if max_size < 1:
+            raise ValueError(_('max_size must be at least 1.'))
+        self.max_size = max_size
+        self.resync_interval = resync_interval
+        self.sent_objects = 0
+        self.suppressed_objects = 0
+        # (object type, object ID) to (time last sent, field items)
+        self._last_sent = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _unchanged(self, object_type, record, now):
+        # Called with the lock held.
+        id = record.get(constants.ID)
+        last = self._last_sent.get((object_type, id))
+        if id is None or last is None:
+            return False
+        if (self.resync_interval is not None and
+                now - last[0] >= self.resync_interval):
+            return False
+        known = dict(last[1])
+        return all(known.get(field, _UNKNOWN) == value
+                   for field, value in record.items()
+                   if field != constants.ID)
+
+    def filter(self, status):
+        """Return status without the objects whose status did not change.
+
+        :param status: Status update in the update_loadbalancer_status
+          format. It is not modified.
+        :type status: dict
+        :returns: The status update to send, empty if nothing changed.
+        """
+        filtered = {}
+        now = time.monotonic()
+        with self._lock:
+            for object_type, records in status.items():
+                changed = []
+                for record in records:
+                    if self._unchanged(object_type, record, now):
+                        self.suppressed_objects += 1
+                    else:
+                        changed.append(record)
+                if changed:
+                    filtered[object_type] = changed
+        return filtered
+
+    def sent(self, status):
+        """Remember a status update the driver agent accepted."""
+        now = time.monotonic()
+        with self._lock:
+            for object_type, records in status.items():
+                for record in records:
+                    id = record.get(constants.ID)
+                    if id is None:
+                        continue
+                    key = (object_type, id)
+                    last = self._last_sent.get(key)
+                    fields = dict(last[1]) if last is not None else {}
+                    fields.update(record)
+                    del fields[constants.ID]
+                    self._last_sent[key] = (now, tuple(fields.items()))
+                    self._last_sent.move_to_end(key)
+                    self.sent_objects += 1
+            while len(self._last_sent) > self.max_size:
+                self._last_sent.popitem(last=False)
+
+    def clear(self):
+        """Forget every object, the next update of each is sent in full."""
+        with self._lock:
+            self._last_sent.clear()
+
+    def stats(self):
+        """Return the sent, suppressed and size counters."""
+        with self._lock:
+            return {'sent': self.sent_objects,
+                    'suppressed': self.suppressed_objects,
+                    'size': len(self._last_sent)}
@@ -0,0 +1,238 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Incremental decoding of large driver agent responses.
+
+iter_json() parses a JSON document from an iterator of byte chunks and
+yields the values found at a path as soon as each one is complete. Only the
+values at the path are built, everything else is skipped over without being
+decoded, so memory use is bounded by the largest yielded value and the chunk
+size rather than by the size of the document.
+
+A path is a sequence of object keys. Arrays met along the way are traversed
+element by element, and an array found at the end of the path yields its
+elements. For a load balancer, (constants.POOLS, constants.MEMBERS) yields
+the members of every pool one by one.
+"""
+
+import codecs
+import json
+import re
+
+from octavia_lib.i18n import _
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Runs of characters that cannot end a string.
+_STRING_CHARS = re.compile(r'[^"\\]*')
+# Runs of characters that cannot change the nesting depth.
+_SKIPPABLE = re.compile(r'[^"\[\]{}]+')
+_DECODER = json.JSONDecoder()
+# The characters that may follow a value.
+_VALUE_END = frozenset(' \t\n\r,]}')
+
+
+def _invalid():
+    return ValueError(_('Invalid JSON driver agent message.'))
+
+
+class _JSONStream():
+    """A cursor over JSON text decoded from a stream of byte chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Append the next chunk, returns False at the end of the stream."""
+        if self.eof:
+            return False
+        # Drop the consumed text, keeping the buffer bounded.
+        pending = self.text[self.pos:]
+        self.pos = 0
+        # Read at least as much text as is pending, so that the text of a
+        # value spanning many chunks is copied a bounded number of times.
+        parts = [pending]
+        size = 0
+        while size <= len(pending) and not self.eof:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                parts.append(self._decoder.decode(b'', final=True))
+                self.eof = True
+            else:
+                parts.append(self._decoder.decode(chunk))
+                size += len(parts[-1])
+        self.text = ''.join(parts)
+        return True
+
+    def peek(self):
+        """Return the next non whitespace character, without consuming it."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                raise _invalid()
+
+    def next_char(self):
+        char = self.peek()
+        self.pos += 1
+        return char
+
+    def read_value(self):
+        self.peek()
+        # Decoding again after each read is linear overall, as more() at
+        # least doubles the pending text.
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+            # A number may continue in the next chunk, even one cut right
+            # after a sign, a dot or an exponent, so a value is complete
+            # once what follows cannot continue it.
+            if end is not None and (
+                    self.eof or (end < len(self.text) and
+                                 self.text[end] in _VALUE_END)):
+                self.pos = end
+                return value
+            if not self.more():
+                raise _invalid()
+
+    def _skip_string(self):
+        # Returns the raw string, quotes and escapes included.
+        # The scan resumes where it stopped, relative to the opening quote
+        # as more() moves the text.
+        scanned = 1
+        while True:
+            end = _STRING_CHARS.match(self.text, self.pos + scanned).end()
+            if end < len(self.text) and self.text[end] == '"':
+                string = self.text[self.pos:end + 1]
+                self.pos = end + 1
+                return string
+            if end + 1 < len(self.text):
+                # An escaped character
+                scanned = end + 2 - self.pos
+                continue
+            scanned = end - self.pos
+            if not self.more():
+                raise _invalid()
+
+    def skip_value(self):
+        if self.peek() not in '[{':
+            if self.text[self.pos] == '"':
+                self._skip_string()
+            else:
+                self.read_value()
+            return
+        depth = 0
+        while True:
+            char = self.peek()
+            if char == '"':
+                self._skip_string()
+            elif char in '[{':
+                depth += 1
+                self.pos += 1
+            elif char in ']}':
+                depth -= 1
+                self.pos += 1
+            else:
+                self.pos = _SKIPPABLE.match(self.text, self.pos).end()
+            if depth == 0:
+                return
+
+    def read_key(self):
+        if self.peek() != '"':
+            raise _invalid()
+        key = json.loads(self._skip_string())
+        if self.next_char() != ':':
+            raise _invalid()
+        return key
+
+    def walk(self, path):
+        char = self.peek()
+        if char == '[':
+            self.pos += 1
+            if self.peek() == ']':
+                self.pos += 1
+                return
+            while True:
+                if path:
+                    yield from self.walk(path)
+                else:
+                    yield self.read_value()
+                char = self.next_char()
+                if char == ']':
+                    return
+                if char != ',':
+                    raise _invalid()
+        elif not path:
+            yield self.read_value()
+        elif char == '{':
+            self.pos += 1
+            if self.peek() == '}':
+                self.pos += 1
+                return
+            while True:
+                if self.read_key() == path[0]:
+                    yield from self.walk(path[1:])
+                else:
+                    self.skip_value()
+                char = self.next_char()
+                if char == '}':
+                    return
+                if char != ',':
+                    raise _invalid()
+        else:
+            # A scalar where the path expects an object, nothing to find.
+            self.skip_value()
+
+
+def iter_json(chunks, path=()):
+    """Yield the values at path in a JSON document, as it is parsed.
+
+    The whole document is consumed, even past the last yielded value, and
+    checked to be valid as far as it was parsed.
+
+    :param chunks: An iterator of bytes-like chunks of UTF-8 JSON text.
+    :param path: The object keys leading to the values, see the module
+      documentation.
+    :type path: tuple
+    :raises ValueError: The document is not valid JSON.
+    """
+    stream = _JSONStream(chunks)
+    yield from stream.walk(tuple(path))
+    while True:
+        stream.pos = _WHITESPACE.match(stream.text, stream.pos).end()
+        if stream.pos < len(stream.text):
+            raise _invalid()
+        if not stream.more():
+            return
+
+
+def iter_decoded(value, path=()):
+    """Yield the values at path in an already decoded document.
+
+    The counterpart of iter_json for codecs without a streaming decoder.
+    """
+    if isinstance(value, list):
+        for item in value:
+            if path:
+                yield from iter_decoded(item, path)
+            else:
+                yield item
+    elif not path:
+        yield value
+    elif isinstance(value, dict) and path[0] in value:
+        yield from iter_decoded(value[path[0]], path[1:])
@@ -0,0 +1,123 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+import time
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.i18n import _
+
+
+class Deadline():
+    """The time by which a whole driver agent call must be done.
+
+    One deadline covers every step of a call, connecting, sending the
+    request and receiving the response, so the call as a whole never takes
+    longer than timeout.
+
+    :param timeout: Seconds from now.
+    :type timeout: float
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expires = time.monotonic() + timeout
+
+    def remaining(self):
+        """Return the seconds left.
+
+        :raises DriverAgentTimeout: The deadline has passed.
+        """
+        remaining = self.expires - time.monotonic()
+        if remaining <= 0:
+            raise driver_exceptions.DriverAgentTimeout(
+                fault_string=('The driver agent did not respond in {} '
+                              'seconds.'.format(self.timeout)))
+        return remaining
+
+    def socket_timeout(self, limit):
+        """Return the timeout for one socket operation, at most limit."""
+        return min(limit, self.remaining())
+
+
+class AdaptiveTimeout():
+    """A timeout derived from the latencies observed on one socket.
+
+    The timeout is computed like the TCP retransmission timeout: the
+    exponentially weighted moving average of the latencies plus deviations
+    times their average deviation, bounded by min_timeout and max_timeout.
+    max_timeout is used until warmup latencies have been observed.
+
+    Each timed out call doubles the timeout, up to max_timeout, so a driver
+    agent that only became slower is not failed over and over. The next
+    observed latency cancels the back off.
+
+    :param min_timeout: The lowest timeout, in seconds.
+    :type min_timeout: float
+    :param max_timeout: The highest timeout, in seconds.
+    :type max_timeout: float
+    :param alpha: Weight of a new latency in the average.
+    :type alpha: float
+    :param beta: Weight of a new deviation in the average deviation.
+    :type beta: float
+    :param deviations: How many average deviations above the average
+      latency a call may take.
+    :type deviations: float
+    :param warmup: Latencies to observe before adapting.
+    :type warmup: int
+    """
+
+    def __init__(self, min_timeout, max_timeout, alpha=0.125, beta=0.25,
+                 deviations=4, warmup=5):
+        if not 0 < min_timeout <= max_timeout:
+            raise ValueError(_('min_timeout must be greater than zero and '
+                               'at most max_timeout.'))
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.alpha = alpha
+        self.beta = beta
+        self.deviations = deviations
+        self.warmup = warmup
+        self.latency = None
+        self.deviation = None
+        self.samples = 0
+        self._backoff = 1
+        self._lock = threading.Lock()
+
+    def timeout(self):
+        """Return the current timeout, in seconds."""
+        with self._lock:
+            if self.samples < self.warmup:
+                return self.max_timeout
+            timeout = max(self.latency + self.deviations * self.deviation,
+                          self.min_timeout) * self._backoff
+        return min(timeout, self.max_timeout)
+
+    def observe(self, latency):
+        """Record the latency, in seconds, of a successful call."""
+        with self._lock:
+            if self.latency is None:
+                self.latency = latency
+                self.deviation = latency / 2
+            else:
+                self.deviation += self.beta * (
+                    abs(latency - self.latency) - self.deviation)
+                self.latency += self.alpha * (latency - self.latency)
+            self.samples += 1
+            self._backoff = 1
+
+    def timed_out(self):
+        """Record a call that timed out."""
+        with self._lock:
+            # Past max_timeout doubling further changes nothing.
+            if self.min_timeout * self._backoff < self.max_timeout:
+                self._backoff *= 2
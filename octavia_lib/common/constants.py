@@ -38,6 +38,7 @@ OBJECT = 'object'
 
 # ID fields
 ID = 'id'
+IDS = 'ids'
 
 # Octavia statistics fields
 ACTIVE_CONNECTIONS = 'active_connections'
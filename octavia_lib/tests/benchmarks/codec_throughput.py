@@ -0,0 +1,136 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Encode/decode cost and framed throughput of each payload wire format.
+
+Run with::
+
+    python -m octavia_lib.tests.benchmarks.codec_throughput [iterations]
+
+Two payloads are measured: a large load balancer get response and a
+listener statistics update. For each codec, with and without compression,
+the size on the wire, the time of an encode plus decode round trip and the
+throughput of framed messages sent over a local socket pair and decoded on
+the other end are reported.
+"""
+
+import socket
+import sys
+import threading
+import time
+import zlib
+
+from octavia_lib.api.drivers import codec
+from octavia_lib.api.drivers import framing
+from octavia_lib.common import constants
+
+COMPRESSION_THRESHOLD = 4096
+
+
+def loadbalancer_payload(listeners=20, members=50):
+    """A load balancer get response with nested listeners and pools."""
+    pools = []
+    for p in range(listeners):
+        pools.append({
+            constants.POOL_ID: f'pool-{p:032d}', constants.NAME: f'pool{p}',
+            constants.LB_ALGORITHM: 'ROUND_ROBIN', constants.PROTOCOL: 'HTTP',
+            constants.ADMIN_STATE_UP: True,
+            constants.HEALTHMONITOR: {
+                constants.HEALTHMONITOR_ID: f'hm-{p:032d}',
+                constants.DELAY: 5, constants.TIMEOUT: 3,
+                constants.MAX_RETRIES: 3, constants.TYPE: 'HTTP'},
+            constants.MEMBERS: [
+                {constants.MEMBER_ID: f'member-{p:04d}-{m:024d}',
+                 constants.ADDRESS: f'192.0.2.{m}',
+                 constants.PROTOCOL_PORT: 8080, constants.WEIGHT: 1,
+                 constants.BACKUP: False, constants.ADMIN_STATE_UP: True,
+                 constants.SUBNET_ID: f'subnet-{p:032d}'}
+                for m in range(members)]})
+    return {
+        constants.LOADBALANCER_ID: 'lb-' + '0' * 32,
+        constants.NAME: 'lb', constants.VIP_ADDRESS: '203.0.113.10',
+        constants.POOLS: pools,
+        constants.LISTENERS: [
+            {constants.LISTENER_ID: f'listener-{p:032d}',
+             constants.PROTOCOL: 'HTTP', constants.PROTOCOL_PORT: 80 + p,
+             constants.DEFAULT_POOL_ID: pool[constants.POOL_ID],
+             constants.DEFAULT_POOL: pool, constants.L7POLICIES: []}
+            for p, pool in enumerate(pools)]}
+
+
+def statistics_payload(listeners=100):
+    """A listener statistics update."""
+    return {constants.LISTENERS: [
+        {constants.ID: f'listener-{i:032d}',
+         constants.ACTIVE_CONNECTIONS: i, constants.BYTES_IN: i * 1000003,
+         constants.BYTES_OUT: i * 2000003, constants.REQUEST_ERRORS: i % 7,
+         constants.TOTAL_CONNECTIONS: i * 101}
+        for i in range(listeners)]}
+
+
+def wire_formats():
+    """Each codec, without and with compression."""
+    for name, wire_codec in sorted(codec.SUPPORTED_CODECS.items()):
+        yield name, codec.WireFormat(wire_codec)
+        yield name + '+zlib', codec.WireFormat(
+            wire_codec, compression_threshold=COMPRESSION_THRESHOLD)
+
+
+def round_trip(wire_format, data, iterations):
+    """Return the mean seconds of one encode plus decode."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        payload, fields = wire_format.encode(data)
+        if fields:
+            payload = zlib.decompress(payload)
+        wire_format.decode(payload)
+    return (time.perf_counter() - start) / iterations
+
+
+def framed_throughput(wire_format, data, iterations):
+    """Return framed messages per second, encoded, sent and decoded."""
+    local, remote = socket.socketpair()
+    local.settimeout(30)
+    remote.settimeout(30)
+
+    def send():
+        for _ in range(iterations):
+            framing.send_frame(remote, *wire_format.encode(data))
+
+    with local, remote:
+        sender = threading.Thread(target=send)
+        start = time.perf_counter()
+        sender.start()
+        for _ in range(iterations):
+            wire_format.decode(framing.recv_frame(local, 30))
+        elapsed = time.perf_counter() - start
+        sender.join()
+    return iterations / elapsed
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    iterations = int(argv[0]) if argv else 200
+    payloads = (('loadbalancer', loadbalancer_payload()),
+                ('statistics', statistics_payload()))
+    for payload_name, data in payloads:
+        for name, wire_format in wire_formats():
+            size = len(wire_format.encode(data)[0])
+            rtt = round_trip(wire_format, data, iterations)
+            rate = framed_throughput(wire_format, data, iterations)
+            print('{:<13} {:<13} {:>9} bytes  round trip {:>9.1f} us  '
+                  'framed {:>9.0f} msg/s {:>8.1f} MB/s'.format(
+                      payload_name, name, size, rtt * 1e6, rate,
+                      rate * size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
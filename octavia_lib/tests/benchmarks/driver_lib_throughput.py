@@ -0,0 +1,295 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Throughput and latency of the DriverLibrary calls.
+
+Run with::
+
+    python -m octavia_lib.tests.benchmarks [--output results.json]
+        [--baseline baseline.json] [--threshold 0.2] [--duration 1]
+        [--sizes 1,100,10000] [--threads 1,8] [--mode connect]
+
+or compare two saved runs without running anything::
+
+    python -m octavia_lib.tests.benchmarks --compare baseline.json \\
+        results.json
+
+Each DriverLibrary call, update_loadbalancer_status,
+update_listener_statistics and every get_*, is run against a
+FakeDriverAgent for --duration seconds from each number of --threads at
+once, and the operations per second and the p50 and p99 latencies are
+reported. Calls whose payload grows with the load balancer are measured for
+each of --sizes members, the others once.
+
+--output saves the results as JSON, to be used as the baseline of a later
+run. With --baseline, or --compare, every case whose operations per second
+dropped or whose p50 latency grew by more than --threshold is flagged as a
+regression and the exit status is 1.
+"""
+
+import argparse
+from concurrent import futures
+import json
+import platform
+import statistics
+import sys
+import time
+
+from octavia_lib.api.drivers import driver_lib
+from octavia_lib.common import constants
+from octavia_lib.tests.benchmarks import codec_throughput
+from octavia_lib.tests import fake_driver_agent
+
+FORMAT_VERSION = 1
+DEFAULT_SIZES = (1, 100, 10000)
+DEFAULT_THREADS = (1, 8)
+DEFAULT_THRESHOLD = 0.2
+MODES = {'connect': {},
+         'pool': {'connection_pool_size': 8},
+         'multiplex': {'multiplex': True},
+         # Over the agent unified channel socket.
+         'channel': {}}
+
+
+def _objects(size):
+    """Return the objects of a load balancer with size members, by type."""
+    loadbalancer = codec_throughput.loadbalancer_payload(listeners=1,
+                                                         members=size)
+    listener = loadbalancer[constants.LISTENERS][0]
+    pool = loadbalancer[constants.POOLS][0]
+    l7rule = {constants.L7RULE_ID: 'l7rule-{}'.format(size),
+              constants.TYPE: 'PATH', constants.COMPARE_TYPE: 'STARTS_WITH',
+              constants.VALUE: '/api'}
+    l7policy = {constants.L7POLICY_ID: 'l7policy-{}'.format(size),
+                constants.LISTENER_ID: listener[constants.LISTENER_ID],
+                constants.ACTION: 'REJECT', constants.POSITION: 1,
+                constants.RULES: [l7rule]}
+    return {
+        constants.LOADBALANCERS: (loadbalancer[constants.LOADBALANCER_ID],
+                                  loadbalancer),
+        constants.LISTENERS: (listener[constants.LISTENER_ID], listener),
+        constants.POOLS: (pool[constants.POOL_ID], pool),
+        constants.MEMBERS: (pool[constants.MEMBERS][0][constants.MEMBER_ID],
+                            pool[constants.MEMBERS][0]),
+        constants.HEALTHMONITORS: (
+            pool[constants.HEALTHMONITOR][constants.HEALTHMONITOR_ID],
+            pool[constants.HEALTHMONITOR]),
+        constants.L7POLICIES: (l7policy[constants.L7POLICY_ID], l7policy),
+        constants.L7RULES: (l7rule[constants.L7RULE_ID], l7rule)}
+
+
+def _status(objects):
+    """A status update for the load balancer, its pool and every member."""
+    pool = objects[constants.POOLS][1]
+
+    def record(id):
+        return {constants.ID: id,
+                constants.PROVISIONING_STATUS: constants.ACTIVE,
+                constants.OPERATING_STATUS: constants.ONLINE}
+
+    return {
+        constants.LOADBALANCERS: [record(objects[constants.LOADBALANCERS][0])],
+        constants.POOLS: [record(pool[constants.POOL_ID])],
+        constants.MEMBERS: [record(member[constants.MEMBER_ID])
+                            for member in pool[constants.MEMBERS]]}
+
+
+def cases(agent, sizes):
+    """Yield (operation, size, call) for each case to measure.
+
+    Stores the objects the get calls look up in agent.
+    """
+    for size in sizes:
+        objects = _objects(size)
+        for resource, (id, data) in objects.items():
+            agent.add_object(resource, id, data)
+        status = _status(objects)
+        statistics_update = codec_throughput.statistics_payload(
+            listeners=size)
+        yield ('update_loadbalancer_status', size,
+               lambda lib, status=status:
+               lib.update_loadbalancer_status(status))
+        yield ('update_listener_statistics', size,
+               lambda lib, update=statistics_update:
+               lib.update_listener_statistics(update))
+        for resource, method in ((constants.LOADBALANCERS,
+                                  'get_loadbalancer'),
+                                 (constants.LISTENERS, 'get_listener'),
+                                 (constants.POOLS, 'get_pool'),
+                                 (constants.MEMBERS, 'get_member'),
+                                 (constants.HEALTHMONITORS,
+                                  'get_healthmonitor'),
+                                 (constants.L7POLICIES, 'get_l7policy'),
+                                 (constants.L7RULES, 'get_l7rule')):
+            # The other objects are the same whatever the size.
+            if size != sizes[0] and resource not in (
+                    constants.LOADBALANCERS, constants.LISTENERS,
+                    constants.POOLS):
+                continue
+            id = objects[resource][0]
+            yield (method, size,
+                   lambda lib, method=method, id=id: getattr(lib, method)(id))
+
+
+def measure(lib, call, threads, duration):
+    """Run call from threads at once for duration seconds.
+
+    :returns: A dictionary with the operations, the operations per second
+      and the p50 and p99 latencies in milliseconds.
+    """
+    call(lib)
+    stop_at = time.perf_counter() + duration
+
+    def run(_thread):
+        latencies = []
+        while True:
+            start = time.perf_counter()
+            if start >= stop_at:
+                return latencies
+            call(lib)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(threads) as executor:
+        latencies = sorted(sum(executor.map(run, range(threads)), []))
+    elapsed = time.perf_counter() - start
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return {'ops': len(latencies),
+            'ops_per_sec': len(latencies) / elapsed,
+            'p50_ms': statistics.median(latencies) * 1e3,
+            'p99_ms': p99 * 1e3}
+
+
+def case_key(operation, size, threads):
+    return '{} members={} threads={}'.format(operation, size, threads)
+
+
+def run(sizes=DEFAULT_SIZES, threads=DEFAULT_THREADS, duration=1,
+        mode='connect', report=print):
+    """Measure every case and return the results, ready to be saved."""
+    results = {}
+    with fake_driver_agent.FakeDriverAgent(record=False) as agent:
+        kwargs = dict(agent.socket_paths, **MODES[mode])
+        if mode == 'channel':
+            kwargs['channel_socket'] = agent.channel_socket
+        lib = driver_lib.DriverLibrary(**kwargs)
+        try:
+            for operation, size, call in cases(agent, sizes):
+                for thread_count in threads:
+                    key = case_key(operation, size, thread_count)
+                    results[key] = measure(lib, call, thread_count,
+                                           duration)
+                    report(_format(key, results[key]))
+        finally:
+            lib.close()
+    return {'version': FORMAT_VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': mode,
+            'duration': duration,
+            'results': results}
+
+
+def _format(key, result):
+    return '{:<52} {:>10.1f} ops/s  p50 {:>9.3f} ms  p99 {:>9.3f} ms'.format(
+        key, result['ops_per_sec'], result['p50_ms'], result['p99_ms'])
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compare two runs.
+
+    :param baseline: The results of the reference run.
+    :param current: The results of the run to check.
+    :param threshold: The relative change flagged as a regression.
+    :returns: A (report lines, regressed case keys) tuple. Cases missing
+      from either run are skipped.
+    """
+    lines = []
+    regressions = []
+    for key, result in sorted(current['results'].items()):
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        ops_change = result['ops_per_sec'] / base['ops_per_sec'] - 1
+        p50_change = result['p50_ms'] / base['p50_ms'] - 1
+        p99_change = result['p99_ms'] / base['p99_ms'] - 1
+        regressed = ops_change < -threshold or p50_change > threshold
+        if regressed:
+            regressions.append(key)
+        lines.append('{:<52} ops/s {:>+7.1%}  p50 {:>+7.1%}  p99 {:>+7.1%}'
+                     '{}'.format(key, ops_change, p50_change, p99_change,
+                                 '  REGRESSION' if regressed else ''))
+    return lines, regressions
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as f:
+        results = json.load(f)
+    if results.get('version') != FORMAT_VERSION:
+        raise SystemExit('{}: unsupported results format'.format(path))
+    return results
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m octavia_lib.tests.benchmarks',
+        description='DriverLibrary throughput and latency benchmarks.')
+    parser.add_argument('--duration', type=float, default=1,
+                        help='Seconds to run each case.')
+    parser.add_argument('--sizes', type=_int_list,
+                        default=list(DEFAULT_SIZES),
+                        help='Comma separated load balancer sizes, in '
+                             'members.')
+    parser.add_argument('--threads', type=_int_list,
+                        default=list(DEFAULT_THREADS),
+                        help='Comma separated numbers of concurrent '
+                             'callers.')
+    parser.add_argument('--mode', choices=sorted(MODES), default='connect',
+                        help='How DriverLibrary connects to the agent.')
+    parser.add_argument('--output', help='Save the results to this file.')
+    parser.add_argument('--baseline',
+                        help='Compare the results with this saved run.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change flagged as a regression.')
+    parser.add_argument('--compare', nargs=2,
+                        metavar=('BASELINE', 'RESULTS'),
+                        help='Compare two saved runs and exit.')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        baseline, current = (_load(path) for path in args.compare)
+    else:
+        baseline = _load(args.baseline) if args.baseline else None
+        current = run(args.sizes, args.threads, args.duration, args.mode)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+        if baseline is None:
+            return 0
+
+    if baseline['mode'] != current['mode']:
+        print('Comparing a {} run with a {} baseline.'.format(
+            current['mode'], baseline['mode']))
+    lines, regressions = compare(baseline, current, args.threshold)
+    print('\n'.join(lines) or 'No case in common with the baseline.')
+    if regressions:
+        print('{} regression(s) beyond {:.0%}'.format(
+            len(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Receive latency of the framing reader versus the original polling reader.
+
+Run with::
+
+    python -m octavia_lib.tests.benchmarks.recv_latency [iterations]
+
+A stand-in driver agent answers every request on a local unix socket, one
+request per connection like the real driver agent, and the time for a full
+connect/send/receive/close round trip is reported for both readers.
+"""
+
+import os
+import socket
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from oslo_serialization import jsonutils
+
+from octavia_lib.api.drivers import framing
+
+RESPONSE = jsonutils.dump_as_bytes({'status_code': 200})
+
+
+class _StandInHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        framing.recv_frame(self.request, 30)
+        framing.send_frame(self.request, RESPONSE)
+
+
+def _polling_recv(sock):
+    # The DriverLibrary reader this framing layer replaced: one byte at a
+    # time for the header and a 10 ms sleep between receives.
+    size_str = b''
+    while True:
+        char = sock.recv(1)
+        if char == b'\n':
+            break
+        size_str += char
+        time.sleep(0.01)
+    payload_size = int(size_str)
+    mv_buffer = memoryview(bytearray(payload_size))
+    next_offset = 0
+    while payload_size - next_offset > 0:
+        next_offset += sock.recv_into(mv_buffer[next_offset:],
+                                      payload_size - next_offset)
+        time.sleep(0.01)
+    return mv_buffer.tobytes()
+
+
+def _framing_recv(sock):
+    return framing.recv_frame(sock, 30)
+
+
+def _round_trip(socket_path, recv):
+    request = jsonutils.dump_as_bytes({'loadbalancers': []})
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(socket_path)
+    try:
+        framing.send_frame(sock, request)
+        return recv(sock)
+    finally:
+        sock.close()
+
+
+def measure(socket_path, recv, iterations):
+    """Return the round trip latencies, in seconds, of iterations calls."""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        _round_trip(socket_path, recv)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print('{:<10} p50 {:>10.1f} us   p99 {:>10.1f} us'.format(
+        name, statistics.median(latencies) * 1e6, p99 * 1e6))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    iterations = int(argv[0]) if argv else 200
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, 'status.sock')
+        server = socketserver.ThreadingUnixStreamServer(socket_path,
+                                                        _StandInHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            _report('polling', measure(socket_path, _polling_recv,
+                                       iterations))
+            _report('framing', measure(socket_path, _framing_recv,
+                                       iterations))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""DriverLibrary startup time while the driver agent is still starting.
+
+Run with::
+
+    python -m octavia_lib.tests.benchmarks.startup_time [iterations] [delay]
+
+The library is created while the driver agent sockets do not exist yet, and
+a stand-in driver agent creates them delay seconds later. Reported is how
+long after the last socket appeared the constructor returned, for the
+inotify wait, the polling fallback, the original tenacity retry and the lazy
+mode, which returns without waiting at all.
+"""
+
+import contextlib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+import tenacity
+
+from octavia_lib.api.drivers import driver_lib
+
+SOCKETS = ('status.sock', 'stats.sock', 'get.sock')
+
+
+@tenacity.retry(stop=tenacity.stop_after_attempt(30), reraise=True,
+                wait=tenacity.wait_exponential(multiplier=1, min=1, max=5),
+                retry=tenacity.retry_if_exception_type(
+                    driver_lib.driver_exceptions.DriverAgentNotFound))
+def _tenacity_check_socket(socket):
+    if not os.path.exists(socket):
+        raise driver_lib.driver_exceptions.DriverAgentNotFound(
+            fault_string=('Unable to open the driver agent '
+                          'socket: {}'.format(socket)))
+
+
+def _tenacity_check(self, *sockets):
+    # The DriverLibrary check the event driven wait replaced, one socket
+    # after the other.
+    for socket in sockets:
+        _tenacity_check_socket(socket)
+
+
+# A separate process, so that it does not compete for the GIL with the
+# library waiting for it. time.monotonic() is system wide on Linux.
+_AGENT = """
+import socket, sys, time
+time.sleep(float(sys.argv[1]))
+sockets = []
+for path in sys.argv[2:]:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sockets.append(sock)
+print(time.monotonic(), flush=True)
+sys.stdin.read()
+"""
+
+
+def _start_agent(paths, delay):
+    return subprocess.Popen(
+        [sys.executable, '-c', _AGENT, str(delay)] + list(paths),
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+
+def measure(mode, iterations, delay):
+    """Return the seconds from the last socket appearing to init returning.
+
+    Negative values mean init returned before the sockets appeared.
+    """
+    latencies = []
+    for _ in range(iterations):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, name) for name in SOCKETS]
+            agent = _start_agent(paths, delay)
+            kwargs = dict(zip(('status_socket', 'stats_socket',
+                               'get_socket'), paths))
+            if mode == 'lazy':
+                kwargs['lazy'] = True
+            with contextlib.ExitStack() as stack:
+                if mode == 'tenacity':
+                    stack.enter_context(mock.patch.object(
+                        driver_lib.DriverLibrary, '_check_for_socket_ready',
+                        _tenacity_check))
+                elif mode == 'polling':
+                    stack.enter_context(mock.patch(
+                        'octavia_lib.api.drivers.readiness._inotify_libc',
+                        return_value=None))
+                lib = driver_lib.DriverLibrary(**kwargs)
+                returned = time.monotonic()
+            created = float(agent.stdout.readline())
+            agent.communicate()
+            latencies.append(returned - created)
+            lib.close()
+    return latencies
+
+
+def _report(name, latencies):
+    print('{:<10} median {:>10.1f} ms   max {:>10.1f} ms'.format(
+        name, statistics.median(latencies) * 1e3, max(latencies) * 1e3))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    iterations = int(argv[0]) if argv else 5
+    delay = float(argv[1]) if len(argv) > 1 else 0.5
+    for mode in ('inotify', 'polling', 'tenacity', 'lazy'):
+        _report(mode, measure(mode, iterations, delay))
+
+
+if __name__ == '__main__':
+    main()
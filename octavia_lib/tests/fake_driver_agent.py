@@ -0,0 +1,406 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""An in-process stand-in for the Octavia driver agent.
+
+FakeDriverAgent listens on the status, stats and get unix sockets, and on a
+unified channel socket taking all three message types, and speaks the driver
+agent protocol, so a DriverLibrary, and the provider driver using it, can be
+exercised end to end in unit tests and benchmarks without a running
+Octavia::
+
+    with fake_driver_agent.FakeDriverAgent() as agent:
+        agent.add_object(constants.LOADBALANCERS, lb_id,
+                         {'loadbalancer_id': lb_id})
+        lib = driver_lib.DriverLibrary(**agent.socket_paths)
+        lib.get_loadbalancer(lb_id)
+        lib.update_loadbalancer_status(status)
+        assert agent.status_updates == [status]
+
+Every protocol extension DriverLibrary supports is answered: codec and
+compression negotiation, persistent connections, multiplexed requests, which
+are processed concurrently, the unified channel and bulk gets. Latency and
+failures can be injected per socket.
+"""
+
+from concurrent import futures
+import os
+import socket
+import socketserver
+import tempfile
+import threading
+import time
+
+from octavia_lib.api.drivers import codec as codec_lib
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.api.drivers import multiplex
+from octavia_lib.common import constants
+from octavia_lib.i18n import _
+
+STATUS = 'status'
+STATS = 'stats'
+GET = 'get'
+SOCKETS = (STATUS, STATS, GET)
+# The unified channel socket, its requests are counted, delayed and failed
+# as those of the socket of their message type.
+CHANNEL = 'channel'
+
+# Injectable failures: a failed status or statistics update, an invalid get
+# response, a connection closed without an answer, or no answer at all.
+ERROR = 'error'
+CLOSE = 'close'
+HANG = 'hang'
+FAILURES = (ERROR, CLOSE, HANG)
+
+# How long an idle connection waits for its next request at a time.
+_IDLE_TIMEOUT = 1
+# Invalid UTF-8, and a byte msgpack never uses.
+_INVALID_PAYLOAD = b'\xc1'
+
+
+class _Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # Connecting fails right away once the backlog is full.
+    request_queue_size = 128
+
+    def __init__(self, agent, name, socket_path):
+        self.agent = agent
+        self.name = name
+        super().__init__(socket_path, _Handler)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def setup(self):
+        self.agent = self.server.agent
+        self.name = self.server.name
+        self.wire_format = codec_lib.DEFAULT_WIRE_FORMAT
+        self.send_lock = threading.Lock()
+        self.agent._connection_opened(self.name, self.request)
+
+    def finish(self):
+        self.agent._connection_closed(self.request)
+
+    def _recv(self):
+        # Returns None once the connection or the agent is closed.
+        while not self.agent._stopped.is_set():
+            try:
+                return framing.recv_frame_with_fields(self.request,
+                                                      _IDLE_TIMEOUT)
+            except driver_exceptions.DriverAgentTimeout:
+                continue
+            except (OSError, ValueError):
+                return None
+        return None
+
+    def handle(self):
+        first = True
+        while True:
+            frame = self._recv()
+            if frame is None:
+                return
+            fields, payload = frame
+            if first:
+                first = False
+                if self._hello(fields, payload):
+                    continue
+            if (self.name == CHANNEL and
+                    fields.get(multiplex.MESSAGE_TYPE) not in SOCKETS):
+                # Not a unified channel request.
+                return
+            if multiplex.REQUEST_ID in fields:
+                self.agent._executor.submit(self._answer, fields, payload)
+            elif not self._answer(fields, payload):
+                return
+
+    def _hello(self, fields, payload):
+        # Negotiates the wire format if the frame is a hello request.
+        if fields.get(framing.COMPRESSED) == '1':
+            return False
+        try:
+            hello = codec_lib.JSON.loads(payload)[codec_lib.HELLO]
+            offered = hello[codec_lib.CODECS]
+        except (ValueError, KeyError, TypeError):
+            return False
+        names = [name for name in offered if name in self.agent.codecs]
+        name = names[0] if names else codec_lib.JSON.name
+        response = {codec_lib.VERSION: codec_lib.PROTOCOL_VERSION,
+                    codec_lib.CODEC: name}
+        threshold = None
+        if (self.agent.compression_threshold is not None and
+                codec_lib.ZLIB in hello.get(codec_lib.COMPRESSION, ())):
+            response[codec_lib.COMPRESSION] = codec_lib.ZLIB
+            threshold = self.agent.compression_threshold
+        framing.send_frame(self.request, codec_lib.JSON.dumps(
+            {codec_lib.HELLO: response}))
+        self.wire_format = codec_lib.WireFormat(
+            codec_lib.get_codec(name), threshold)
+        return True
+
+    def _answer(self, fields, payload):
+        # Returns False if the connection was closed instead.
+        name = self.name
+        if name == CHANNEL:
+            name = fields[multiplex.MESSAGE_TYPE]
+        request = self.wire_format.decode(payload)
+        failure = self.agent._take_failure(name)
+        latency = self.agent.latency[name]
+        if latency:
+            time.sleep(latency)
+        if failure == CLOSE:
+            self._close()
+            return False
+        if failure == HANG:
+            self.agent._stopped.wait()
+            return False
+        reply_fields = None
+        if multiplex.REQUEST_ID in fields:
+            reply_fields = {multiplex.REQUEST_ID:
+                            fields[multiplex.REQUEST_ID]}
+        if failure == ERROR and name == GET:
+            # Not a valid payload for any codec.
+            frame = (_INVALID_PAYLOAD, reply_fields)
+        else:
+            frame = self.wire_format.encode(
+                self.agent._respond(name, request, failure), reply_fields)
+        try:
+            with self.send_lock:
+                framing.send_frame(self.request, *frame)
+        except OSError:
+            return False
+        return True
+
+    def _close(self):
+        try:
+            self.request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class FakeDriverAgent():
+    """A stand-in driver agent listening on four unix sockets.
+
+    The objects returned by the get socket are added with add_object().
+    The status updates and statistics received are recorded in
+    status_updates and statistics, and the latest status received for each
+    object is in statuses, keyed by object type and ID.
+
+    :param directory: Where to create status.sock, stats.sock, get.sock and
+      the unified channel.sock. Defaults to a temporary directory removed
+      by stop().
+    :type directory: string
+    :param codecs: The codec names accepted in a hello request. Defaults to
+      every supported codec.
+    :type codecs: list
+    :param compression_threshold: Accept zlib compression when offered, and
+      compress the responses of at least this many bytes. None refuses
+      compression.
+    :type compression_threshold: int
+    :param bulk_get: Answer bulk get requests, like a driver agent that
+      supports them.
+    :type bulk_get: bool
+    :param workers: Threads answering multiplexed requests.
+    :type workers: int
+    :param record: Record the status updates and statistics received.
+      Benchmarks turn it off to run in constant memory.
+    :type record: bool
+    """
+
+    def __init__(self, directory=None, codecs=None,
+                 compression_threshold=1024, bulk_get=True, workers=32,
+                 record=True):
+        self.directory = directory
+        self.codecs = list(codecs or codec_lib.SUPPORTED_CODECS)
+        self.compression_threshold = compression_threshold
+        self.bulk_get = bulk_get
+        self.workers = workers
+        self.record = record
+        self.objects = {resource: {} for resource in (
+            constants.LOADBALANCERS, constants.LISTENERS, constants.POOLS,
+            constants.HEALTHMONITORS, constants.MEMBERS,
+            constants.L7POLICIES, constants.L7RULES)}
+        self.status_updates = []
+        self.statistics = []
+        self.statuses = {}
+        # Seconds to wait before answering a request, per socket. May be
+        # changed at any time.
+        self.latency = {name: 0 for name in SOCKETS}
+        self.requests = {name: 0 for name in SOCKETS}
+        self.connections = {name: 0 for name in SOCKETS + (CHANNEL,)}
+        self._failures = {name: [] for name in SOCKETS}
+        self._open = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._servers = []
+        self._threads = []
+        self._tmp_dir = None
+        self._executor = None
+
+    @property
+    def socket_paths(self):
+        """The socket paths, as DriverLibrary keyword arguments."""
+        return {'status_socket': self.status_socket,
+                'stats_socket': self.stats_socket,
+                'get_socket': self.get_socket}
+
+    def start(self):
+        """Create the sockets and start answering requests."""
+        if self.directory is None:
+            self._tmp_dir = tempfile.TemporaryDirectory()
+            self.directory = self._tmp_dir.name
+        self.status_socket = os.path.join(self.directory, 'status.sock')
+        self.stats_socket = os.path.join(self.directory, 'stats.sock')
+        self.get_socket = os.path.join(self.directory, 'get.sock')
+        self.channel_socket = os.path.join(self.directory, 'channel.sock')
+        self._stopped.clear()
+        self._executor = futures.ThreadPoolExecutor(
+            self.workers, thread_name_prefix='fake-driver-agent')
+        for name, socket_path in ((STATUS, self.status_socket),
+                                  (STATS, self.stats_socket),
+                                  (GET, self.get_socket),
+                                  (CHANNEL, self.channel_socket)):
+            server = _Server(self, name, socket_path)
+            thread = threading.Thread(target=server.serve_forever,
+                                      args=(0.05,), daemon=True,
+                                      name='fake-driver-agent-' + name)
+            thread.start()
+            self._servers.append(server)
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Close the sockets and every open connection."""
+        self._stopped.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._servers, self._threads = [], []
+        with self._lock:
+            connections = list(self._open)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for socket_path in (self.status_socket, self.stats_socket,
+                            self.get_socket, self.channel_socket):
+            try:
+                os.unlink(socket_path)
+            except FileNotFoundError:
+                pass
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+            self._tmp_dir = None
+            self.directory = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_object(self, resource, id, data):
+        """Store an object for the get socket to return.
+
+        Objects are returned as stored, status updates do not change them.
+
+        :param resource: The object type, for example constants.MEMBERS.
+        :type resource: string
+        :param id: The object ID.
+        :type id: string
+        :param data: The object, as a dictionary or a data model.
+        """
+        if hasattr(data, 'to_dict'):
+            data = data.to_dict(recurse=True)
+        with self._lock:
+            self.objects[resource][id] = data
+
+    def fail_next(self, name, failure=ERROR, count=1):
+        """Fail the next count requests received on a socket.
+
+        :param name: The socket, STATUS, STATS or GET.
+        :type name: string
+        :param failure: ERROR answers a status or statistics update with a
+          failure, and a get with an invalid response. CLOSE closes the
+          connection without answering. HANG does not answer until the
+          agent is stopped.
+        :type failure: string
+        :param count: How many requests to fail.
+        :type count: int
+        """
+        if name not in SOCKETS or failure not in FAILURES:
+            raise ValueError(_('Unknown socket or failure: {}, {}').format(
+                name, failure))
+        with self._lock:
+            self._failures[name].extend([failure] * count)
+
+    def _take_failure(self, name):
+        with self._lock:
+            self.requests[name] += 1
+            if self._failures[name]:
+                return self._failures[name].pop(0)
+        return None
+
+    def _connection_opened(self, name, conn):
+        with self._lock:
+            self.connections[name] += 1
+            self._open.add(conn)
+
+    def _connection_closed(self, conn):
+        with self._lock:
+            self._open.discard(conn)
+
+    def _respond(self, name, request, failure):
+        if name == GET:
+            return self._get(request)
+        if failure == ERROR:
+            return {constants.STATUS_CODE: constants.DRVR_STATUS_CODE_FAILED,
+                    constants.FAULT_STRING: 'Injected failure'}
+        if not self.record:
+            return {constants.STATUS_CODE: constants.DRVR_STATUS_CODE_OK}
+        with self._lock:
+            if name == STATUS:
+                self.status_updates.append(request)
+                self._apply_status(request)
+            else:
+                self.statistics.append(request)
+        return {constants.STATUS_CODE: constants.DRVR_STATUS_CODE_OK}
+
+    def _apply_status(self, status):
+        # Called with the lock held.
+        for resource, records in status.items():
+            if not isinstance(records, list):
+                continue
+            statuses = self.statuses.setdefault(resource, {})
+            for record in records:
+                statuses.setdefault(record.get(constants.ID), {}).update(
+                    (key, value) for key, value in record.items()
+                    if key != constants.ID)
+
+    def _get(self, request):
+        try:
+            resource = request[constants.OBJECT]
+            bulk = constants.IDS in request
+            ids = request[constants.IDS] if bulk else [request[constants.ID]]
+            with self._lock:
+                objects = self.objects[resource]
+                found = [objects.get(id, {}) for id in ids]
+        except (KeyError, TypeError):
+            return {}
+        if not bulk:
+            return found[0]
+        return found if self.bulk_get else {}
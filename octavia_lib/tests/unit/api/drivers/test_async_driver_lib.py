@@ -0,0 +1,326 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import asyncio
+import os
+import tempfile
+from unittest import mock
+
+from octavia_lib.api.drivers import async_driver_lib
+from octavia_lib.api.drivers import data_models
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.common import constants
+from octavia_lib.tests.unit import base
+
+
+class TestAsyncDriverLib(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.driver_lib = async_driver_lib.AsyncDriverLibrary()
+
+    @mock.patch('octavia_lib.api.drivers.readiness.wait_for_sockets')
+    def test_wait_for_driver_agent(self, mock_wait):
+        # should not raise an exception
+        asyncio.run(self.driver_lib.wait_for_driver_agent())
+        mock_wait.assert_called_once_with(
+            ['/var/run/octavia/status.sock', '/var/run/octavia/stats.sock',
+             '/var/run/octavia/get.sock'], 140)
+
+        mock_wait.side_effect = driver_exceptions.DriverAgentNotFound(
+            fault_string='boom')
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          asyncio.run,
+                          self.driver_lib.wait_for_driver_agent(timeout=1))
+        mock_wait.assert_called_with(mock.ANY, 1)
+
+    def test_wait_for_driver_agent_sockets(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        sockets = [os.path.join(tmp_dir.name, name)
+                   for name in ('status.sock', 'stats.sock', 'get.sock')]
+        lib = async_driver_lib.AsyncDriverLibrary(*sockets)
+
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          asyncio.run, lib.wait_for_driver_agent(timeout=0))
+
+        async def create_and_wait():
+            waiter = asyncio.ensure_future(
+                lib.wait_for_driver_agent(timeout=5))
+            for socket_path in sockets:
+                await asyncio.sleep(0.01)
+                self.assertFalse(waiter.done())
+                open(socket_path, 'w').close()
+            await waiter
+
+        asyncio.run(create_and_wait())
+
+    def _serve(self, handler):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        socket_path = os.path.join(tmp_dir.name, 'test.sock')
+
+        async def run(data, timeout=None):
+            server = await asyncio.start_unix_server(handler, socket_path)
+            async with server:
+                return await self.driver_lib._send(socket_path, data,
+                                                   timeout)
+
+        return run
+
+    def test_send(self):
+        received = []
+
+        async def handler(reader, writer):
+            size_str = await reader.readuntil(b'\n')
+            received.append(await reader.readexactly(int(size_str)))
+            writer.write(b'20\n{"status_code": 200}')
+            await writer.drain()
+            writer.close()
+
+        result = asyncio.run(self._serve(handler)('test data'))
+
+        self.assertEqual([b'"test data"'], received)
+        self.assertEqual({'status_code': 200}, result)
+
+    def test_send_connection_closed(self):
+        async def handler(reader, writer):
+            await reader.readuntil(b'\n')
+            writer.write(b'20\n{"status')
+            writer.close()
+
+        self.assertRaises(ConnectionResetError, asyncio.run,
+                          self._serve(handler)('test data'))
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DRIVER_AGENT_TIMEOUT',
+                0.01)
+    def test_send_timeout(self):
+        async def handler(reader, writer):
+            await asyncio.sleep(1)
+            writer.close()
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout, asyncio.run,
+                          self._serve(handler)('test data'))
+
+    def test_send_deadline(self):
+        async def handler(reader, writer):
+            # Reads the request slowly, then answers
+            await asyncio.sleep(0.2)
+            await reader.readuntil(b'\n')
+            writer.write(b'20\n{"status_code": 200}')
+            await writer.drain()
+            writer.close()
+
+        # The timeout covers the whole exchange
+        self.assertRaises(driver_exceptions.DriverAgentTimeout, asyncio.run,
+                          self._serve(handler)('test data', timeout=0.1))
+        self.assertEqual({'status_code': 200}, asyncio.run(
+            self._serve(handler)('test data', timeout=5)))
+
+    def test_send_no_agent(self):
+        self.assertRaises(FileNotFoundError, asyncio.run,
+                          self.driver_lib._send('/nonexistent/test.sock',
+                                                'test data'))
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary._send')
+    def test_update_loadbalancer_status(self, mock_send):
+        error_dict = {'status_code': 500, 'fault_string': 'boom',
+                      'status_object': 'balloon', 'status_object_id': '1',
+                      'status_record': 'tunes'}
+        mock_send.side_effect = [{'status_code': 200}, Exception('boom'),
+                                 error_dict]
+
+        # Happy path
+        asyncio.run(self.driver_lib.update_loadbalancer_status('fake_status'))
+
+        mock_send.assert_called_once_with('/var/run/octavia/status.sock',
+                                          'fake_status', None)
+
+        # Test general exception
+        self.assertRaises(
+            driver_exceptions.UpdateStatusError, asyncio.run,
+            self.driver_lib.update_loadbalancer_status(
+                'fake_status', loadbalancer_id='lb1'))
+
+        # Test bad status code returned
+        error = self.assertRaises(
+            driver_exceptions.UpdateStatusError, asyncio.run,
+            self.driver_lib.update_loadbalancer_status('fake_status'))
+        self.assertEqual('1', error.status_object_id)
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary._send')
+    def test_update_listener_statistics(self, mock_send):
+        error_dict = {'status_code': 500, 'fault_string': 'boom',
+                      'stats_object': 'balloon', 'stats_object_id': '1',
+                      'stats_record': 'tunes'}
+        mock_send.side_effect = [{'status_code': 200}, Exception('boom'),
+                                 error_dict]
+
+        # Happy path
+        asyncio.run(self.driver_lib.update_listener_statistics('fake_stats'))
+
+        mock_send.assert_called_once_with('/var/run/octavia/stats.sock',
+                                          'fake_stats', None)
+
+        # Test general exception
+        self.assertRaises(
+            driver_exceptions.UpdateStatisticsError, asyncio.run,
+            self.driver_lib.update_listener_statistics(
+                'fake_stats', loadbalancer_id='lb1'))
+
+        # Test bad status code returned
+        error = self.assertRaises(
+            driver_exceptions.UpdateStatisticsError, asyncio.run,
+            self.driver_lib.update_listener_statistics('fake_stats'))
+        self.assertEqual('1', error.stats_object_id)
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary._send')
+    def test_get_resource(self, mock_send):
+        mock_send.side_effect = ['some result',
+                                 driver_exceptions.DriverAgentTimeout,
+                                 Exception('boom')]
+
+        result = asyncio.run(self.driver_lib._get_resource('fake resource',
+                                                           'fake id'))
+
+        data = {constants.OBJECT: 'fake resource', constants.ID: 'fake id'}
+        mock_send.assert_called_once_with('/var/run/octavia/get.sock', data,
+                                          None)
+        self.assertEqual('some result', result)
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout, asyncio.run,
+                          self.driver_lib._get_resource('fake resource',
+                                                        'fake id'))
+
+        self.assertRaises(driver_exceptions.DriverError, asyncio.run,
+                          self.driver_lib._get_resource('fake resource',
+                                                        'fake id'))
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary._get_resource')
+    def _test_get_object(self, get_method, name, mock_from_dict,
+                         mock_get_resource):
+
+        mock_get_resource.side_effect = ['some data', None]
+        mock_from_dict.return_value = 'object'
+
+        result = asyncio.run(get_method('fake id'))
+
+        mock_get_resource.assert_called_once_with(name, 'fake id', None)
+        mock_from_dict.assert_called_once_with('some data')
+        self.assertEqual('object', result)
+
+        # Test not found
+        result = asyncio.run(get_method('fake id'))
+
+        self.assertIsNone(result)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.LoadBalancer.from_dict')
+    def test_get_loadbalancer(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_loadbalancer,
+                              constants.LOADBALANCERS, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.Listener.from_dict')
+    def test_get_listener(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_listener,
+                              constants.LISTENERS, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.Pool.from_dict')
+    def test_get_pool(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_pool,
+                              constants.POOLS, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.HealthMonitor.from_dict')
+    def test_get_healthmonitor(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_healthmonitor,
+                              constants.HEALTHMONITORS, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.Member.from_dict')
+    def test_get_member(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_member,
+                              constants.MEMBERS, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.L7Policy.from_dict')
+    def test_get_l7policy(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_l7policy,
+                              constants.L7POLICIES, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.data_models.L7Rule.from_dict')
+    def test_get_l7rule(self, mock_from_dict):
+        self._test_get_object(self.driver_lib.get_l7rule,
+                              constants.L7RULES, mock_from_dict)
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary._get_resource')
+    def test_get_loadbalancer_tree(self, mock_get_resource):
+        pool = {constants.POOL_ID: 'pool1'}
+        mock_get_resource.side_effect = [
+            {constants.LOADBALANCER_ID: 'lb1', constants.POOLS: [pool],
+             constants.LISTENERS: [{constants.LISTENER_ID: 'listener1',
+                                    constants.DEFAULT_POOL: pool}]},
+            {}]
+
+        lb = asyncio.run(self.driver_lib.get_loadbalancer_tree('lb1'))
+
+        mock_get_resource.assert_called_once_with(constants.LOADBALANCERS,
+                                                  'lb1', None)
+        self.assertIsInstance(lb.pools[0], data_models.Pool)
+        self.assertIs(lb.pools[0], lb.listeners[0].default_pool)
+
+        # Test not found
+        self.assertIsNone(
+            asyncio.run(self.driver_lib.get_loadbalancer_tree('lb1')))
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary._send')
+    def test_get_many(self, mock_send):
+        mock_send.side_effect = [[{'member_id': 'id1'}, {}],
+                                 driver_exceptions.DriverAgentTimeout,
+                                 Exception('boom')]
+
+        result = asyncio.run(self.driver_lib.get_many(constants.MEMBERS,
+                                                      ('id1', 'id2')))
+
+        data = {constants.OBJECT: constants.MEMBERS,
+                constants.IDS: ['id1', 'id2']}
+        mock_send.assert_called_once_with('/var/run/octavia/get.sock', data,
+                                          None)
+        self.assertEqual([data_models.Member(member_id='id1'), None], result)
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout, asyncio.run,
+                          self.driver_lib.get_many(constants.MEMBERS,
+                                                   ['id1']))
+        self.assertRaises(driver_exceptions.DriverError, asyncio.run,
+                          self.driver_lib.get_many(constants.MEMBERS,
+                                                   ['id1']))
+        self.assertEqual([], asyncio.run(
+            self.driver_lib.get_many(constants.MEMBERS, [])))
+
+    @mock.patch('octavia_lib.api.drivers.async_driver_lib.'
+                'AsyncDriverLibrary.get_many')
+    def test_get_many_helpers(self, mock_get_many):
+        for method, resource in (
+                (self.driver_lib.get_loadbalancers, constants.LOADBALANCERS),
+                (self.driver_lib.get_listeners, constants.LISTENERS),
+                (self.driver_lib.get_pools, constants.POOLS),
+                (self.driver_lib.get_healthmonitors,
+                 constants.HEALTHMONITORS),
+                (self.driver_lib.get_members, constants.MEMBERS),
+                (self.driver_lib.get_l7policies, constants.L7POLICIES),
+                (self.driver_lib.get_l7rules, constants.L7RULES)):
+            mock_get_many.reset_mock()
+            self.assertEqual(mock_get_many.return_value,
+                             asyncio.run(method(['id1'])))
+            mock_get_many.assert_called_once_with(resource, ['id1'],
+                                                  timeout=None)
@@ -0,0 +1,210 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest import mock
+
+from octavia_lib.api.drivers import cache
+from octavia_lib.common import constants
+from octavia_lib.tests.unit import base
+
+
+class TestLookupCache(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = cache.LookupCache(3, 10)
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, cache.LookupCache, 0, 10)
+
+    def test_get_put(self):
+        self.assertIs(cache.MISS, self.cache.get(constants.POOLS, 'pool1'))
+
+        self.cache.put(constants.POOLS, 'pool1', {'pool_id': 'pool1'})
+
+        self.assertEqual({'pool_id': 'pool1'},
+                         self.cache.get(constants.POOLS, 'pool1'))
+        self.assertIs(cache.MISS, self.cache.get(constants.MEMBERS, 'pool1'))
+        self.assertEqual({'hits': 1, 'misses': 2, 'size': 1},
+                         self.cache.stats())
+
+    def test_negative(self):
+        self.cache.put(constants.POOLS, 'pool1', {})
+
+        self.assertIsNone(self.cache.get(constants.POOLS, 'pool1'))
+
+    @mock.patch('time.monotonic')
+    def test_ttl(self, mock_monotonic):
+        lookup_cache = cache.LookupCache(
+            10, {constants.POOLS: 10, constants.MEMBERS: 1}, negative_ttl=2)
+        mock_monotonic.return_value = 100
+        lookup_cache.put(constants.POOLS, 'pool1', {'pool_id': 'pool1'})
+        lookup_cache.put(constants.MEMBERS, 'member1', {'id': 'member1'})
+        lookup_cache.put(constants.MEMBERS, 'member2', None)
+        # Not cached at all
+        lookup_cache.put(constants.L7RULES, 'rule1', {'id': 'rule1'})
+        lookup_cache.put(constants.L7RULES, 'rule2', None)
+
+        mock_monotonic.return_value = 101.5
+        self.assertIsNotNone(lookup_cache.get(constants.POOLS, 'pool1'))
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.MEMBERS, 'member1'))
+        self.assertIsNone(lookup_cache.get(constants.MEMBERS, 'member2'))
+        self.assertIs(cache.MISS, lookup_cache.get(constants.L7RULES,
+                                                   'rule1'))
+        self.assertIs(cache.MISS, lookup_cache.get(constants.L7RULES,
+                                                   'rule2'))
+
+        mock_monotonic.return_value = 110
+        self.assertIs(cache.MISS, lookup_cache.get(constants.POOLS, 'pool1'))
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.MEMBERS, 'member2'))
+        self.assertEqual(0, lookup_cache.stats()['size'])
+
+    def test_lru(self):
+        for id in ('lb1', 'lb2', 'lb3'):
+            self.cache.put(constants.LOADBALANCERS, id, {'id': id})
+        self.cache.get(constants.LOADBALANCERS, 'lb1')
+
+        self.cache.put(constants.LOADBALANCERS, 'lb4', {'id': 'lb4'})
+
+        self.assertIs(cache.MISS,
+                      self.cache.get(constants.LOADBALANCERS, 'lb2'))
+        for id in ('lb1', 'lb3', 'lb4'):
+            self.assertIsNot(cache.MISS,
+                             self.cache.get(constants.LOADBALANCERS, id))
+
+    def test_invalidate(self):
+        lookup_cache = cache.LookupCache(10, 10)
+        lookup_cache.put(constants.LOADBALANCERS, 'lb1', {})
+        lookup_cache.put(constants.LOADBALANCERS, 'lb2',
+                         {constants.LOADBALANCER_ID: 'lb2'})
+        lookup_cache.put(constants.POOLS, 'pool1',
+                         {constants.LOADBALANCER_ID: 'lb2'})
+        lookup_cache.put(constants.MEMBERS, 'member1',
+                         {constants.POOL_ID: 'pool1'})
+        lookup_cache.put(constants.MEMBERS, 'member2',
+                         {constants.POOL_ID: 'pool1'})
+
+        lookup_cache.invalidate(constants.MEMBERS, 'member1')
+
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.MEMBERS, 'member1'))
+        self.assertIs(cache.MISS, lookup_cache.get(constants.POOLS, 'pool1'))
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.LOADBALANCERS, 'lb2'))
+        self.assertIsNot(cache.MISS,
+                         lookup_cache.get(constants.MEMBERS, 'member2'))
+        self.assertIsNot(cache.MISS,
+                         lookup_cache.get(constants.LOADBALANCERS, 'lb1'))
+
+        # Not cached
+        lookup_cache.invalidate(constants.MEMBERS, 'member3')
+
+    def test_invalidate_parent_not_cached(self):
+        lookup_cache = cache.LookupCache(10, 10)
+        lookup_cache.put(constants.LOADBALANCERS, 'lb1',
+                         {constants.LOADBALANCER_ID: 'lb1'})
+        lookup_cache.put(constants.MEMBERS, 'member1',
+                         {constants.POOL_ID: 'pool1'})
+        lookup_cache.put(constants.MEMBERS, 'member2',
+                         {constants.POOL_ID: 'pool2'})
+
+        # Which load balancer pool1 belongs to is not known
+        lookup_cache.invalidate(constants.MEMBERS, 'member1')
+
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.LOADBALANCERS, 'lb1'))
+        self.assertIsNot(cache.MISS,
+                         lookup_cache.get(constants.MEMBERS, 'member2'))
+
+    def test_invalidate_tree(self):
+        lookup_cache = cache.LookupCache(10, 10)
+        lookup_cache.put(constants.LOADBALANCERS, 'lb1', {
+            constants.LOADBALANCER_ID: 'lb1',
+            constants.POOLS: [{constants.POOL_ID: 'pool1',
+                               constants.MEMBERS: [
+                                   {constants.MEMBER_ID: 'member1'}]}]})
+        lookup_cache.put(constants.LOADBALANCERS, 'lb2', {
+            constants.LOADBALANCER_ID: 'lb2',
+            constants.LISTENERS: [{constants.LISTENER_ID: 'listener2',
+                                   constants.DEFAULT_POOL: {
+                                       constants.POOL_ID: 'pool2'}}]})
+        lookup_cache.put(constants.POOLS, 'pool2',
+                         {constants.LOADBALANCER_ID: 'lb2'})
+
+        # Neither member1 nor pool1 were cached on their own
+        lookup_cache.invalidate(constants.MEMBERS, 'member1')
+
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.LOADBALANCERS, 'lb1'))
+        self.assertIsNot(cache.MISS,
+                         lookup_cache.get(constants.LOADBALANCERS, 'lb2'))
+        self.assertIsNot(cache.MISS,
+                         lookup_cache.get(constants.POOLS, 'pool2'))
+
+        # The links outlive the cached load balancer
+        lookup_cache.put(constants.LOADBALANCERS, 'lb1',
+                         {constants.LOADBALANCER_ID: 'lb1'})
+        lookup_cache.invalidate(constants.MEMBERS, 'member1')
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.LOADBALANCERS, 'lb1'))
+
+        lookup_cache.invalidate(constants.POOLS, 'pool2')
+        self.assertIs(cache.MISS,
+                      lookup_cache.get(constants.LOADBALANCERS, 'lb2'))
+
+    def test_put_invalidated_meanwhile(self):
+        lookup_cache = cache.LookupCache(2, 10)
+        member = lookup_cache.generation(constants.MEMBERS, 'member1')
+        pool = lookup_cache.generation(constants.POOLS, 'pool1')
+        lb = lookup_cache.generation(constants.LOADBALANCERS, 'lb1')
+        lookup_cache.put(constants.MEMBERS, 'member2',
+                         {constants.POOL_ID: 'pool1'})
+
+        # In flight while member1 and, through member2, pool1 change
+        lookup_cache.invalidate(constants.MEMBERS, 'member1')
+        lookup_cache.invalidate(constants.MEMBERS, 'member2')
+        lookup_cache.put(constants.MEMBERS, 'member1', {}, member)
+        lookup_cache.put(constants.POOLS, 'pool1', {}, pool)
+        # The parents of member1 are not known, every load balancer is
+        # invalidated
+        lookup_cache.put(constants.LOADBALANCERS, 'lb1', {}, lb)
+
+        for resource, id in ((constants.MEMBERS, 'member1'),
+                             (constants.POOLS, 'pool1'),
+                             (constants.LOADBALANCERS, 'lb1')):
+            self.assertIs(cache.MISS, lookup_cache.get(resource, id))
+
+        # Fetched after the invalidation
+        member = lookup_cache.generation(constants.MEMBERS, 'member1')
+        lookup_cache.put(constants.MEMBERS, 'member1', {}, member)
+        self.assertIsNone(lookup_cache.get(constants.MEMBERS, 'member1'))
+
+        # Still dropped once the invalidation is forgotten
+        pool = lookup_cache.generation(constants.POOLS, 'pool2')
+        lookup_cache.invalidate(constants.POOLS, 'pool2')
+        for index in range(2 * cache.LINKS_PER_ENTRY):
+            lookup_cache.invalidate(constants.LOADBALANCERS, index)
+        lookup_cache.put(constants.POOLS, 'pool2', {}, pool)
+        self.assertIs(cache.MISS, lookup_cache.get(constants.POOLS, 'pool2'))
+
+        pool = lookup_cache.generation(constants.POOLS, 'pool2')
+        lookup_cache.clear()
+        lookup_cache.put(constants.POOLS, 'pool2', {}, pool)
+        self.assertIs(cache.MISS, lookup_cache.get(constants.POOLS, 'pool2'))
+
+    def test_clear(self):
+        self.cache.put(constants.POOLS, 'pool1', {'pool_id': 'pool1'})
+
+        self.cache.clear()
+
+        self.assertEqual(0, self.cache.stats()['size'])
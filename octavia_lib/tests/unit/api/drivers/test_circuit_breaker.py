@@ -0,0 +1,102 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest import mock
+
+from octavia_lib.api.drivers import circuit_breaker
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.tests.unit import base
+
+
+class TestCircuitBreaker(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.breaker = circuit_breaker.CircuitBreaker('fake_path', 2, 10)
+
+    def _fail(self, error):
+        self.breaker.before_call()
+        self.breaker.after_call(error)
+
+    def test_invalid_threshold(self):
+        self.assertRaises(ValueError, circuit_breaker.CircuitBreaker,
+                          'fake_path', 0, 10)
+
+    def test_is_failure(self):
+        self.assertTrue(circuit_breaker.is_failure(FileNotFoundError()))
+        self.assertTrue(circuit_breaker.is_failure(ConnectionResetError()))
+        self.assertTrue(circuit_breaker.is_failure(
+            driver_exceptions.DriverAgentTimeout()))
+        self.assertFalse(circuit_breaker.is_failure(ValueError()))
+
+    def test_trips_on_consecutive_failures(self):
+        self._fail(ConnectionRefusedError())
+        # A success resets the count
+        self.breaker.before_call()
+        self.breaker.after_call()
+        self._fail(ConnectionRefusedError())
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+        # Not a failure, the driver agent answered
+        self._fail(ValueError())
+        self._fail(ConnectionRefusedError())
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+
+        self._fail(FileNotFoundError())
+
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          self.breaker.before_call)
+
+    def test_open_after_timeouts(self):
+        self._fail(driver_exceptions.DriverAgentTimeout())
+        self._fail(driver_exceptions.DriverAgentTimeout())
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          self.breaker.before_call)
+
+    @mock.patch('time.monotonic')
+    def test_half_open(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self._fail(FileNotFoundError())
+        self._fail(FileNotFoundError())
+
+        mock_monotonic.return_value = 109
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          self.breaker.before_call)
+
+        # A single probe goes through, and fails
+        mock_monotonic.return_value = 110
+        self.breaker.before_call()
+        self.assertEqual(circuit_breaker.HALF_OPEN, self.breaker.state)
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          self.breaker.before_call)
+        self.breaker.after_call(FileNotFoundError())
+        self.assertEqual(circuit_breaker.OPEN, self.breaker.state)
+
+        mock_monotonic.return_value = 115
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          self.breaker.before_call)
+
+        # The next probe succeeds
+        mock_monotonic.return_value = 120
+        self.breaker.before_call()
+        self.breaker.after_call()
+        self.assertEqual(circuit_breaker.CLOSED, self.breaker.state)
+        self.breaker.before_call()
+        self.breaker.before_call()
+
+        self.assertEqual(
+            {'state': circuit_breaker.CLOSED, 'consecutive_failures': 0,
+             'rejected': 3,
+             'transitions': {circuit_breaker.CLOSED: 1,
+                             circuit_breaker.OPEN: 2,
+                             circuit_breaker.HALF_OPEN: 2}},
+            self.breaker.stats())
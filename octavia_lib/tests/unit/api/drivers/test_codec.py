@@ -0,0 +1,112 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import socket
+
+from octavia_lib.api.drivers import codec
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.tests.unit import base
+
+
+class TestCodec(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.local, self.remote = socket.socketpair()
+        self.local.settimeout(5)
+        self.remote.settimeout(5)
+        self.addCleanup(self.local.close)
+        self.addCleanup(self.remote.close)
+
+    def test_round_trip(self):
+        data = {'loadbalancers': [{'id': 'lb1', 'operating_status': 'ONLINE',
+                                   'weight': 1, 'backup': False,
+                                   'tags': None}]}
+        for wire_codec in codec.SUPPORTED_CODECS.values():
+            self.assertEqual(
+                data, wire_codec.loads(bytearray(wire_codec.dumps(data))))
+
+        self.assertEqual(data, codec.JSON.loads(
+            memoryview(codec.JSON.dumps(data))))
+        self.assertLess(len(codec.MSGPACK.dumps(data)),
+                        len(codec.JSON.dumps(data)))
+
+    def test_get_codec(self):
+        self.assertIs(codec.MSGPACK, codec.get_codec('msgpack'))
+        self.assertRaises(ValueError, codec.get_codec, 'bogus')
+
+    def test_wire_format(self):
+        wire_format = codec.WireFormat(codec.JSON, compression_threshold=100)
+
+        payload, fields = wire_format.encode('small', {'id': 1})
+        self.assertEqual((b'"small"', {'id': 1}), (payload, fields))
+
+        payload, fields = wire_format.encode('x' * 200, {'id': 1})
+        self.assertEqual({'id': 1, 'z': 1}, fields)
+        self.assertLess(len(payload), 100)
+
+        framing.send_frame(self.remote, payload, fields)
+        self.assertEqual('x' * 200, wire_format.decode(
+            framing.recv_frame(self.local, 5)))
+
+    def test_negotiate_json_only(self):
+        self.assertIs(codec.DEFAULT_WIRE_FORMAT,
+                      codec.negotiate(self.local, ['json'], 5))
+
+        # Nothing was sent
+        self.remote.setblocking(False)
+        self.assertRaises(BlockingIOError, self.remote.recv, 1)
+
+    def test_negotiate(self):
+        framing.send_frame(self.remote, codec.JSON.dumps(
+            {'hello': {'version': 1, 'codec': 'msgpack'}}))
+
+        wire_format = codec.negotiate(self.local, ['msgpack', 'json'], 5)
+
+        self.assertIs(codec.MSGPACK, wire_format.codec)
+        self.assertIsNone(wire_format.compression_threshold)
+        self.assertEqual(
+            {'hello': {'versions': [1], 'codecs': ['msgpack', 'json']}},
+            codec.JSON.loads(framing.recv_frame(self.remote, 5)))
+
+    def test_negotiate_compression(self):
+        framing.send_frame(self.remote, codec.JSON.dumps(
+            {'hello': {'version': 1, 'codec': 'json',
+                       'compression': 'zlib'}}))
+
+        wire_format = codec.negotiate(self.local, ['json'], 5,
+                                      compression_threshold=1024)
+
+        self.assertIs(codec.JSON, wire_format.codec)
+        self.assertEqual(1024, wire_format.compression_threshold)
+        self.assertEqual(
+            {'hello': {'versions': [1], 'codecs': ['json'],
+                       'compression': ['zlib']}},
+            codec.JSON.loads(framing.recv_frame(self.remote, 5)))
+
+    def test_negotiate_compression_declined(self):
+        framing.send_frame(self.remote, codec.JSON.dumps(
+            {'hello': {'version': 1, 'codec': 'json'}}))
+
+        wire_format = codec.negotiate(self.local, ['json'], 5,
+                                      compression_threshold=1024)
+
+        self.assertIsNone(wire_format.compression_threshold)
+
+    def test_negotiate_invalid_response(self):
+        for response in ({'status_code': 500},
+                         {'hello': {'version': 1, 'codec': 'json'}},
+                         {'hello': {'version': 99, 'codec': 'msgpack'}},
+                         ['hello']):
+            framing.send_frame(self.remote, codec.JSON.dumps(response))
+            self.assertRaises(driver_exceptions.DriverError,
+                              codec.negotiate, self.local, ['msgpack'], 5)
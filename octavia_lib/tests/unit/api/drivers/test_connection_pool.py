@@ -0,0 +1,201 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import socket
+import tempfile
+import time
+from unittest import mock
+
+from octavia_lib.api.drivers import connection_pool
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.tests.unit import base
+
+
+class TestConnectionPool(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pool = connection_pool.ConnectionPool(
+            'fake_path', 2, socket_timeout=5, acquire_timeout=0)
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, connection_pool.ConnectionPool,
+                          'fake_path', 0, 5, 5)
+
+    @mock.patch('socket.socket')
+    def test_acquire_new(self, mock_socket):
+        sock = mock_socket.return_value
+
+        result = self.pool.acquire()
+
+        self.assertEqual((sock, False), result)
+        sock.settimeout.assert_called_once_with(5)
+        sock.connect.assert_called_once_with('fake_path')
+
+        # A timeout bounds connecting too
+        self.pool.acquire(1)
+        self.assertLessEqual(sock.settimeout.call_args[0][0], 1)
+
+    @mock.patch('socket.socket')
+    def test_acquire_connect_failure(self, mock_socket):
+        sock = mock_socket.return_value
+        sock.connect.side_effect = FileNotFoundError
+
+        self.assertRaises(FileNotFoundError, self.pool.acquire)
+
+        sock.close.assert_called_once()
+        # The slot must have been given back
+        sock.connect.side_effect = None
+        self.pool.acquire()
+        self.pool.acquire()
+
+    @mock.patch('socket.socket')
+    def test_acquire_bounded(self, mock_socket):
+        self.pool.acquire()
+        self.pool.acquire()
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          self.pool.acquire)
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          self.pool.acquire, 0.01)
+
+    def test_reuse_alive(self):
+        local, remote = socket.socketpair()
+        self.addCleanup(remote.close)
+        self.addCleanup(local.close)
+        self.pool._idle.append(local)
+
+        self.assertEqual((local, True), self.pool.acquire())
+
+    def test_reuse_real_socket(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        socket_path = os.path.join(tmp_dir.name, 'agent.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(socket_path)
+        server.listen(1)
+        pool = connection_pool.ConnectionPool(socket_path, 1,
+                                              socket_timeout=5,
+                                              acquire_timeout=0)
+        self.addCleanup(pool.close)
+        sock, reused = pool.acquire()
+        self.assertFalse(reused)
+        pool.release(sock)
+
+        start = time.monotonic()
+        result = pool.acquire()
+
+        # Reused right away, the socket timeout is not waited for
+        self.assertEqual((sock, True), result)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(5, sock.gettimeout())
+        pool.release(sock)
+
+    @mock.patch('octavia_lib.api.drivers.connection_pool.ConnectionPool.'
+                '_connect')
+    def test_reuse_peer_closed(self, mock_connect):
+        local, remote = socket.socketpair()
+        self.addCleanup(local.close)
+        self.pool._idle.append(local)
+        remote.close()
+
+        sock, reused = self.pool.acquire()
+
+        self.assertIs(mock_connect.return_value, sock)
+        self.assertFalse(reused)
+        self.assertEqual(-1, local.fileno())
+
+    @mock.patch('octavia_lib.api.drivers.connection_pool.ConnectionPool.'
+                '_connect')
+    def test_reuse_unexpected_data(self, mock_connect):
+        local, remote = socket.socketpair()
+        self.addCleanup(remote.close)
+        self.addCleanup(local.close)
+        remote.sendall(b'stale')
+        self.pool._idle.append(local)
+
+        sock, reused = self.pool.acquire()
+
+        self.assertIs(mock_connect.return_value, sock)
+        self.assertFalse(reused)
+
+    def test_release(self):
+        sock = mock.MagicMock()
+        with mock.patch.object(self.pool, '_connect', return_value=sock):
+            self.pool.acquire()
+            self.pool.acquire()
+
+        self.pool.release(sock)
+
+        self.assertEqual([sock], list(self.pool._idle))
+        with mock.patch.object(self.pool, '_is_alive', return_value=True):
+            self.assertEqual((sock, True), self.pool.acquire())
+
+    def test_is_alive_with_timeout(self):
+        local, remote = socket.socketpair()
+        self.addCleanup(remote.close)
+        self.addCleanup(local.close)
+        local.settimeout(5)
+
+        start = time.monotonic()
+        self.assertTrue(self.pool._is_alive(local))
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(5, local.gettimeout())
+
+        remote.close()
+        self.assertFalse(self.pool._is_alive(local))
+
+    def test_is_alive_error(self):
+        sock = mock.MagicMock()
+        sock.recv.side_effect = OSError
+
+        self.assertFalse(self.pool._is_alive(sock))
+
+    @mock.patch('socket.socket')
+    def test_discard(self, mock_socket):
+        sock, _ = self.pool.acquire()
+        self.pool.acquire()
+
+        self.pool.discard(sock)
+
+        sock.close.assert_called_once()
+        self.pool.acquire()
+
+    def test_close(self):
+        sock1 = mock.MagicMock()
+        sock2 = mock.MagicMock()
+        self.pool._idle.extend([sock1, sock2])
+
+        self.pool.close()
+
+        sock1.close.assert_called_once()
+        sock2.close.assert_called_once()
+        self.assertEqual(0, len(self.pool._idle))
+
+    @mock.patch('socket.socket')
+    def test_after_fork(self, mock_socket):
+        # Both slots held by threads of the parent
+        self.pool.acquire()
+        self.pool.acquire()
+        idle = mock.MagicMock()
+        self.pool._idle.append(idle)
+        self.pool._lock.acquire()
+
+        self.pool.after_fork()
+
+        idle.close.assert_called_once()
+        idle.shutdown.assert_not_called()
+        self.assertEqual(0, len(self.pool._idle))
+        new_sock = mock_socket.return_value
+        self.assertEqual((new_sock, False), self.pool.acquire())
+        self.assertEqual((new_sock, False), self.pool.acquire())
@@ -11,12 +11,28 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+from concurrent import futures
+import os
 import socket
+import tempfile
+import threading
+import time
 from unittest import mock
 
+from octavia_lib.api.drivers import cache
+from octavia_lib.api.drivers import circuit_breaker
+from octavia_lib.api.drivers import codec
+from octavia_lib.api.drivers import data_models
 from octavia_lib.api.drivers import driver_lib
 from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.api.drivers import lanes
+from octavia_lib.api.drivers import metrics
+from octavia_lib.api.drivers import sharding
+from octavia_lib.api.drivers import spool
+from octavia_lib.api.drivers import timeouts
 from octavia_lib.common import constants
+from octavia_lib.tests import fake_driver_agent
 from octavia_lib.tests.unit import base
 
 
@@ -29,10 +45,10 @@ class TestDriverLib(base.TestCase):
 
         super().setUp()
 
-    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
-                '_check_for_socket_ready.retry.sleep')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.'
+                'DRIVER_AGENT_READY_TIMEOUT', 0.01)
     @mock.patch('os.path.exists')
-    def test_check_for_socket_ready(self, mock_path_exists, mock_sleep):
+    def test_check_for_socket_ready(self, mock_path_exists):
         mock_path_exists.return_value = True
 
         # should not raise an exception
@@ -43,57 +59,56 @@ class TestDriverLib(base.TestCase):
                           self.driver_lib._check_for_socket_ready,
                           'bogus')
 
-    @mock.patch('builtins.memoryview')
-    def test_recv(self, mock_memoryview):
-        mock_socket = mock.MagicMock()
-        mock_socket.recv.side_effect = [b'1', b'\n', b'2', b'3', b'\n']
-        mock_socket.recv_into.return_value = 1
-        mv_mock = mock.MagicMock()
-        mock_memoryview.return_value = mv_mock
-        mv_mock.tobytes.return_value = b'"test data"'
-
-        response = self.driver_lib._recv(mock_socket)
+    @mock.patch('octavia_lib.api.drivers.readiness.wait_for_sockets')
+    def test_wait_for_sockets(self, mock_wait):
+        lib = driver_lib.DriverLibrary()
 
-        calls = [mock.call(1), mock.call(1)]
+        # One wait, and one deadline, for all the sockets
+        mock_wait.assert_called_once_with(
+            (lib.status_socket, lib.stats_socket, lib.get_socket),
+            driver_lib.DRIVER_AGENT_READY_TIMEOUT)
 
-        mock_socket.recv.assert_has_calls(calls)
-        mock_socket.recv_into.assert_called_once_with(
-            mv_mock.__getitem__(), 1)
-        self.assertEqual('test data', response)
+    @mock.patch('octavia_lib.api.drivers.readiness.wait_for_sockets')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._request')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._connect')
+    def test_lazy(self, mock_connect, mock_request, mock_wait):
+        mock_request.return_value = {
+            constants.STATUS_CODE: constants.DRVR_STATUS_CODE_OK}
+        lib = driver_lib.DriverLibrary(lazy=True)
+        mock_wait.assert_not_called()
 
-        # Test size recv timeout
-        with mock.patch('octavia_lib.api.drivers.driver_lib.'
-                        'time') as mock_time:
-            mock_time.time.side_effect = [0, 1000, 0, 0, 0, 0, 1000]
-            self.assertRaises(driver_exceptions.DriverAgentTimeout,
-                              self.driver_lib._recv, mock_socket)
+        lib._send(lib.get_socket, 'test data')
+        lib._send(lib.get_socket, 'test data')
+        # Waited for on first use only
+        mock_wait.assert_called_once_with([lib.get_socket], mock.ANY)
 
-            # Test payload recv timeout
-            self.assertRaises(driver_exceptions.DriverAgentTimeout,
-                              self.driver_lib._recv, mock_socket)
+        mock_wait.side_effect = driver_exceptions.DriverAgentNotFound
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status, {})
+        self.assertEqual(2, mock_request.call_count)
 
-    @mock.patch('builtins.memoryview')
-    def test_recv_with_timeout(self, mock_memoryview):
-        mock_socket = mock.MagicMock()
-        mock_socket.recv.side_effect = [socket.timeout, b'1', b'\n', b'2',
-                                        b'3', b'\n']
-        mock_socket.recv_into.return_value = 1
-        mv_mock = mock.MagicMock()
-        mock_memoryview.return_value = mv_mock
-        mv_mock.tobytes.return_value = b'"test data"'
+        mock_wait.reset_mock()
+        mock_wait.side_effect = None
+        lib.wait_for_driver_agent(timeout=5)
+        mock_wait.assert_called_once_with(
+            (lib.status_socket, lib.stats_socket, lib.get_socket), 5)
+        lib.update_loadbalancer_status({})
+        mock_wait.assert_called_once()
 
-        response = self.driver_lib._recv(mock_socket)
+    @mock.patch('octavia_lib.api.drivers.framing.recv_frame')
+    def test_recv(self, mock_recv_frame):
+        mock_recv_frame.return_value = bytearray(b'"test data"')
 
-        calls = [mock.call(1), mock.call(1)]
+        response = self.driver_lib._recv('fake_socket')
 
-        mock_socket.recv.assert_has_calls(calls)
-        mock_socket.recv_into.assert_called_once_with(
-            mv_mock.__getitem__(), 1)
+        mock_recv_frame.assert_called_once_with(
+            'fake_socket', driver_lib.DRIVER_AGENT_TIMEOUT)
         self.assertEqual('test data', response)
 
     @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._recv')
     def test_send(self, mock_recv):
         mock_socket = mock.MagicMock()
+        mock_socket.sendmsg.return_value = 14
         mock_recv.return_value = 'fake_response'
 
         with mock.patch('socket.socket') as socket_mock:
@@ -101,11 +116,71 @@ class TestDriverLib(base.TestCase):
             response = self.driver_lib._send('fake_path', 'test data')
 
         mock_socket.connect.assert_called_once_with('fake_path')
-        mock_socket.send.assert_called_once_with(b'11\n')
-        mock_socket.sendall.assert_called_once_with(b'"test data"')
+        mock_socket.sendmsg.assert_called_once_with([b'11\n',
+                                                     b'"test data"'])
         mock_socket.close.assert_called_once()
         self.assertEqual(mock_recv.return_value, response)
 
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_connection_pools(self, mock_check_ready):
+        lib = driver_lib.DriverLibrary(connection_pool_size=3)
+
+        self.assertEqual({'/var/run/octavia/status.sock',
+                          '/var/run/octavia/stats.sock',
+                          '/var/run/octavia/get.sock'},
+                         set(lib._connection_pools))
+        for pool in lib._connection_pools.values():
+            self.assertEqual(3, pool.max_size)
+
+        with mock.patch('octavia_lib.api.drivers.connection_pool.'
+                        'ConnectionPool.close') as mock_close:
+            lib.close()
+        self.assertEqual(3, mock_close.call_count)
+
+        self.assertEqual({}, self.driver_lib._connection_pools)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._request')
+    def test_send_pooled(self, mock_request):
+        mock_pool = mock.MagicMock()
+        self.driver_lib._connection_pools['fake_path'] = mock_pool
+        sock1, sock2, sock3 = mock.MagicMock(), mock.MagicMock(), 'sock3'
+
+        # Happy path, the connection goes back to the pool
+        mock_pool.acquire.return_value = (sock1, True)
+        mock_request.return_value = 'fake_response'
+        self.assertEqual('fake_response',
+                         self.driver_lib._send('fake_path', 'test data'))
+        mock_request.assert_called_once_with(sock1, 'test data', mock.ANY)
+        mock_pool.release.assert_called_once_with(sock1)
+
+        # A reused connection closed by the agent is retried
+        mock_pool.reset_mock()
+        mock_pool.acquire.side_effect = [(sock1, True), (sock2, False)]
+        mock_request.side_effect = [ConnectionResetError, 'fake_response']
+        self.assertEqual('fake_response',
+                         self.driver_lib._send('fake_path', 'test data'))
+        mock_pool.discard.assert_called_once_with(sock1)
+        mock_pool.release.assert_called_once_with(sock2)
+
+        # A fresh connection failing is not retried
+        mock_pool.reset_mock()
+        mock_pool.acquire.side_effect = [(sock3, False)]
+        mock_request.side_effect = [BrokenPipeError]
+        self.assertRaises(BrokenPipeError, self.driver_lib._send,
+                          'fake_path', 'test data')
+        mock_pool.discard.assert_called_once_with(sock3)
+        mock_pool.release.assert_not_called()
+
+        # Other errors leave the stream in an unknown state
+        mock_pool.reset_mock()
+        mock_pool.acquire.side_effect = [(sock1, True)]
+        mock_request.side_effect = [driver_exceptions.DriverAgentTimeout]
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          self.driver_lib._send, 'fake_path', 'test data')
+        mock_pool.discard.assert_called_once_with(sock1)
+        mock_pool.release.assert_not_called()
+
     @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._send')
     def test_update_loadbalancer_status(self, mock_send):
         error_dict = {'status_code': 500, 'fault_string': 'boom',
@@ -118,7 +193,7 @@ class TestDriverLib(base.TestCase):
         self.driver_lib.update_loadbalancer_status('fake_status')
 
         mock_send.assert_called_once_with('/var/run/octavia/status.sock',
-                                          'fake_status')
+                                          'fake_status', None)
 
         # Test general exception
         self.assertRaises(driver_exceptions.UpdateStatusError,
@@ -142,7 +217,7 @@ class TestDriverLib(base.TestCase):
         self.driver_lib.update_listener_statistics('fake_stats')
 
         mock_send.assert_called_once_with('/var/run/octavia/stats.sock',
-                                          'fake_stats')
+                                          'fake_stats', None)
 
         # Test general exception
         self.assertRaises(driver_exceptions.UpdateStatisticsError,
@@ -166,7 +241,8 @@ class TestDriverLib(base.TestCase):
         result = self.driver_lib._get_resource(fake_resource, fake_id)
 
         data = {constants.OBJECT: fake_resource, constants.ID: fake_id}
-        mock_send.assert_called_once_with('/var/run/octavia/get.sock', data)
+        mock_send.assert_called_once_with('/var/run/octavia/get.sock', data,
+                                          None)
         self.assertEqual('some result', result)
 
         # Test with driver_exceptions.DriverAgentTimeout
@@ -189,7 +265,8 @@ class TestDriverLib(base.TestCase):
 
         result = get_method('fake id')
 
-        mock_get_resource.assert_called_once_with(name, 'fake id')
+        mock_get_resource.assert_called_once_with(name, 'fake id',
+                                                  timeout=None)
         mock_from_dict.assert_called_once_with('some data')
         self.assertEqual('object', result)
 
@@ -232,3 +309,1151 @@ class TestDriverLib(base.TestCase):
     def test_get_l7rule(self, mock_from_dict):
         self._test_get_object(self.driver_lib.get_l7rule,
                               constants.L7RULES, mock_from_dict)
+
+    @staticmethod
+    def _loadbalancer_tree():
+        pool = {constants.POOL_ID: 'pool1', constants.NAME: 'pool',
+                constants.MEMBERS: [{constants.MEMBER_ID: 'member1'}],
+                constants.HEALTHMONITOR: {
+                    constants.HEALTHMONITOR_ID: 'hm1'}}
+        return {
+            constants.LOADBALANCER_ID: 'lb1',
+            constants.POOLS: [pool,
+                              {constants.POOL_ID: 'pool2',
+                               constants.MEMBERS: [],
+                               constants.HEALTHMONITOR: None}],
+            constants.LISTENERS: [{
+                constants.LISTENER_ID: 'listener1',
+                constants.DEFAULT_POOL_ID: 'pool1',
+                constants.DEFAULT_POOL: dict(pool),
+                constants.L7POLICIES: [{
+                    constants.L7POLICY_ID: 'l7policy1',
+                    constants.RULES: [{constants.L7RULE_ID: 'l7rule1'}]}]}]}
+
+    def test_hydrate_loadbalancer_tree(self):
+        data = self._loadbalancer_tree()
+
+        lb = driver_lib.hydrate_loadbalancer_tree(data)
+
+        self.assertIsInstance(lb, data_models.LoadBalancer)
+        self.assertEqual('lb1', lb.loadbalancer_id)
+        pool1, pool2 = lb.pools
+        self.assertIsInstance(pool1, data_models.Pool)
+        self.assertEqual([data_models.Member(member_id='member1')],
+                         pool1.members)
+        self.assertEqual(data_models.HealthMonitor(healthmonitor_id='hm1'),
+                         pool1.healthmonitor)
+        self.assertEqual([], pool2.members)
+        self.assertIsNone(pool2.healthmonitor)
+        listener = lb.listeners[0]
+        self.assertIsInstance(listener, data_models.Listener)
+        self.assertIs(pool1, listener.default_pool)
+        l7policy = listener.l7policies[0]
+        self.assertIsInstance(l7policy, data_models.L7Policy)
+        self.assertEqual([data_models.L7Rule(l7rule_id='l7rule1')],
+                         l7policy.rules)
+        # The response is left alone
+        self.assertEqual(self._loadbalancer_tree(), data)
+
+    def test_hydrate_loadbalancer_tree_depth(self):
+        data = self._loadbalancer_tree()
+
+        lb = driver_lib.hydrate_loadbalancer_tree(data, depth=0)
+        self.assertIs(data_models.Unset, lb.pools)
+        self.assertIs(data_models.Unset, lb.listeners)
+
+        lb = driver_lib.hydrate_loadbalancer_tree(data, depth=1)
+        self.assertEqual('pool', lb.pools[0].name)
+        self.assertIs(data_models.Unset, lb.pools[0].members)
+        self.assertIs(data_models.Unset, lb.pools[0].healthmonitor)
+        self.assertIs(lb.pools[0], lb.listeners[0].default_pool)
+        self.assertIs(data_models.Unset, lb.listeners[0].l7policies)
+
+        lb = driver_lib.hydrate_loadbalancer_tree(data, depth=2)
+        self.assertEqual(1, len(lb.pools[0].members))
+        l7policy = lb.listeners[0].l7policies[0]
+        self.assertEqual('l7policy1', l7policy.l7policy_id)
+        self.assertIs(data_models.Unset, l7policy.rules)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_get_resource')
+    def test_get_loadbalancer_tree(self, mock_get_resource):
+        mock_get_resource.side_effect = [self._loadbalancer_tree(), {}]
+
+        lb = self.driver_lib.get_loadbalancer_tree('lb1', depth=1)
+
+        mock_get_resource.assert_called_once_with(constants.LOADBALANCERS,
+                                                  'lb1', timeout=None)
+        self.assertIs(lb.pools[0], lb.listeners[0].default_pool)
+        self.assertIs(data_models.Unset, lb.listeners[0].l7policies)
+
+        # Test not found
+        self.assertIsNone(self.driver_lib.get_loadbalancer_tree('lb1'))
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._send')
+    def test_get_resources(self, mock_send):
+        mock_send.side_effect = [['some result'],
+                                 driver_exceptions.DriverAgentTimeout,
+                                 Exception('boom')]
+
+        result = self.driver_lib._get_resources('fake resource', ['fake id'])
+
+        data = {constants.OBJECT: 'fake resource', constants.IDS: ['fake id']}
+        mock_send.assert_called_once_with('/var/run/octavia/get.sock', data,
+                                          None)
+        self.assertEqual(['some result'], result)
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          self.driver_lib._get_resources,
+                          'fake resource', ['fake id'])
+
+        self.assertRaises(driver_exceptions.DriverError,
+                          self.driver_lib._get_resources,
+                          'fake resource', ['fake id'])
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_get_resources')
+    def test_get_many(self, mock_get_resources):
+        mock_get_resources.return_value = [
+            {'member_id': 'id1', 'address': '192.0.2.10'}, {}, None]
+
+        result = self.driver_lib.get_many(constants.MEMBERS,
+                                          iter(['id1', 'id2', 'id3']))
+
+        mock_get_resources.assert_called_once_with(
+            constants.MEMBERS, ['id1', 'id2', 'id3'], None)
+        self.assertEqual([data_models.Member(member_id='id1',
+                                             address='192.0.2.10'),
+                          None, None], result)
+
+        # No round trip for nothing
+        mock_get_resources.reset_mock()
+        self.assertEqual([], self.driver_lib.get_many(constants.MEMBERS, []))
+        mock_get_resources.assert_not_called()
+
+        # Unknown resource type
+        self.assertRaises(KeyError, self.driver_lib.get_many, 'bogus',
+                          ['id1'])
+
+        # Response not matching the request
+        mock_get_resources.return_value = [{}]
+        self.assertRaises(driver_exceptions.DriverError,
+                          self.driver_lib.get_many, constants.MEMBERS,
+                          ['id1', 'id2'])
+        mock_get_resources.return_value = {}
+        self.assertRaises(driver_exceptions.DriverError,
+                          self.driver_lib.get_many, constants.MEMBERS,
+                          ['id1'])
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.get_many')
+    def test_get_many_helpers(self, mock_get_many):
+        for method, resource in (
+                (self.driver_lib.get_loadbalancers, constants.LOADBALANCERS),
+                (self.driver_lib.get_listeners, constants.LISTENERS),
+                (self.driver_lib.get_pools, constants.POOLS),
+                (self.driver_lib.get_healthmonitors,
+                 constants.HEALTHMONITORS),
+                (self.driver_lib.get_members, constants.MEMBERS),
+                (self.driver_lib.get_l7policies, constants.L7POLICIES),
+                (self.driver_lib.get_l7rules, constants.L7RULES)):
+            mock_get_many.reset_mock()
+            self.assertEqual(mock_get_many.return_value, method(['id1']))
+            mock_get_many.assert_called_once_with(resource, ['id1'],
+                                                  timeout=None)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def _cached_driver_lib(self, mock_check_ready):
+        return driver_lib.DriverLibrary(cache_size=10)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._send')
+    def test_get_resource_cached(self, mock_send):
+        lib = self._cached_driver_lib()
+        mock_send.side_effect = [{'pool_id': 'pool1'}, {}]
+
+        for _ in range(2):
+            self.assertEqual({'pool_id': 'pool1'},
+                             lib._get_resource(constants.POOLS, 'pool1'))
+            self.assertFalse(lib._get_resource(constants.POOLS, 'pool2'))
+
+        self.assertEqual(2, mock_send.call_count)
+        self.assertEqual({'hits': 2, 'misses': 2, 'size': 2},
+                         lib.cache.stats())
+        self.assertIsNone(self.driver_lib.cache)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._send')
+    def test_update_loadbalancer_status_invalidates_cache(self, mock_send):
+        lib = self._cached_driver_lib()
+        lib.cache.put(constants.LOADBALANCERS, 'lb1', {'id': 'lb1'})
+        lib.cache.put(constants.LISTENERS, 'listener1',
+                      {constants.LOADBALANCER_ID: 'lb1'})
+        lib.cache.put(constants.POOLS, 'pool1', {'id': 'pool1'})
+        mock_send.side_effect = [{'status_code': 200}, Exception('boom')]
+
+        lib.update_loadbalancer_status({constants.LISTENERS: [
+            {constants.ID: 'listener1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+
+        self.assertEqual(1, lib.cache.stats()['size'])
+        self.assertIsNot(cache.MISS, lib.cache.get(constants.POOLS, 'pool1'))
+
+        # Invalidated even if the update fails
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status,
+                          {constants.POOLS: [{constants.ID: 'pool1'}]})
+        self.assertEqual(0, lib.cache.stats()['size'])
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_get_resources')
+    def test_get_many_cached(self, mock_get_resources):
+        lib = self._cached_driver_lib()
+        lib.cache.put(constants.MEMBERS, 'id2', {'member_id': 'id2'})
+        lib.cache.put(constants.MEMBERS, 'id4', {})
+        mock_get_resources.return_value = [{'member_id': 'id1'}, None]
+
+        result = lib.get_many(constants.MEMBERS, ['id1', 'id2', 'id3', 'id4'])
+
+        mock_get_resources.assert_called_once_with(constants.MEMBERS,
+                                                   ['id1', 'id3'], None)
+        self.assertEqual([data_models.Member(member_id='id1'),
+                          data_models.Member(member_id='id2'), None, None],
+                         result)
+
+        # Everything is cached now
+        mock_get_resources.reset_mock()
+        self.assertEqual(result, lib.get_many(constants.MEMBERS,
+                                              ['id1', 'id2', 'id3', 'id4']))
+        mock_get_resources.assert_not_called()
+
+        # Response not matching the request
+        mock_get_resources.return_value = []
+        self.assertRaises(driver_exceptions.DriverError, lib.get_many,
+                          constants.MEMBERS, ['id5'])
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def _multiplexed_driver_lib(self, mock_check_ready):
+        return driver_lib.DriverLibrary(multiplex=True)
+
+    @mock.patch('octavia_lib.api.drivers.multiplex.MultiplexedConnection')
+    def test_send_multiplexed(self, mock_connection):
+        lib = self._multiplexed_driver_lib()
+        connection, new_connection = mock.MagicMock(), mock.MagicMock()
+        mock_connection.side_effect = [connection, new_connection]
+        for item in (connection, new_connection):
+            item.closed.return_value = False
+            item.request.return_value.result.return_value = 'response'
+
+        self.assertEqual('response', lib._send('fake_path', 'test data'))
+        self.assertEqual('response', lib._send('fake_path', 'more data'))
+
+        # One connection per socket, reused until it breaks
+        mock_connection.assert_called_once_with(
+            'fake_path', socket_timeout=driver_lib.SOCKET_TIMEOUT,
+            request_timeout=driver_lib.DRIVER_AGENT_TIMEOUT,
+            codecs=['json'], compression_threshold=None, deadline=mock.ANY)
+        connection.request.assert_called_with('more data', mock.ANY)
+        connection.closed.return_value = True
+        lib._send('fake_path', 'test data')
+        self.assertEqual(2, mock_connection.call_count)
+        # The broken connection is closed when replaced
+        connection.close.assert_called_once_with()
+
+        lib.close()
+        new_connection.close.assert_called_once_with()
+
+    @mock.patch('octavia_lib.api.drivers.multiplex.MultiplexedConnection')
+    def test_multiplexed_connect_per_socket(self, mock_connection):
+        lib = self._multiplexed_driver_lib()
+        connecting = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def connect(socket_path, **kwargs):
+            if socket_path == 'slow_path':
+                connecting.set()
+                release.wait(10)
+            return mock.MagicMock(**{'closed.return_value': False})
+        mock_connection.side_effect = connect
+        slow = threading.Thread(target=lib._multiplexed_connection,
+                                args=('slow_path', timeouts.Deadline(10)))
+        slow.start()
+        self.assertTrue(connecting.wait(10))
+
+        # Not held up by the connection to the other socket
+        start = time.monotonic()
+        lib._multiplexed_connection('fake_path', timeouts.Deadline(10))
+        self.assertLess(time.monotonic() - start, 1)
+        # Waiting for the connection to the same socket is bounded
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          lib._multiplexed_connection, 'slow_path',
+                          timeouts.Deadline(0.1))
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        slow.join()
+
+    @mock.patch('octavia_lib.api.drivers.multiplex.MultiplexedConnection')
+    def test_submit_multiplexed(self, mock_connection):
+        lib = self._multiplexed_driver_lib()
+        future = futures.Future()
+        mock_connection.return_value.request.return_value = future
+
+        self.assertIs(future, lib._submit('fake_path', 'test data'))
+
+        mock_connection.side_effect = FileNotFoundError
+        self.assertRaises(FileNotFoundError,
+                          lib._submit('other_path', 'test data').result)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._send')
+    def test_submit(self, mock_send):
+        mock_send.side_effect = ['response', ConnectionResetError]
+
+        future = self.driver_lib._submit('fake_path', 'test data')
+
+        mock_send.assert_called_once_with('fake_path', 'test data', None)
+        self.assertTrue(future.done())
+        self.assertEqual('response', future.result())
+        self.assertRaises(ConnectionResetError,
+                          self.driver_lib._submit('fake_path', 'data').result)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._submit')
+    def test_submit_get(self, mock_submit):
+        pending = futures.Future()
+        mock_submit.return_value = pending
+
+        future = self.driver_lib.submit_get(constants.POOLS, 'pool1')
+
+        mock_submit.assert_called_once_with(
+            '/var/run/octavia/get.sock',
+            {constants.OBJECT: constants.POOLS, constants.ID: 'pool1'}, None)
+        self.assertFalse(future.done())
+        pending.set_result({constants.POOL_ID: 'pool1'})
+        self.assertEqual(data_models.Pool(pool_id='pool1'), future.result(0))
+
+        # Not found
+        mock_submit.return_value = futures.Future()
+        mock_submit.return_value.set_result({})
+        self.assertIsNone(
+            self.driver_lib.submit_get(constants.POOLS, 'pool1').result(0))
+
+        # Errors
+        mock_submit.return_value = futures.Future()
+        mock_submit.return_value.set_exception(ConnectionResetError())
+        self.assertRaises(
+            driver_exceptions.DriverError,
+            self.driver_lib.submit_get(constants.POOLS, 'pool1').result, 0)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._submit')
+    def test_submit_loadbalancer_status(self, mock_submit):
+        pending = futures.Future()
+        mock_submit.return_value = pending
+
+        future = self.driver_lib.submit_loadbalancer_status('fake_status')
+
+        mock_submit.assert_called_once_with('/var/run/octavia/status.sock',
+                                            'fake_status', None)
+        pending.set_result({'status_code': 500, 'fault_string': 'boom'})
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          future.result, 0)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._submit')
+    def test_submit_listener_statistics(self, mock_submit):
+        pending = futures.Future()
+        mock_submit.return_value = pending
+
+        future = self.driver_lib.submit_listener_statistics('fake_stats')
+
+        mock_submit.assert_called_once_with('/var/run/octavia/stats.sock',
+                                            'fake_stats', None)
+        pending.set_result({'status_code': 200})
+        self.assertIsNone(future.result(0))
+
+    @mock.patch('octavia_lib.api.drivers.codec.negotiate')
+    @mock.patch('octavia_lib.api.drivers.framing.recv_frame')
+    @mock.patch('octavia_lib.api.drivers.framing.send_frame')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_request_codec(self, mock_check_ready, mock_send_frame,
+                           mock_recv_frame, mock_negotiate):
+        self.assertRaises(ValueError, driver_lib.DriverLibrary,
+                          codecs=['bogus'])
+        lib = driver_lib.DriverLibrary(codecs=['msgpack', 'json'],
+                                       compression_threshold=10)
+        mock_negotiate.return_value = codec.WireFormat(codec.MSGPACK)
+        mock_recv_frame.return_value = codec.MSGPACK.dumps('response')
+        sock = mock.MagicMock()
+
+        self.assertEqual('response', lib._request(sock, 'test data'))
+        self.assertEqual('response', lib._request(sock, 'test data'))
+
+        # Negotiated once per connection
+        mock_negotiate.assert_called_once_with(
+            sock, ['msgpack', 'json'], mock.ANY, compression_threshold=10)
+        mock_send_frame.assert_called_with(
+            sock, codec.MSGPACK.dumps('test data'), None)
+        lib._request(mock.MagicMock(), 'test data')
+        self.assertEqual(2, mock_negotiate.call_count)
+
+    def _serve_once(self, response, wire_codec=codec.JSON):
+        """Answer one request on a temporary socket, returns its path."""
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        socket_path = os.path.join(tmp_dir.name, 'get.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(socket_path)
+        server.listen(1)
+        received = []
+
+        def run():
+            conn, _addr = server.accept()
+            with conn:
+                if wire_codec is not codec.JSON:
+                    framing.recv_frame(conn, 5)
+                    framing.send_frame(conn, codec.JSON.dumps(
+                        {'hello': {'version': 1, 'codec': wire_codec.name}}))
+                received.append(wire_codec.loads(framing.recv_frame(conn, 5)))
+                framing.send_frame(conn, wire_codec.dumps(response))
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        return socket_path, received
+
+    def test_stream(self):
+        response = {'pools': [{'members': [{'id': 1}, {'id': 2}]}]}
+        request = {'object': 'loadbalancers', 'id': 'lb1'}
+
+        socket_path, received = self._serve_once(response)
+        self.assertEqual([{'id': 1}, {'id': 2}], list(self.driver_lib._stream(
+            socket_path, request, ('pools', 'members'))))
+        self.assertEqual([request], received)
+
+        # Other codecs are decoded whole
+        self.driver_lib.codecs = ['msgpack']
+        socket_path, received = self._serve_once(response, codec.MSGPACK)
+        self.assertEqual([{'id': 1}, {'id': 2}], list(self.driver_lib._stream(
+            socket_path, request, ('pools', 'members'))))
+        self.assertEqual([request], received)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._stream')
+    def test_iter_nested(self, mock_stream):
+        mock_stream.return_value = iter([{'member_id': 'm1'}, {}])
+
+        members = list(self.driver_lib.iter_nested(
+            constants.LOADBALANCERS, 'lb1', [constants.POOLS,
+                                             constants.MEMBERS]))
+
+        mock_stream.assert_called_once_with(
+            '/var/run/octavia/get.sock',
+            {constants.OBJECT: constants.LOADBALANCERS, constants.ID: 'lb1'},
+            (constants.POOLS, constants.MEMBERS), None)
+        self.assertEqual(1, len(members))
+        self.assertIsInstance(members[0], data_models.Member)
+        self.assertEqual('m1', members[0].member_id)
+
+        mock_stream.side_effect = driver_exceptions.DriverAgentTimeout
+        self.assertRaises(driver_exceptions.DriverAgentTimeout, list,
+                          self.driver_lib.iter_nested(
+                              constants.POOLS, 'p1', [constants.MEMBERS]))
+        mock_stream.side_effect = ValueError
+        self.assertRaises(driver_exceptions.DriverError, list,
+                          self.driver_lib.iter_nested(
+                              constants.POOLS, 'p1', [constants.MEMBERS]))
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._stream')
+    def test_iter_many(self, mock_stream):
+        mock_stream.return_value = iter([{'member_id': 'm1'}, {}])
+
+        members = list(self.driver_lib.iter_many(constants.MEMBERS,
+                                                 ['m1', 'm2']))
+
+        mock_stream.assert_called_once_with(
+            '/var/run/octavia/get.sock',
+            {constants.OBJECT: constants.MEMBERS, constants.IDS: ['m1', 'm2']},
+            (), None)
+        self.assertEqual('m1', members[0].member_id)
+        self.assertIsNone(members[1])
+
+        self.assertEqual([], list(self.driver_lib.iter_many(
+            constants.MEMBERS, [])))
+
+        for response in ([{}], [{}, {}, {}]):
+            mock_stream.return_value = iter(response)
+            self.assertRaises(driver_exceptions.DriverError, list,
+                              self.driver_lib.iter_many(constants.MEMBERS,
+                                                        ['m1', 'm2']))
+
+    def test_send_deadline(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        socket_path = os.path.join(tmp_dir.name, 'status.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(socket_path)
+        server.listen(1)
+        done = threading.Event()
+
+        def run():
+            # Takes the request, trickles a response that never completes
+            conn, _addr = server.accept()
+            with conn:
+                framing.recv_frame(conn, 5)
+                conn.sendall(b'100\n')
+                while not done.wait(0.05):
+                    conn.sendall(b' ')
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(done.set)
+
+        start = time.monotonic()
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          self.driver_lib._send, socket_path, 'test data',
+                          0.5)
+        self.assertLess(time.monotonic() - start, 2)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_send_deadline_negotiation(self, mock_check_ready):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        socket_path = os.path.join(tmp_dir.name, 'get.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.close)
+        server.bind(socket_path)
+        server.listen(3)
+        done = threading.Event()
+
+        def run():
+            # Accepts the connections and never answers the hello
+            conns = []
+            server.settimeout(0.05)
+            while not done.is_set():
+                try:
+                    conns.append(server.accept()[0])
+                except socket.timeout:
+                    pass
+            for conn in conns:
+                conn.close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(done.set)
+
+        for kwargs in ({}, {'connection_pool_size': 1}, {'multiplex': True}):
+            lib = driver_lib.DriverLibrary(codecs=['msgpack', 'json'],
+                                           **kwargs)
+            self.addCleanup(lib.close)
+            start = time.monotonic()
+            self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                              lib._send, socket_path, 'test data', 0.5)
+            self.assertLess(time.monotonic() - start, 2)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._request')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._connect')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_adaptive_timeout(self, mock_check_ready, mock_connect,
+                              mock_request):
+        lib = driver_lib.DriverLibrary(adaptive_timeout=True)
+        adaptive = lib._adaptive_timeouts[lib.get_socket]
+
+        def timeout(socket_path, timeout=None):
+            return lib._deadline(socket_path, timeout).timeout
+
+        self.assertEqual(driver_lib.DRIVER_AGENT_TIMEOUT,
+                         timeout(lib.get_socket))
+
+        for i in range(adaptive.warmup):
+            lib._send(lib.get_socket, 'test data')
+        self.assertEqual(adaptive.warmup, adaptive.samples)
+        self.assertEqual(driver_lib.MIN_ADAPTIVE_TIMEOUT,
+                         timeout(lib.get_socket))
+        # An explicit timeout wins, other sockets are tracked separately
+        self.assertEqual(7, timeout(lib.get_socket, 7))
+        self.assertEqual(driver_lib.DRIVER_AGENT_TIMEOUT,
+                         timeout(lib.status_socket))
+
+        mock_request.side_effect = driver_exceptions.DriverAgentTimeout
+        self.assertRaises(driver_exceptions.DriverAgentTimeout, lib._send,
+                          lib.get_socket, 'test data')
+        self.assertEqual(2 * driver_lib.MIN_ADAPTIVE_TIMEOUT,
+                         timeout(lib.get_socket))
+
+        # Other failures are not latency samples
+        mock_request.side_effect = ConnectionResetError
+        self.assertRaises(ConnectionResetError, lib._send, lib.get_socket,
+                          'test data')
+        self.assertEqual(adaptive.warmup, adaptive.samples)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary._connect')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_circuit_breaker(self, mock_check_ready, mock_connect):
+        lib = driver_lib.DriverLibrary(circuit_breaker_threshold=2)
+        breaker = lib.circuit_breakers[lib.get_socket]
+        mock_connect.side_effect = FileNotFoundError
+
+        for i in range(2):
+            self.assertRaises(driver_exceptions.DriverError,
+                              lib.get_pool, 'pool1')
+        self.assertEqual(circuit_breaker.OPEN, breaker.state)
+
+        # Fails fast, without trying to connect
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          lib.get_pool, 'pool1')
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          lib.get_many, constants.POOLS, ['pool1'])
+        self.assertRaises(driver_exceptions.DriverAgentNotFound, list,
+                          lib.iter_many(constants.POOLS, ['pool1']))
+        self.assertEqual(2, mock_connect.call_count)
+        self.assertEqual(3, breaker.stats()['rejected'])
+
+        # The other sockets have breakers of their own
+        self.assertEqual(circuit_breaker.CLOSED,
+                         lib.circuit_breakers[lib.status_socket].state)
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status, {})
+        self.assertEqual(3, mock_connect.call_count)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_multiplexed_connection')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_circuit_breaker_multiplexed(self, mock_check_ready,
+                                         mock_connection):
+        lib = driver_lib.DriverLibrary(multiplex=True,
+                                       circuit_breaker_threshold=1)
+        pending = futures.Future()
+        mock_connection.return_value.request.return_value = pending
+
+        future = lib._submit(lib.get_socket, 'test data')
+        pending.set_exception(driver_exceptions.DriverAgentTimeout())
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          future.result)
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          lib._submit(lib.get_socket, 'test data').result)
+        mock_connection.return_value.request.assert_called_once()
+
+    def test_status_dedupe(self):
+        agent = fake_driver_agent.FakeDriverAgent().start()
+        self.addCleanup(agent.stop)
+        lib = driver_lib.DriverLibrary(**agent.socket_paths,
+                                       status_dedupe_size=100)
+        self.addCleanup(lib.close)
+
+        def status(member_status=constants.ONLINE):
+            return {
+                constants.LOADBALANCERS: [
+                    {constants.ID: 'lb1',
+                     constants.PROVISIONING_STATUS: constants.ACTIVE}],
+                constants.MEMBERS: [
+                    {constants.ID: 'm1',
+                     constants.OPERATING_STATUS: member_status},
+                    {constants.ID: 'm2',
+                     constants.OPERATING_STATUS: constants.ONLINE}]}
+
+        lib.update_loadbalancer_status(status())
+        lib.update_loadbalancer_status(status())
+        # Nothing changed, nothing sent
+        self.assertEqual(1, agent.requests[fake_driver_agent.STATUS])
+
+        lib.update_loadbalancer_status(status(constants.ERROR))
+        self.assertEqual(
+            {constants.MEMBERS: [
+                {constants.ID: 'm1',
+                 constants.OPERATING_STATUS: constants.ERROR}]},
+            agent.status_updates[-1])
+
+        # A rejected update is not remembered
+        agent.fail_next(fake_driver_agent.STATUS)
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status, status())
+        lib.update_loadbalancer_status(status())
+        self.assertEqual(4, agent.requests[fake_driver_agent.STATUS])
+        self.assertEqual(constants.ONLINE,
+                         agent.statuses[constants.MEMBERS]['m1'][
+                             constants.OPERATING_STATUS])
+        self.assertEqual({'sent': 5, 'suppressed': 9, 'size': 3},
+                         lib.status_dedupe.stats())
+
+    @mock.patch('time.monotonic')
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_status_resync_interval(self, mock_check_ready, mock_monotonic):
+        mock_monotonic.return_value = 100
+        status = {constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}
+        lib = driver_lib.DriverLibrary(status_dedupe_size=10,
+                                       status_resync_interval=30)
+        self.assertIsNone(driver_lib.DriverLibrary().status_dedupe)
+
+        with mock.patch.object(lib, '_submit') as mock_submit:
+            mock_submit.return_value = futures.Future()
+            mock_submit.return_value.set_result(
+                {constants.STATUS_CODE: constants.DRVR_STATUS_CODE_OK})
+            lib.update_loadbalancer_status(status)
+            mock_monotonic.return_value = 120
+            lib.update_loadbalancer_status(status)
+            mock_monotonic.return_value = 130
+            lib.update_loadbalancer_status(status)
+
+        self.assertEqual(2, mock_submit.call_count)
+
+    def test_routing_key(self):
+        self.assertEqual('lb1', driver_lib.routing_key(
+            {constants.MEMBERS: [{constants.ID: 'm1'}],
+             constants.LOADBALANCERS: [{constants.ID: 'lb1'}]}))
+        self.assertEqual('m1', driver_lib.routing_key(
+            {constants.POOLS: [],
+             constants.MEMBERS: [{constants.ID: 'm1'}]}))
+        self.assertIsNone(driver_lib.routing_key({}))
+
+    def test_endpoints(self):
+        agents = []
+        for _ in range(3):
+            agent = fake_driver_agent.FakeDriverAgent().start()
+            self.addCleanup(agent.stop)
+            agent.add_object(constants.MEMBERS, 'm1', {'member_id': 'm1'})
+            agents.append(agent)
+        lib = driver_lib.DriverLibrary(
+            endpoints=[(agent.status_socket, agent.stats_socket,
+                        agent.get_socket) for agent in agents],
+            connection_pool_size=1)
+        self.addCleanup(lib.close)
+        self.assertEqual(agents[0].status_socket, lib.status_socket)
+
+        def receivers(loadbalancer_id):
+            return [index for index, agent in enumerate(agents)
+                    if loadbalancer_id in agent.statuses.get(
+                        constants.LOADBALANCERS, {})]
+
+        loadbalancer_ids = ['lb-{}'.format(i) for i in range(30)]
+        for _ in range(2):
+            for id in loadbalancer_ids:
+                lib.update_loadbalancer_status(
+                    {constants.LOADBALANCERS: [
+                        {constants.ID: id,
+                         constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+
+        # Each load balancer stays on one agent, every agent gets some
+        owners = {id: receivers(id) for id in loadbalancer_ids}
+        for id in loadbalancer_ids:
+            self.assertEqual(1, len(owners[id]))
+        self.assertEqual({0, 1, 2},
+                         {owner[0] for owner in owners.values()})
+
+        # Routed by the load balancer even without it in the update
+        member_status = {constants.MEMBERS: [
+            {constants.ID: 'm1',
+             constants.OPERATING_STATUS: constants.ONLINE}]}
+        lib.update_loadbalancer_status(member_status,
+                                       loadbalancer_id='lb-0')
+        self.assertIn('m1', agents[owners['lb-0'][0]].statuses[
+            constants.MEMBERS])
+        self.assertEqual('m1', lib.get_member('m1').member_id)
+
+        # The load balancers of a stopped agent move to the others
+        agents[1].stop()
+        for id in loadbalancer_ids:
+            lib.update_loadbalancer_status(
+                {constants.LOADBALANCERS: [
+                    {constants.ID: id,
+                     constants.OPERATING_STATUS: constants.ONLINE}]})
+            statuses = [agent.statuses[constants.LOADBALANCERS].get(id, {})
+                        for agent in agents]
+            received = [index for index, status in enumerate(statuses)
+                        if constants.OPERATING_STATUS in status]
+            if owners[id] == [1]:
+                self.assertIn(received, ([0], [2]))
+            else:
+                self.assertEqual(owners[id], received)
+        self.assertEqual(sharding.DOWN,
+                         lib.shards.stats()[agents[1].status_socket]['state'])
+
+    def test_channel_socket(self):
+        agent = fake_driver_agent.FakeDriverAgent().start()
+        self.addCleanup(agent.stop)
+        for id in ('m1', 'm2'):
+            agent.add_object(constants.MEMBERS, id, {'member_id': id})
+        lib = driver_lib.DriverLibrary(**agent.socket_paths,
+                                       channel_socket=agent.channel_socket,
+                                       codecs=['msgpack', 'json'])
+        self.addCleanup(lib.close)
+        status = {constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}
+        statistics = {constants.LISTENERS: [
+            {constants.ID: 'listener1', constants.ACTIVE_CONNECTIONS: 1}]}
+
+        self.assertEqual('m1', lib.get_member('m1').member_id)
+        lib.update_loadbalancer_status(status)
+        lib.update_listener_statistics(statistics)
+        self.assertEqual(['m1', 'm2'],
+                         [member.member_id for member in
+                          lib.iter_many(constants.MEMBERS, ['m1', 'm2'])])
+        agent.fail_next(fake_driver_agent.STATUS)
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status, status)
+
+        self.assertEqual([status], agent.status_updates)
+        self.assertEqual([statistics], agent.statistics)
+        self.assertEqual({fake_driver_agent.STATUS: 2,
+                          fake_driver_agent.STATS: 1,
+                          fake_driver_agent.GET: 2}, agent.requests)
+        # The multiplexed connection, and one for the streamed lookup
+        self.assertEqual({fake_driver_agent.STATUS: 0,
+                          fake_driver_agent.STATS: 0,
+                          fake_driver_agent.GET: 0,
+                          fake_driver_agent.CHANNEL: 2}, agent.connections)
+
+        self.assertRaises(ValueError, driver_lib.DriverLibrary,
+                          endpoints=[agent.socket_paths.values()],
+                          channel_socket=agent.channel_socket)
+
+    def test_lanes(self):
+        agent = fake_driver_agent.FakeDriverAgent().start()
+        self.addCleanup(agent.stop)
+        agent.add_object(constants.MEMBERS, 'm1', {'member_id': 'm1'})
+        agent.latency[fake_driver_agent.STATS] = 0.5
+        registry = metrics.MetricsRegistry()
+        lib = driver_lib.DriverLibrary(
+            **agent.socket_paths, metrics=registry,
+            lane_workers={lanes.STATS: 1, lanes.GET: 2},
+            lane_queue_limit={lanes.STATS: 1})
+        self.addCleanup(lib.close)
+        status = {constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}
+        statistics = {constants.LISTENERS: [
+            {constants.ID: 'listener1', constants.ACTIVE_CONNECTIONS: 1}]}
+
+        self.assertEqual({lanes.STATS, lanes.GET}, set(lib.lanes))
+        # One running and one queued, the others are refused
+        sent = [lib.submit_listener_statistics(statistics) for _ in range(2)]
+        refused = [lib.submit_listener_statistics(statistics)
+                   for _ in range(3)]
+        for future in refused:
+            self.assertIsInstance(future.exception(0),
+                                  driver_exceptions.UpdateStatisticsError)
+        # Status updates and gets do not wait for the statistics
+        start = time.monotonic()
+        lib.update_loadbalancer_status(status)
+        self.assertEqual('m1', lib.get_member('m1').member_id)
+        self.assertLess(time.monotonic() - start, 0.5)
+        for future in sent:
+            self.assertIsNone(future.result())
+        self.assertEqual(2, len(agent.statistics))
+
+        # The wait for a worker counts in the timeout
+        sent = lib.submit_listener_statistics(statistics)
+        late = lib.submit_listener_statistics(statistics, timeout=0.1)
+        self.assertRaises(driver_exceptions.UpdateStatisticsError,
+                          late.result)
+        self.assertIsNone(sent.result())
+        self.assertEqual(3, len(agent.statistics))
+
+        stats = lib.lanes[lanes.STATS].stats()
+        del stats['max_queued']
+        self.assertEqual({'workers': 1, 'queued': 0, 'running': 0,
+                          'rejected': 3, 'completed': 4}, stats)
+        self.assertEqual(
+            [{'labels': {'lane': lanes.STATS}, 'value': 3}],
+            registry.snapshot()['counters'][metrics.LANE_REJECTED])
+
+        # Usable after close
+        lib.close()
+        self.assertEqual('m1', lib.get_member('m1').member_id)
+
+    @mock.patch('octavia_lib.api.drivers.driver_lib.DriverLibrary.'
+                '_check_for_socket_ready')
+    def test_lanes_status_ordered(self, mock_check_ready):
+        lib = driver_lib.DriverLibrary(lane_workers=4)
+        self.addCleanup(lib.close)
+
+        # Status updates are sent one at a time, in order
+        self.assertEqual(1, lib.lanes[lanes.STATUS].workers)
+        self.assertEqual(4, lib.lanes[lanes.STATS].workers)
+
+    def test_spool(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        agent = fake_driver_agent.FakeDriverAgent(
+            directory=os.path.join(tmp_dir.name, 'agent'))
+        os.mkdir(agent.directory)
+        agent.start()
+        self.addCleanup(agent.stop)
+        updates = spool.Spool(os.path.join(tmp_dir.name, 'spool'))
+        self.addCleanup(updates.close)
+        lib = driver_lib.DriverLibrary(**agent.socket_paths, spool=updates,
+                                       spool_retry_interval=0)
+        self.addCleanup(lib.close)
+
+        def status(provisioning_status):
+            return {constants.LOADBALANCERS: [
+                {constants.ID: 'lb1',
+                 constants.PROVISIONING_STATUS: provisioning_status}]}
+        statistics = {constants.LISTENERS: [
+            {constants.ID: 'listener1', constants.ACTIVE_CONNECTIONS: 1}]}
+
+        agent.stop()
+        # Spooled instead of failing
+        lib.update_loadbalancer_status(status(constants.PENDING_UPDATE))
+        lib.update_listener_statistics(statistics)
+        lib.update_loadbalancer_status(status(constants.ACTIVE))
+        # The first status is superseded
+        self.assertEqual(2, updates.pending())
+        self.assertEqual(0, lib.replay_spool())
+
+        agent.start()
+        self.assertEqual(2, lib.replay_spool())
+        self.assertEqual([status(constants.ACTIVE)], agent.status_updates)
+        self.assertEqual([statistics], agent.statistics)
+
+        # Spooled behind the update the agent did not take
+        agent.fail_next(fake_driver_agent.STATS, fake_driver_agent.CLOSE)
+        lib.update_listener_statistics(statistics)
+        self.assertEqual(1, updates.pending())
+        lib.update_loadbalancer_status(status(constants.ERROR))
+        self.assertEqual(0, updates.pending())
+        self.assertEqual([status(constants.ACTIVE), status(constants.ERROR)],
+                         agent.status_updates)
+        self.assertEqual([statistics, statistics], agent.statistics)
+
+        # Rejected updates are not spooled
+        agent.fail_next(fake_driver_agent.STATUS)
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status,
+                          status(constants.ACTIVE))
+        self.assertEqual(0, updates.pending())
+
+    def _spool_agent(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        agent = fake_driver_agent.FakeDriverAgent(
+            directory=os.path.join(tmp_dir.name, 'agent'))
+        os.mkdir(agent.directory)
+        agent.start()
+        self.addCleanup(agent.stop)
+        updates = spool.Spool(os.path.join(tmp_dir.name, 'spool'))
+        self.addCleanup(updates.close)
+        lib = driver_lib.DriverLibrary(**agent.socket_paths, spool=updates,
+                                       spool_retry_interval=0)
+        self.addCleanup(lib.close)
+        agent.stop()
+        return agent, updates, lib
+
+    def _lb_status(self, lb_id):
+        return {constants.LOADBALANCERS: [
+            {constants.ID: lb_id,
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}
+
+    def test_spool_replay_bounded(self):
+        agent, updates, lib = self._spool_agent()
+        for lb_id in ('lb1', 'lb2', 'lb3'):
+            updates.append(spool.STATUS, self._lb_status(lb_id))
+        agent.start()
+        agent.latency[fake_driver_agent.STATUS] = 0.3
+
+        # The replay is bounded by the timeout of the update replaying it
+        start = time.monotonic()
+        lib.update_loadbalancer_status(self._lb_status('lb4'), timeout=0.5)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual([self._lb_status('lb1')], agent.status_updates)
+        self.assertEqual(3, updates.pending())
+
+        agent.latency[fake_driver_agent.STATUS] = 0
+        self.assertEqual(3, lib.replay_spool())
+
+    def test_spool_error(self):
+        agent, updates, lib = self._spool_agent()
+
+        # Not retried as if the driver agent had failed
+        with mock.patch.object(updates, 'append',
+                               side_effect=OSError) as mock_append:
+            self.assertRaises(driver_exceptions.UpdateStatusError,
+                              lib.update_loadbalancer_status,
+                              self._lb_status('lb1'))
+            mock_append.assert_called_once()
+
+        updates.append(spool.STATUS, self._lb_status('lb1'))
+        with mock.patch.object(updates, 'append',
+                               side_effect=OSError) as mock_append:
+            self.assertRaises(driver_exceptions.UpdateStatusError,
+                              lib.update_loadbalancer_status,
+                              self._lb_status('lb2'))
+            mock_append.assert_called_once()
+
+    def _metrics_agent(self):
+        agent = fake_driver_agent.FakeDriverAgent().start()
+        self.addCleanup(agent.stop)
+        for id in ('m1', 'm2'):
+            agent.add_object(constants.MEMBERS, id, {'member_id': id})
+        return agent
+
+    def test_metrics(self):
+        agent = self._metrics_agent()
+        registry = metrics.MetricsRegistry()
+        calls = []
+        registry.add_hook(calls.append)
+        lib = driver_lib.DriverLibrary(**agent.socket_paths,
+                                       connection_pool_size=1,
+                                       metrics=registry)
+        self.addCleanup(lib.close)
+
+        self.assertEqual('m1', lib.get_member('m1').member_id)
+        lib.get_members(['m1', 'm2'])
+        lib.update_loadbalancer_status({})
+        # The pooled connection closed by the agent is replaced
+        agent.fail_next(fake_driver_agent.GET, fake_driver_agent.CLOSE)
+        lib.get_member('m2')
+        agent.fail_next(fake_driver_agent.GET)
+        self.assertRaises(driver_exceptions.DriverError, lib.get_member, 'm1')
+
+        self.assertEqual(
+            ['get', 'get_many', 'update_loadbalancer_status', 'get', 'get'],
+            [call.operation for call in calls])
+        self.assertEqual(constants.MEMBERS, calls[1].resource)
+        self.assertIsNone(calls[2].resource)
+        self.assertEqual({metrics.CONNECT, metrics.ENCODE, metrics.SEND,
+                          metrics.RECEIVE, metrics.DECODE},
+                         set(calls[0].phases))
+        self.assertGreater(calls[0].bytes_sent, 0)
+        self.assertGreater(calls[1].bytes_received, calls[0].bytes_received)
+        self.assertEqual(1, calls[3].retries)
+        self.assertIsNotNone(calls[4].error)
+
+        snapshot = registry.snapshot()
+        get = {'operation': 'get', 'resource': constants.MEMBERS}
+        self.assertIn({'labels': get, 'value': 3},
+                      snapshot['counters'][metrics.CALLS])
+        self.assertEqual([{'labels': get, 'value': 1}],
+                         snapshot['counters'][metrics.RETRIES])
+        self.assertEqual(['get'],
+                         [item['labels']['operation'] for item in
+                          snapshot['counters'][metrics.ERRORS]])
+        hydrated = [item for item in
+                    snapshot['histograms'][metrics.CALL_SECONDS]
+                    if item['labels']['phase'] == metrics.HYDRATE]
+        self.assertEqual({'get': 2, 'get_many': 1},
+                         {item['labels']['operation']: item['count']
+                          for item in hydrated})
+
+    def test_metrics_multiplexed(self):
+        agent = self._metrics_agent()
+        registry = metrics.MetricsRegistry()
+        lib = driver_lib.DriverLibrary(**agent.socket_paths, multiplex=True,
+                                       circuit_breaker_threshold=1,
+                                       metrics=registry)
+        self.addCleanup(lib.close)
+
+        lib.get_member('m1')
+        agent.fail_next(fake_driver_agent.STATUS, fake_driver_agent.HANG)
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status, {}, timeout=0.1)
+        # Failed fast by the open circuit breaker
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          lib.update_loadbalancer_status, {})
+
+        snapshot = registry.snapshot()
+        status = {'operation': 'update_loadbalancer_status'}
+        self.assertEqual(
+            [{'labels': {'error': 'DriverAgentTimeout', **status},
+              'value': 2}],
+            snapshot['counters'][metrics.ERRORS])
+        self.assertEqual(
+            {('get', metrics.TOTAL), ('get', metrics.HYDRATE),
+             ('update_loadbalancer_status', metrics.TOTAL)},
+            {(item['labels']['operation'], item['labels']['phase'])
+             for item in snapshot['histograms'][metrics.CALL_SECONDS]})
+
+
+class TestDriverLibConcurrency(base.TestCase):
+    """Hammers a shared DriverLibrary from threads and forked processes."""
+
+    THREADS = 8
+    CALLS = 25
+
+    def setUp(self):
+        super().setUp()
+        self.agent = fake_driver_agent.FakeDriverAgent().start()
+        self.addCleanup(self.agent.stop)
+        for prefix in ['parent'] + ['child{}'.format(i) for i in range(4)]:
+            for id in self._ids(prefix):
+                self.agent.add_object(constants.LOADBALANCERS, id,
+                                      {'loadbalancer_id': id})
+
+    def _ids(self, prefix, thread=None):
+        threads = range(self.THREADS) if thread is None else [thread]
+        return ['{}-{}-{}'.format(prefix, thread, call)
+                for thread in threads for call in range(self.CALLS)]
+
+    def _hammer(self, lib, prefix):
+        """Return the mismatched or failed calls."""
+        def run(thread):
+            errors = []
+            for id in self._ids(prefix, thread):
+                try:
+                    loadbalancer = lib.get_loadbalancer(id)
+                    lib.update_loadbalancer_status(
+                        {constants.LOADBALANCERS: [{constants.ID: id}]})
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if loadbalancer.loadbalancer_id != id:
+                    errors.append((id, loadbalancer.loadbalancer_id))
+            return errors
+
+        with futures.ThreadPoolExecutor(self.THREADS) as executor:
+            return sum(executor.map(run, range(self.THREADS)), [])
+
+    def _fork_hammer(self, lib, processes):
+        pids = []
+        for i in range(processes):
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    if not self._hammer(lib, 'child{}'.format(i)):
+                        code = 0
+                finally:
+                    os._exit(code)
+            pids.append(pid)
+        # The parent keeps using the connections the children inherited.
+        errors = self._hammer(lib, 'parent')
+        codes = [os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+                 for pid in pids]
+        return errors, codes
+
+    def test_threads(self):
+        for kwargs in ({}, {'connection_pool_size': 4}, {'multiplex': True},
+                       {'cache_size': 1000, 'circuit_breaker_threshold': 3,
+                        'adaptive_timeout': True}):
+            lib = driver_lib.DriverLibrary(**self.agent.socket_paths,
+                                           **kwargs)
+            self.addCleanup(lib.close)
+
+            self.assertEqual([], self._hammer(lib, 'parent'))
+
+    def test_fork(self):
+        for kwargs in ({'connection_pool_size': 4}, {'multiplex': True}):
+            lib = driver_lib.DriverLibrary(**self.agent.socket_paths,
+                                           **kwargs)
+            self.addCleanup(lib.close)
+            # Opens the connections the children inherit
+            lib.get_loadbalancer('parent-0-0')
+            lib.update_loadbalancer_status({})
+            del self.agent.status_updates[:]
+
+            errors, codes = self._fork_hammer(lib, processes=4)
+
+            self.assertEqual([], errors)
+            self.assertEqual([0, 0, 0, 0], codes)
+            self.assertEqual(5 * self.THREADS * self.CALLS,
+                             len(self.agent.status_updates))
+            del self.agent.status_updates[:]
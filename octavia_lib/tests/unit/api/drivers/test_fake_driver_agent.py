@@ -0,0 +1,162 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import tempfile
+import time
+
+from octavia_lib.api.drivers import data_models
+from octavia_lib.api.drivers import driver_lib
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.common import constants
+from octavia_lib.tests import fake_driver_agent
+from octavia_lib.tests.unit import base
+
+
+class TestFakeDriverAgent(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.agent = fake_driver_agent.FakeDriverAgent().start()
+        self.addCleanup(self.agent.stop)
+
+    def _lib(self, **kwargs):
+        lib = driver_lib.DriverLibrary(**self.agent.socket_paths, **kwargs)
+        self.addCleanup(lib.close)
+        return lib
+
+    def test_get(self):
+        self.agent.add_object(constants.LOADBALANCERS, 'lb1',
+                              {'loadbalancer_id': 'lb1', 'name': 'one'})
+        self.agent.add_object(constants.MEMBERS, 'm1',
+                              data_models.Member(member_id='m1', weight=5))
+        lib = self._lib()
+
+        self.assertEqual(data_models.LoadBalancer(loadbalancer_id='lb1',
+                                                  name='one'),
+                         lib.get_loadbalancer('lb1'))
+        self.assertEqual(5, lib.get_member('m1').weight)
+        self.assertIsNone(lib.get_listener('bogus'))
+        self.assertEqual(3, self.agent.requests[fake_driver_agent.GET])
+
+    def test_bulk_get(self):
+        for id in ('m1', 'm2'):
+            self.agent.add_object(constants.MEMBERS, id, {'member_id': id})
+        lib = self._lib()
+
+        members = lib.get_members(['m2', 'bogus', 'm1'])
+
+        self.assertEqual(['m2', None, 'm1'],
+                         [member and member.member_id for member in members])
+        self.agent.bulk_get = False
+        self.assertRaises(driver_exceptions.DriverError, lib.get_members,
+                          ['m1'])
+
+    def test_status_and_statistics(self):
+        status = {constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}
+        statistics = {constants.LISTENERS: [
+            {constants.ID: 'listener1', constants.ACTIVE_CONNECTIONS: 1}]}
+        lib = self._lib()
+
+        lib.update_loadbalancer_status(status)
+        lib.update_listener_statistics(statistics)
+
+        self.assertEqual([status], self.agent.status_updates)
+        self.assertEqual([statistics], self.agent.statistics)
+        self.assertEqual(
+            {'lb1': {constants.PROVISIONING_STATUS: constants.ACTIVE}},
+            self.agent.statuses[constants.LOADBALANCERS])
+
+        self.agent.record = False
+        lib.update_loadbalancer_status(status)
+        self.assertEqual(1, len(self.agent.status_updates))
+
+    def test_negotiation(self):
+        self.agent.compression_threshold = 64
+        self.agent.add_object(constants.POOLS, 'pool1',
+                              {'pool_id': 'pool1', 'description': 'x' * 1000})
+        lib = self._lib(codecs=['msgpack', 'json'], compression_threshold=64,
+                        connection_pool_size=1)
+
+        for _ in range(3):
+            self.assertEqual('x' * 1000, lib.get_pool('pool1').description)
+
+        # One connection, negotiated once
+        self.assertEqual(1, self.agent.connections[fake_driver_agent.GET])
+
+    def test_multiplex(self):
+        self.agent.latency[fake_driver_agent.GET] = 0.2
+        for i in range(10):
+            self.agent.add_object(constants.MEMBERS, str(i),
+                                  {'member_id': str(i)})
+        lib = self._lib(multiplex=True)
+
+        start = time.monotonic()
+        pending = [lib.submit_get(constants.MEMBERS, str(i))
+                   for i in range(10)]
+        members = [future.result() for future in pending]
+
+        # Answered concurrently
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual([str(i) for i in range(10)],
+                         [member.member_id for member in members])
+
+    def test_latency(self):
+        self.agent.latency[fake_driver_agent.STATUS] = 0.2
+        lib = self._lib()
+
+        start = time.monotonic()
+        lib.update_loadbalancer_status({})
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_failures(self):
+        self.agent.add_object(constants.LOADBALANCERS, 'lb1',
+                              {'loadbalancer_id': 'lb1'})
+        lib = self._lib()
+
+        self.agent.fail_next(fake_driver_agent.STATUS, count=2)
+        self.agent.fail_next(fake_driver_agent.STATUS,
+                             fake_driver_agent.CLOSE)
+        for _ in range(3):
+            self.assertRaises(driver_exceptions.UpdateStatusError,
+                              lib.update_loadbalancer_status, {})
+        lib.update_loadbalancer_status({})
+
+        self.agent.fail_next(fake_driver_agent.STATS)
+        self.assertRaises(driver_exceptions.UpdateStatisticsError,
+                          lib.update_listener_statistics, {})
+
+        self.agent.fail_next(fake_driver_agent.GET)
+        self.agent.fail_next(fake_driver_agent.GET, fake_driver_agent.HANG)
+        self.assertRaises(driver_exceptions.DriverError,
+                          lib.get_loadbalancer, 'lb1')
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          lib.get_loadbalancer, 'lb1', timeout=0.2)
+        self.assertEqual('lb1', lib.get_loadbalancer('lb1').loadbalancer_id)
+
+        self.assertEqual([{}], self.agent.status_updates)
+        self.assertRaises(ValueError, self.agent.fail_next, 'bogus')
+        self.assertRaises(ValueError, self.agent.fail_next,
+                          fake_driver_agent.GET, 'bogus')
+
+    def test_directory(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        with fake_driver_agent.FakeDriverAgent(tmp_dir.name) as agent:
+            self.assertEqual(os.path.join(tmp_dir.name, 'get.sock'),
+                             agent.get_socket)
+            self.assertTrue(os.path.exists(agent.get_socket))
+
+        self.assertEqual([], os.listdir(tmp_dir.name))
@@ -0,0 +1,213 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import socket
+import threading
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.tests.unit import base
+
+
+class TestFraming(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.local, self.remote = socket.socketpair()
+        self.local.settimeout(5)
+        self.remote.settimeout(5)
+        self.addCleanup(self.local.close)
+        self.addCleanup(self.remote.close)
+
+    def test_encode_header(self):
+        self.assertEqual(b'0\n', framing.encode_header(0))
+        self.assertEqual(b'1234\n', framing.encode_header(1234))
+        self.assertEqual(b'12 id=7 z=1\n',
+                         framing.encode_header(12, {'id': 7, 'z': '1'}))
+
+    def test_decode_header(self):
+        self.assertEqual((12, {}), framing.decode_header(b'12'))
+        self.assertEqual((12, {'id': '7', 'z': ''}),
+                         framing.decode_header(b'12 id=7 z='))
+        self.assertRaises(ValueError, framing.decode_header, b'12 id')
+        self.assertRaises(ValueError, framing.decode_header, b'x id=7')
+
+    def test_send_frame(self):
+        framing.send_frame(self.local, b'"test data"')
+
+        self.assertEqual(b'11\n"test data"', self.remote.recv(100))
+
+    def test_send_frame_short_write(self):
+        mock_socket = mock.MagicMock()
+
+        mock_socket.sendmsg.return_value = 1
+        framing.send_frame(mock_socket, b'"test data"')
+        mock_socket.sendall.assert_has_calls([mock.call(b'1\n'),
+                                              mock.call(b'"test data"')])
+
+        mock_socket.reset_mock()
+        mock_socket.sendmsg.return_value = 5
+        framing.send_frame(mock_socket, b'"test data"')
+        mock_socket.sendall.assert_called_once_with(mock.ANY)
+        self.assertEqual(b'est data"',
+                         bytes(mock_socket.sendall.call_args[0][0]))
+
+    def test_recv_frame(self):
+        self.remote.sendall(b'11\n"test data"')
+
+        self.assertEqual(b'"test data"', framing.recv_frame(self.local, 30))
+
+    def test_recv_frame_with_fields(self):
+        framing.send_frame(self.remote, b'"test data"', {'id': 3})
+        self.remote.sendall(b'2\n{}')
+
+        self.assertEqual(({'id': '3'}, b'"test data"'),
+                         framing.recv_frame_with_fields(self.local, 30))
+        self.assertEqual(({}, b'{}'),
+                         framing.recv_frame_with_fields(self.local, 30))
+
+    def test_recv_frame_compressed(self):
+        # Compresses to more than one chunk
+        payload = os.urandom(framing.CHUNK_SIZE).hex().encode()
+        compressed, fields = framing.compress(payload, {'id': 3})
+        self.assertEqual({'id': 3, 'z': 1}, fields)
+        self.assertGreater(len(compressed), framing.CHUNK_SIZE)
+        self.assertLess(len(compressed), len(payload))
+
+        def send():
+            framing.send_frame(self.remote, compressed, fields)
+            framing.send_frame(self.remote, b'{}')
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        self.addCleanup(sender.join)
+
+        self.assertEqual(({'id': '3', 'z': '1'}, payload),
+                         framing.recv_frame_with_fields(self.local, 30))
+        self.assertEqual(b'{}', framing.recv_frame(self.local, 30))
+
+    def test_recv_frame_compressed_invalid(self):
+        framing.send_frame(self.remote, b'bogus', {'z': 1})
+        self.assertRaises(ValueError, framing.recv_frame, self.local, 30)
+
+        # Truncated compressed stream
+        compressed, fields = framing.compress(b'test data')
+        framing.send_frame(self.remote, compressed[:-4], fields)
+        self.assertRaises(ValueError, framing.recv_frame, self.local, 30)
+
+    def test_iter_frame(self):
+        payload = b'x' * (framing.CHUNK_SIZE * 2 + 1)
+        compressed, fields = framing.compress(payload)
+
+        def send():
+            framing.send_frame(self.remote, payload)
+            framing.send_frame(self.remote, compressed, fields)
+            framing.send_frame(self.remote, b'{}')
+
+        sender = threading.Thread(target=send)
+        sender.start()
+        self.addCleanup(sender.join)
+
+        for expected in (payload, payload, b'{}'):
+            chunks = [bytes(chunk)
+                      for chunk in framing.iter_frame(self.local, 30)]
+            self.assertEqual(expected, b''.join(chunks))
+            self.assertLessEqual(max(len(chunk) for chunk in chunks),
+                                 framing.CHUNK_SIZE)
+
+    def test_iter_frame_empty_payload(self):
+        self.remote.sendall(b'0\n')
+
+        self.assertEqual([], list(framing.iter_frame(self.local, 30)))
+
+    def test_recv_frame_leaves_next_frame(self):
+        self.remote.sendall(b'3\nabc4\ndefg')
+
+        self.assertEqual(b'abc', framing.recv_frame(self.local, 30))
+        self.assertEqual(b'defg', framing.recv_frame(self.local, 30))
+
+    def test_recv_frame_empty_payload(self):
+        self.remote.sendall(b'0\n')
+
+        self.assertEqual(b'', framing.recv_frame(self.local, 30))
+
+    def test_recv_frame_large(self):
+        payload = b'x' * (framing.PEEK_SIZE * 10)
+        sender = threading.Thread(target=framing.send_frame,
+                                  args=(self.remote, payload))
+        sender.start()
+        self.addCleanup(sender.join)
+
+        self.assertEqual(payload, framing.recv_frame(self.local, 30))
+
+    def test_recv_frame_split_header(self):
+        mock_socket = mock.MagicMock()
+        mock_socket.recv.side_effect = [b'1', b'1\n"test data"']
+        mock_socket.recv_into.side_effect = [1, 13]
+
+        payload = framing.recv_frame(mock_socket, 30)
+
+        self.assertEqual(11, len(payload))
+        # The partial header is consumed, then the whole frame at once
+        self.assertEqual(1,
+                         len(mock_socket.recv_into.call_args_list[0][0][0]))
+        self.assertEqual(13,
+                         len(mock_socket.recv_into.call_args_list[1][0][0]))
+
+    def test_recv_frame_invalid_header(self):
+        self.remote.sendall(b'bogus\n')
+        self.assertRaises(ValueError, framing.recv_frame, self.local, 30)
+
+    def test_recv_frame_header_too_long(self):
+        self.remote.sendall(b'1' * (framing.MAX_HEADER_SIZE + 1))
+        self.assertRaises(ValueError, framing.recv_frame, self.local, 30)
+
+    def test_recv_frame_closed(self):
+        self.remote.sendall(b'11\n"test')
+        self.remote.close()
+
+        self.assertRaises(ConnectionResetError, framing.recv_frame,
+                          self.local, 30)
+
+    def test_recv_frame_closed_before_header(self):
+        self.remote.close()
+
+        self.assertRaises(ConnectionResetError, framing.recv_frame,
+                          self.local, 30)
+
+    @mock.patch('time.monotonic')
+    def test_recv_frame_timeout(self, mock_monotonic):
+        mock_socket = mock.MagicMock()
+
+        # Header timeout
+        mock_monotonic.side_effect = [0, 1, 1000]
+        mock_socket.recv.side_effect = [socket.timeout, socket.timeout]
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          framing.recv_frame, mock_socket, 30)
+
+        # Payload timeout
+        mock_monotonic.side_effect = [0, 1000]
+        mock_socket.recv.side_effect = [b'11\n"test']
+        mock_socket.recv_into.side_effect = [3, socket.timeout]
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          framing.recv_frame, mock_socket, 30)
+
+    def test_recv_frame_retries_after_socket_timeout(self):
+        mock_socket = mock.MagicMock()
+        mock_socket.recv.side_effect = [socket.timeout, b'2\n{}']
+        mock_socket.recv_into.side_effect = [socket.timeout, 4]
+
+        framing.recv_frame(mock_socket, 30)
+
+        self.assertEqual(2, mock_socket.recv.call_count)
+        self.assertEqual(2, mock_socket.recv_into.call_count)
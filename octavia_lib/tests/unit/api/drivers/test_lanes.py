@@ -0,0 +1,90 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import threading
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import lanes
+from octavia_lib.api.drivers import metrics
+from octavia_lib.tests.unit import base
+
+
+class TestLane(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.registry = metrics.MetricsRegistry()
+        self.lane = lanes.Lane(lanes.STATS, 2, queue_limit=1,
+                               metrics=self.registry)
+        self.addCleanup(self.lane.close)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _block(self, value):
+        self.release.wait(10)
+        return value
+
+    def test_submit(self):
+        self.assertEqual(3, self.lane.submit(sum, [1, 2]).result())
+        self.assertRaises(ZeroDivisionError,
+                          self.lane.submit(lambda: 1 / 0).result)
+
+        stats = self.lane.stats()
+        self.assertEqual({'workers': 2, 'queued': 0, 'running': 0,
+                          'rejected': 0, 'completed': 2},
+                         {key: value for key, value in stats.items()
+                          if key != 'max_queued'})
+
+    def test_queue_limit(self):
+        # Two running and one queued
+        running = [self.lane.submit(self._block, value) for value in (1, 2)]
+        queued = self.lane.submit(self._block, 3)
+
+        rejected = self.lane.submit(self._block, 4)
+
+        self.assertRaises(driver_exceptions.DriverAgentBusy, rejected.result)
+        self.assertEqual(1, self.lane.stats()['rejected'])
+        self.release.set()
+        self.assertEqual([1, 2, 3],
+                         [future.result() for future in running + [queued]])
+        stats = self.lane.stats()
+        self.assertEqual(3, stats['completed'])
+        self.assertEqual(0, stats['queued'] + stats['running'])
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual([{'labels': {'lane': lanes.STATS}, 'value': 1}],
+                         snapshot['counters'][metrics.LANE_REJECTED])
+        depth = snapshot['histograms'][metrics.LANE_QUEUE_DEPTH]
+        self.assertEqual([{'lane': lanes.STATS}],
+                         [item['labels'] for item in depth])
+        self.assertEqual(4, depth[0]['count'])
+        self.assertEqual(
+            3, snapshot['histograms'][metrics.LANE_WAIT_SECONDS][0]['count'])
+
+    def test_unlimited(self):
+        lane = lanes.Lane(lanes.GET, 1)
+        self.addCleanup(lane.close)
+        blocked = [lane.submit(self._block, value) for value in range(20)]
+
+        self.assertFalse(any(future.done() for future in blocked))
+        self.assertLessEqual(lane.stats()['running'], 1)
+        self.assertGreaterEqual(lane.stats()['max_queued'], 19)
+        self.release.set()
+        self.assertEqual(list(range(20)),
+                         [future.result() for future in blocked])
+
+    def test_close(self):
+        self.lane.close()
+        self.assertEqual(1, self.lane.submit(len, 'a').result())
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, lanes.Lane, lanes.GET, 0)
+        self.assertRaises(ValueError, lanes.Lane, lanes.GET, 1, -1)
@@ -0,0 +1,101 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest import mock
+
+from octavia_lib.api.drivers import metrics
+from octavia_lib.tests.unit import base
+
+
+class TestHistogram(base.TestCase):
+
+    def test_observe(self):
+        histogram = metrics.Histogram((1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+
+        self.assertEqual({'count': 4, 'sum': 56.5,
+                          'buckets': [[1, 2], [10, 3], ['+Inf', 4]]},
+                         histogram.snapshot())
+
+
+class TestMetricsRegistry(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.registry = metrics.MetricsRegistry(latency_buckets=(1,),
+                                                size_buckets=(100,))
+
+    def test_increment_and_observe(self):
+        self.registry.increment('hits', resource='members')
+        self.registry.increment('hits', 2, resource='members')
+        self.registry.increment('hits')
+        self.registry.observe('wait', 2, queue='status')
+
+        snapshot = self.registry.snapshot()
+
+        self.assertCountEqual([{'labels': {'resource': 'members'}, 'value': 3},
+                               {'labels': {}, 'value': 1}],
+                              snapshot['counters']['hits'])
+        self.assertEqual([{'labels': {'queue': 'status'}, 'count': 1,
+                           'sum': 2, 'buckets': [[1, 0], ['+Inf', 1]]}],
+                         snapshot['histograms']['wait'])
+
+        self.registry.reset()
+        self.assertEqual({'counters': {}, 'histograms': {}},
+                         self.registry.snapshot())
+
+    @mock.patch('time.perf_counter')
+    def test_finish_call(self, mock_perf_counter):
+        hook = mock.Mock()
+        self.registry.add_hook(hook)
+        mock_perf_counter.return_value = 10
+        call = self.registry.start_call('get', 'members')
+        mock_perf_counter.return_value = 10.5
+        start = call.timed(metrics.CONNECT, 10)
+        mock_perf_counter.return_value = 12
+        call.timed(metrics.RECEIVE, start)
+        call.bytes_sent = 50
+        call.bytes_received = 500
+        call.retries = 1
+        error = ValueError()
+
+        self.registry.finish_call(call, error)
+
+        hook.assert_called_once_with(call)
+        self.assertEqual(2, call.duration)
+        self.assertIs(error, call.error)
+        self.assertEqual({metrics.CONNECT: 0.5, metrics.RECEIVE: 1.5},
+                         call.phases)
+        snapshot = self.registry.snapshot()
+        labels = {'operation': 'get', 'resource': 'members'}
+        for name, value in ((metrics.CALLS, 1), (metrics.RETRIES, 1),
+                            (metrics.BYTES_SENT, 50),
+                            (metrics.BYTES_RECEIVED, 500)):
+            self.assertEqual([{'labels': labels, 'value': value}],
+                             snapshot['counters'][name])
+        self.assertEqual([{'labels': {'error': 'ValueError', **labels},
+                           'value': 1}],
+                         snapshot['counters'][metrics.ERRORS])
+        self.assertEqual(
+            {metrics.TOTAL: 2, metrics.CONNECT: 0.5, metrics.RECEIVE: 1.5},
+            {item['labels']['phase']: item['sum']
+             for item in snapshot['histograms'][metrics.CALL_SECONDS]})
+        self.assertEqual(
+            [[100, 0], ['+Inf', 1]],
+            snapshot['histograms'][metrics.RESPONSE_BYTES][0]['buckets'])
+
+        self.registry.remove_hook(hook)
+        self.registry.finish_call(self.registry.start_call('get_many'))
+        hook.assert_called_once()
+        # A successful call is no error
+        self.assertEqual(
+            1, len(self.registry.snapshot()['counters'][metrics.ERRORS]))
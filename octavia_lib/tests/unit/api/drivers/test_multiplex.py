@@ -0,0 +1,246 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from oslo_serialization import jsonutils
+
+from octavia_lib.api.drivers import codec
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import framing
+from octavia_lib.api.drivers import multiplex
+from octavia_lib.tests.unit import base
+
+
+class TestMultiplexedConnection(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.socket_path = os.path.join(tmp_dir.name, 'test.sock')
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(self.server.close)
+        self.server.bind(self.socket_path)
+        self.server.listen(1)
+
+    def _serve(self, handler):
+        """Run handler(conn) on the accepted connection in a thread."""
+        def run():
+            conn, _addr = self.server.accept()
+            with conn:
+                conn.settimeout(5)
+                handler(conn)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+
+    def _connect(self, request_timeout=5):
+        connection = multiplex.MultiplexedConnection(self.socket_path, 5,
+                                                     request_timeout)
+        self.addCleanup(connection.close)
+        return connection
+
+    @staticmethod
+    def _recv(conn):
+        fields, payload = framing.recv_frame_with_fields(conn, 5)
+        return fields, jsonutils.loads(bytes(payload))
+
+    @staticmethod
+    def _reply(conn, fields, response):
+        framing.send_frame(conn, jsonutils.dump_as_bytes(response), fields)
+
+    def test_out_of_order_responses(self):
+        done = threading.Event()
+
+        def handler(conn):
+            requests = [self._recv(conn) for i in range(3)]
+            for fields, request in reversed(requests):
+                self._reply(conn, fields, {'echo': request})
+            done.wait(5)
+
+        self._serve(handler)
+        connection = self._connect()
+
+        futures = [connection.request(i) for i in range(3)]
+
+        self.assertEqual([{'echo': 0}, {'echo': 1}, {'echo': 2}],
+                         [future.result(5) for future in futures])
+        self.assertFalse(connection.closed())
+        done.set()
+
+    def test_negotiated_wire_format(self):
+        received = []
+
+        def handler(conn):
+            received.append(self._recv(conn))
+            self._reply(conn, None, {'hello': {'version': 1,
+                                               'codec': 'msgpack',
+                                               'compression': 'zlib'}})
+            fields, payload = framing.recv_frame_with_fields(conn, 5)
+            received.append(fields)
+            # Echo it back uncompressed
+            framing.send_frame(conn, payload, {'id': fields['id']})
+
+        self._serve(handler)
+        connection = multiplex.MultiplexedConnection(
+            self.socket_path, 5, 5, codecs=['msgpack'],
+            compression_threshold=100)
+        self.addCleanup(connection.close)
+
+        self.assertIs(codec.MSGPACK, connection.wire_format.codec)
+        self.assertEqual('x' * 200,
+                         connection.request('x' * 200).result(5))
+        self.assertEqual(({}, {'hello': {'versions': [1],
+                                         'codecs': ['msgpack'],
+                                         'compression': ['zlib']}}),
+                         received[0])
+        self.assertEqual({'id': '0', 'z': '1'}, received[1])
+
+    def test_timeout(self):
+        done = threading.Event()
+        finished = threading.Event()
+
+        def handler(conn):
+            first = self._recv(conn)
+            second = self._recv(conn)
+            # Answer the second request only, then the first one too late
+            self._reply(conn, second[0], 'second')
+            done.wait(5)
+            self._reply(conn, first[0], 'first')
+            third = self._recv(conn)
+            self._reply(conn, third[0], 'third')
+            finished.wait(5)
+
+        self._serve(handler)
+        connection = self._connect(request_timeout=0.5)
+
+        first = connection.request('first')
+        second = connection.request('second')
+
+        self.assertEqual('second', second.result(5))
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          first.result, 5)
+        done.set()
+        # The late response is dropped and the connection still works
+        self.assertEqual('third', connection.request('third').result(5))
+        self.assertFalse(connection.closed())
+        finished.set()
+
+    def test_request_timeout(self):
+        done = threading.Event()
+
+        def handler(conn):
+            slow = self._recv(conn)
+            self._recv(conn)
+            done.wait(5)
+            self._reply(conn, slow[0], 'slow')
+
+        self._serve(handler)
+        connection = self._connect()
+
+        slow = connection.request('slow')
+        # Expires long before the reader would otherwise wake up
+        fast = connection.request('fast', timeout=0.1)
+
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          fast.result, 2)
+        self.assertFalse(slow.done())
+        done.set()
+        self.assertEqual('slow', slow.result(5))
+
+    def test_connection_closed_by_agent(self):
+        def handler(conn):
+            self._recv(conn)
+
+        self._serve(handler)
+        connection = self._connect()
+
+        future = connection.request('test data')
+
+        self.assertRaises(ConnectionResetError, future.result, 5)
+        self.assertTrue(connection.closed())
+        self.assertRaises(ConnectionResetError,
+                          connection.request('test data').result, 5)
+
+    def test_close(self):
+        done = threading.Event()
+
+        def handler(conn):
+            self._recv(conn)
+            done.wait(5)
+
+        self._serve(handler)
+        connection = self._connect()
+        future = connection.request('test data')
+
+        connection.close()
+        done.set()
+
+        self.assertRaises(ConnectionResetError, future.result, 5)
+        self.assertTrue(connection.closed())
+
+    def test_no_agent(self):
+        self.assertRaises(FileNotFoundError, multiplex.MultiplexedConnection,
+                          '/nonexistent/test.sock', 5, 5)
+
+    def test_message_type(self):
+        def handler(conn):
+            for _ in range(2):
+                fields, request = self._recv(conn)
+                self._reply(conn, fields,
+                            fields.get(multiplex.MESSAGE_TYPE, 'none'))
+
+        self._serve(handler)
+        connection = self._connect()
+
+        self.assertEqual(
+            multiplex.STATS,
+            connection.request({}, message_type=multiplex.STATS).result(5))
+        self.assertEqual('none', connection.request({}).result(5))
+
+
+class TestPriorityLock(base.TestCase):
+
+    def test_priority(self):
+        lock = multiplex.PriorityLock()
+        acquired = []
+
+        def waiter(priority):
+            lock.acquire(priority)
+            acquired.append(priority)
+            lock.release()
+
+        def wait_for_waiters(priority):
+            for _ in range(500):
+                with lock._condition:
+                    if lock._waiting[priority]:
+                        return
+                time.sleep(0.01)
+            self.fail('No waiter with priority {}'.format(priority))
+
+        lock.acquire()
+        threads = []
+        for priority in (1, 0):
+            thread = threading.Thread(target=waiter, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            wait_for_waiters(priority)
+        lock.release()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual([0, 1], acquired)
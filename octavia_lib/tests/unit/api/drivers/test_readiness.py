@@ -0,0 +1,101 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import readiness
+from octavia_lib.tests.unit import base
+
+
+class TestReadiness(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = tmp_dir.name
+        self.paths = [os.path.join(self.directory, name)
+                      for name in ('status.sock', 'stats.sock', 'get.sock')]
+
+    def _bind(self, path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        sock.bind(path)
+
+    def _bind_later(self, paths, delay=0.1):
+        def run():
+            time.sleep(delay)
+            for path in paths:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._bind(path)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_already_there(self):
+        for path in self.paths:
+            self._bind(path)
+
+        readiness.wait_for_sockets(self.paths, 0)
+
+    @mock.patch('ctypes.CDLL')
+    @mock.patch('octavia_lib.api.drivers.readiness._libc', None)
+    def test_inotify_missing(self, mock_cdll):
+        mock_cdll.return_value = mock.Mock(spec=['inotify_init1'])
+        self.assertIsNone(readiness._inotify_libc())
+
+    def test_inotify(self):
+        if readiness._inotify_libc() is None:
+            self.skipTest('inotify is not available')
+        self._bind_later(self.paths)
+
+        # Polling would notice only after a whole second
+        with mock.patch('octavia_lib.api.drivers.readiness.POLL_INTERVAL',
+                        1):
+            start = time.monotonic()
+            readiness.wait_for_sockets(self.paths, 5)
+
+        self.assertLess(time.monotonic() - start, 0.9)
+        for path in self.paths:
+            self.assertTrue(os.path.exists(path))
+
+    def test_polling(self):
+        self._bind_later(self.paths)
+
+        readiness.wait_for_sockets(self.paths, 5, use_inotify=False)
+
+        for path in self.paths:
+            self.assertTrue(os.path.exists(path))
+
+    def test_missing_directory(self):
+        # Falls back to polling
+        paths = [os.path.join(self.directory, 'octavia', 'get.sock')]
+        self._bind_later(paths)
+
+        readiness.wait_for_sockets(paths, 5)
+
+        self.assertTrue(os.path.exists(paths[0]))
+
+    def test_timeout(self):
+        self._bind(self.paths[0])
+
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          readiness.wait_for_sockets, self.paths, 0.1)
+        self.assertRaises(driver_exceptions.DriverAgentNotFound,
+                          readiness.wait_for_sockets, self.paths, 0.1,
+                          use_inotify=False)
@@ -0,0 +1,111 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import collections
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import sharding
+from octavia_lib.tests.unit import base
+
+
+def _endpoints(count):
+    return [sharding.Endpoint('status{}'.format(i), 'stats{}'.format(i),
+                              'get{}'.format(i)) for i in range(count)]
+
+
+KEYS = ['lb-{}'.format(i) for i in range(1000)]
+
+
+class TestHashRing(base.TestCase):
+
+    def test_lookup(self):
+        endpoints = _endpoints(4)
+        ring = sharding.HashRing(endpoints)
+
+        owners = {key: ring.lookup(key) for key in KEYS}
+
+        # Independent of the endpoint order
+        self.assertEqual(
+            owners, {key: sharding.HashRing(endpoints[::-1]).lookup(key)
+                     for key in KEYS})
+        # Spread over every endpoint
+        counts = collections.Counter(owners.values())
+        self.assertEqual(set(endpoints), set(counts))
+        self.assertGreater(min(counts.values()), len(KEYS) / 4 / 2)
+
+        # Only the keys of a skipped endpoint move
+        moved = {key: ring.lookup(key, skip={endpoints[0]})
+                 for key in KEYS}
+        for key, owner in owners.items():
+            if owner == endpoints[0]:
+                self.assertNotEqual(endpoints[0], moved[key])
+            else:
+                self.assertEqual(owner, moved[key])
+
+        self.assertIsNone(ring.lookup('lb-1', skip=set(endpoints)))
+
+    def test_no_endpoints(self):
+        self.assertRaises(ValueError, sharding.HashRing, [])
+
+
+class TestShardRouter(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.endpoints = _endpoints(3)
+        self.router = sharding.ShardRouter(self.endpoints, down_interval=10)
+        self.key = 'lb-1'
+        self.owner = self.router.ring.lookup(self.key)
+
+    @mock.patch('time.monotonic')
+    def test_route(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.assertEqual(self.owner, self.router.route(self.key))
+
+        self.router.report(self.owner, driver_exceptions.DriverAgentTimeout())
+        other = self.router.route(self.key)
+        self.assertNotEqual(self.owner, other)
+        self.assertEqual({'state': sharding.DOWN, 'failures': 1},
+                         self.router.stats()[self.owner.status_socket])
+
+        # Back after down_interval
+        mock_monotonic.return_value = 110
+        self.assertEqual(self.owner, self.router.route(self.key))
+
+        self.router.report(self.owner, FileNotFoundError())
+        self.router.report(other, ConnectionRefusedError())
+        self.router.report(self.endpoints[0], ConnectionRefusedError())
+        self.router.report(self.endpoints[1], ConnectionRefusedError())
+        self.router.report(self.endpoints[2], ConnectionRefusedError())
+        # Every endpoint is down
+        self.assertEqual(self.owner, self.router.route(self.key))
+
+        self.router.report(self.owner)
+        self.assertEqual(sharding.UP,
+                         self.router.stats()[self.owner.status_socket][
+                             'state'])
+
+    def test_route_exclude(self):
+        other = self.router.route(self.key, exclude={self.owner})
+
+        self.assertNotEqual(self.owner, other)
+        self.assertEqual(self.owner,
+                         self.router.route(self.key,
+                                           exclude=set(self.endpoints)))
+
+    def test_report_answered(self):
+        # The driver agent answered
+        self.router.report(self.owner, driver_exceptions.DriverError())
+
+        self.assertEqual(self.owner, self.router.route(self.key))
+        self.assertEqual(0, self.router.stats()[self.owner.status_socket][
+            'failures'])
@@ -0,0 +1,217 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import tempfile
+
+from octavia_lib.api.drivers import spool
+from octavia_lib.common import constants
+from octavia_lib.tests.unit import base
+
+
+def _status(lb_status, listener_status=None):
+    status = {constants.LOADBALANCERS: [
+        {constants.ID: 'lb1', constants.PROVISIONING_STATUS: lb_status}]}
+    if listener_status:
+        status[constants.LISTENERS] = [
+            {constants.ID: 'listener1',
+             constants.PROVISIONING_STATUS: listener_status}]
+    return status
+
+
+STATISTICS = {constants.LISTENERS: [
+    {constants.ID: 'listener1', constants.ACTIVE_CONNECTIONS: 1}]}
+
+
+class TestSpool(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.directory = os.path.join(tmp_dir.name, 'spool')
+        self.sent = []
+
+    def _open(self, **kwargs):
+        kwargs.setdefault('segment_size', 512)
+        result = spool.Spool(self.directory, **kwargs)
+        self.addCleanup(result.close)
+        return result
+
+    def _send(self, kind, data, key):
+        self.sent.append((kind, data, key))
+        return True
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith(spool.SEGMENT_SUFFIX))
+
+    def test_replay(self):
+        updates = self._open()
+        updates.append(spool.STATUS, _status(constants.PENDING_UPDATE,
+                                             constants.PENDING_UPDATE),
+                       'lb1')
+        updates.append(spool.STATS, STATISTICS, 'lb1')
+        updates.append(spool.STATUS, _status(constants.ACTIVE), 'lb1')
+        self.assertEqual(3, updates.pending())
+
+        self.assertEqual(3, updates.replay(self._send))
+
+        # The load balancer status of the first update is superseded
+        self.assertEqual(
+            [(spool.STATUS, {constants.LISTENERS: [
+                {constants.ID: 'listener1',
+                 constants.PROVISIONING_STATUS: constants.PENDING_UPDATE}]},
+              'lb1'),
+             (spool.STATS, STATISTICS, 'lb1'),
+             (spool.STATUS, _status(constants.ACTIVE), 'lb1')], self.sent)
+        self.assertEqual({'pending': 0, 'segments': 0, 'bytes': 0,
+                          'appended': 3, 'replayed': 3, 'superseded': 1,
+                          'dropped': 0}, updates.stats())
+        self.assertEqual([], self._segments())
+
+    def test_replay_fields(self):
+        updates = self._open()
+        updates.append(spool.STATUS, {constants.MEMBERS: [
+            {constants.ID: 'member1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE,
+             constants.OPERATING_STATUS: constants.OFFLINE},
+            {constants.ID: 'member2',
+             constants.OPERATING_STATUS: constants.OFFLINE}]}, 'lb1')
+        updates.append(spool.STATUS, {constants.MEMBERS: [
+            {constants.ID: 'member1',
+             constants.OPERATING_STATUS: constants.ONLINE},
+            {constants.ID: 'member2',
+             constants.OPERATING_STATUS: constants.ONLINE}]}, 'lb1')
+
+        updates.compact()
+        updates.replay(self._send)
+
+        # Only the fields set again later are superseded
+        self.assertEqual(
+            [{constants.MEMBERS: [
+                {constants.ID: 'member1',
+                 constants.PROVISIONING_STATUS: constants.ACTIVE}]},
+             {constants.MEMBERS: [
+                 {constants.ID: 'member1',
+                  constants.OPERATING_STATUS: constants.ONLINE},
+                 {constants.ID: 'member2',
+                  constants.OPERATING_STATUS: constants.ONLINE}]}],
+            [data for kind, data, key in self.sent])
+        self.assertEqual(2, updates.stats()['superseded'])
+
+    def test_replay_stops(self):
+        updates = self._open()
+        for state in (constants.PENDING_UPDATE, constants.ACTIVE):
+            updates.append(spool.STATUS, _status(state), 'lb1')
+        updates.append(spool.STATS, STATISTICS)
+
+        # A superseded update is not sent at all
+        self.assertEqual(0, updates.replay(lambda *args: False))
+        self.assertEqual(2, updates.pending())
+        self.assertEqual(1, updates.replay(
+            lambda kind, data, key: kind == spool.STATUS))
+        self.assertEqual(1, updates.pending())
+
+    def test_reopen(self):
+        updates = self._open()
+        for state in (constants.PENDING_CREATE, constants.PENDING_UPDATE,
+                      constants.ACTIVE):
+            updates.append(spool.STATUS, _status(state, state), 'lb1')
+            updates.append(spool.STATS, STATISTICS, 'lb1')
+        # The first two status updates are superseded, the statistics are
+        # sent and the last status update is not
+        sent = iter([True, True, False])
+        updates.replay(lambda *args: next(sent))
+        updates.close()
+
+        # A crash tore the last update
+        path = os.path.join(self.directory, self._segments()[-1])
+        with open(path, 'r+b') as f:
+            data = f.read()
+            f.seek(len(data.rstrip(b'\x00')) - 1)
+            f.write(b'\x00')
+        updates = self._open()
+
+        self.assertEqual(1, updates.pending())
+        updates.replay(self._send)
+        self.assertEqual([_status(constants.ACTIVE, constants.ACTIVE)],
+                         [data for kind, data, key in self.sent])
+        updates.append(spool.STATS, STATISTICS)
+        self.assertEqual(1, updates.pending())
+
+    def test_compact(self):
+        updates = self._open()
+        for index in range(10):
+            updates.append(spool.STATUS, _status('state{}'.format(index)),
+                           'lb1')
+        updates.append(spool.STATS, STATISTICS, 'lb1')
+        self.assertGreater(updates.stats()['segments'], 1)
+
+        updates.compact()
+
+        self.assertEqual(2, updates.pending())
+        self.assertEqual(1, updates.stats()['segments'])
+        self.assertEqual(1, len(self._segments()))
+        updates.close()
+        updates = self._open()
+        updates.replay(self._send)
+        self.assertEqual([_status('state9'), STATISTICS],
+                         [data for kind, data, key in self.sent])
+
+    def test_max_bytes(self):
+        updates = self._open(max_bytes=1024)
+        for index in range(30):
+            updates.append(spool.STATS, {constants.LISTENERS: [
+                {constants.ID: 'listener1',
+                 constants.ACTIVE_CONNECTIONS: index}]}, 'lb1')
+
+        stats = updates.stats()
+        self.assertLessEqual(stats['bytes'], 1024)
+        self.assertGreater(stats['dropped'], 0)
+        self.assertEqual(30, stats['pending'] + stats['dropped'])
+        updates.replay(self._send)
+        # The oldest updates were dropped
+        self.assertEqual(
+            list(range(stats['dropped'], 30)),
+            [data[constants.LISTENERS][0][constants.ACTIVE_CONNECTIONS]
+             for kind, data, key in self.sent])
+
+        self.assertRaises(ValueError, updates.append, spool.STATS,
+                          {'data': 'x' * 2048})
+
+    def test_max_bytes_compacts(self):
+        updates = self._open(max_bytes=1024)
+        for index in range(30):
+            updates.append(spool.STATUS, _status('state{}'.format(index)),
+                           'lb1')
+
+        self.assertEqual(0, updates.stats()['dropped'])
+        updates.replay(self._send)
+        self.assertEqual([_status('state29')],
+                         [data for kind, data, key in self.sent])
+
+    def test_large_update(self):
+        updates = self._open()
+        updates.append(spool.STATS, {'data': 'x' * 2048}, 'lb1')
+
+        updates.replay(self._send)
+        self.assertEqual({'data': 'x' * 2048}, self.sent[0][1])
+
+    def test_locked(self):
+        self._open()
+        self.assertRaises(BlockingIOError, spool.Spool, self.directory)
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, spool.Spool, self.directory,
+                          segment_size=4)
+        self.assertRaises(ValueError, spool.Spool, self.directory,
+                          segment_size=1024, max_bytes=512)
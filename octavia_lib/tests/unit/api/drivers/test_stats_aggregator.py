@@ -0,0 +1,175 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import threading
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import stats_aggregator
+from octavia_lib.common import constants
+from octavia_lib.tests.unit import base
+
+
+def _stats(listener_id, active=1, bytes_in=10, bytes_out=20, errors=0,
+           total=5):
+    return {constants.ID: listener_id,
+            constants.ACTIVE_CONNECTIONS: active,
+            constants.BYTES_IN: bytes_in,
+            constants.BYTES_OUT: bytes_out,
+            constants.REQUEST_ERRORS: errors,
+            constants.TOTAL_CONNECTIONS: total}
+
+
+class TestListenerStatisticsAggregator(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.driver_lib = mock.MagicMock()
+
+    def _aggregator(self, **kwargs):
+        kwargs.setdefault('interval', None)
+        return stats_aggregator.ListenerStatisticsAggregator(self.driver_lib,
+                                                             **kwargs)
+
+    def test_cumulative(self):
+        aggregator = self._aggregator()
+        aggregator.add({constants.LISTENERS: [_stats('listener1'),
+                                              _stats('listener2')]})
+        aggregator.add({constants.LISTENERS: [
+            _stats('listener1', active=3, bytes_in=15, bytes_out=30,
+                   errors=1, total=7)]})
+        self.assertEqual(2, len(aggregator))
+
+        aggregator.flush()
+
+        self.driver_lib.update_listener_statistics.assert_called_once_with(
+            {constants.LISTENERS: [
+                _stats('listener1', active=3, bytes_in=15, bytes_out=30,
+                       errors=1, total=7),
+                _stats('listener2')]})
+        self.assertEqual(0, len(aggregator))
+
+        # Nothing left to send
+        self.driver_lib.reset_mock()
+        aggregator.flush()
+        self.driver_lib.update_listener_statistics.assert_not_called()
+
+    def test_deltas(self):
+        aggregator = self._aggregator(cumulative=False)
+        aggregator.add({constants.LISTENERS: [_stats('listener1')]})
+        aggregator.add({constants.LISTENERS: [
+            _stats('listener1', active=3, bytes_in=15, bytes_out=30,
+                   errors=1, total=7)]})
+        # Partial reports only touch the reported fields
+        aggregator.add({constants.LISTENERS: [
+            {constants.ID: 'listener1', constants.BYTES_IN: 5}]})
+
+        aggregator.flush()
+
+        self.driver_lib.update_listener_statistics.assert_called_once_with(
+            {constants.LISTENERS: [
+                _stats('listener1', active=3, bytes_in=30, bytes_out=50,
+                       errors=1, total=12)]})
+
+    def test_partial_first_report(self):
+        aggregator = self._aggregator()
+        aggregator.add({constants.LISTENERS: [
+            {constants.ID: 'listener1', constants.BYTES_IN: 5}]})
+
+        aggregator.flush()
+
+        self.driver_lib.update_listener_statistics.assert_called_once_with(
+            {constants.LISTENERS: [
+                _stats('listener1', active=0, bytes_in=5, bytes_out=0,
+                       total=0)]})
+
+    def test_none_and_float_values(self):
+        aggregator = self._aggregator(cumulative=False)
+        aggregator.add({constants.LISTENERS: [
+            _stats('listener1', active=None, bytes_in=10.7, errors=None),
+            _stats('listener2', bytes_out=None)]})
+        aggregator.add({constants.LISTENERS: [
+            _stats('listener1', active=2.0, bytes_in=None, bytes_out=0.5,
+                   errors=1.9)]})
+
+        aggregator.flush()
+
+        self.driver_lib.update_listener_statistics.assert_called_once_with(
+            {constants.LISTENERS: [
+                _stats('listener1', active=2, bytes_in=10, bytes_out=20,
+                       errors=1, total=10),
+                _stats('listener2', bytes_out=0)]})
+
+    def test_flush_error(self):
+        self.driver_lib.update_listener_statistics.side_effect = (
+            driver_exceptions.UpdateStatisticsError())
+        aggregator = self._aggregator()
+        aggregator.add({constants.LISTENERS: [_stats('listener1')]})
+
+        self.assertRaises(driver_exceptions.UpdateStatisticsError,
+                          aggregator.flush)
+
+    def test_interval_flush(self):
+        flushed = threading.Event()
+        self.driver_lib.update_listener_statistics.side_effect = (
+            lambda stats: flushed.set())
+        aggregator = self._aggregator(interval=0.01)
+        self.addCleanup(aggregator.close)
+
+        aggregator.add({constants.LISTENERS: [_stats('listener1')]})
+
+        self.assertTrue(flushed.wait(5))
+        self.driver_lib.update_listener_statistics.assert_called_once_with(
+            {constants.LISTENERS: [_stats('listener1')]})
+
+    def test_interval_flush_error_callback(self):
+        failed = threading.Event()
+        errors = []
+        error = driver_exceptions.UpdateStatisticsError()
+        self.driver_lib.update_listener_statistics.side_effect = error
+
+        def on_error(error, batch):
+            errors.append((error, batch))
+            failed.set()
+
+        aggregator = self._aggregator(interval=0.01, on_error=on_error)
+        aggregator.add({constants.LISTENERS: [_stats('listener1')]})
+
+        self.assertTrue(failed.wait(5))
+        aggregator.close()
+        self.assertEqual(
+            [(error, {constants.LISTENERS: [_stats('listener1')]})], errors)
+
+    def test_interval_flush_deferred_error(self):
+        failed = threading.Event()
+
+        def fail(stats):
+            failed.set()
+            raise driver_exceptions.UpdateStatisticsError()
+
+        self.driver_lib.update_listener_statistics.side_effect = fail
+        aggregator = self._aggregator(interval=0.01)
+        aggregator.add({constants.LISTENERS: [_stats('listener1')]})
+        self.assertTrue(failed.wait(5))
+
+        self.assertRaises(driver_exceptions.UpdateStatisticsError,
+                          aggregator.close)
+        aggregator.flush()
+
+    def test_close(self):
+        aggregator = self._aggregator()
+        aggregator.add({constants.LISTENERS: [_stats('listener1')]})
+
+        aggregator.close()
+
+        self.driver_lib.update_listener_statistics.assert_called_once()
+        self.assertRaises(driver_exceptions.UpdateStatisticsError,
+                          aggregator.add, {})
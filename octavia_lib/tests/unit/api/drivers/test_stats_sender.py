@@ -0,0 +1,146 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import threading
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import stats_sender
+from octavia_lib.tests.unit import base
+
+
+class TestBackgroundStatisticsSender(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.driver_lib = mock.MagicMock()
+        # Holds the sender thread inside update_listener_statistics
+        self.release = threading.Event()
+        self.sending = threading.Event()
+        self.sent = []
+
+        def update_listener_statistics(statistics):
+            self.sending.set()
+            self.release.wait(5)
+            self.sent.append(statistics)
+
+        self.driver_lib.update_listener_statistics.side_effect = (
+            update_listener_statistics)
+
+    def _sender(self, **kwargs):
+        sender = stats_sender.BackgroundStatisticsSender(self.driver_lib,
+                                                         **kwargs)
+        self.addCleanup(sender.close, 5)
+        self.addCleanup(self.release.set)
+        return sender
+
+    def test_invalid_arguments(self):
+        self.assertRaises(ValueError,
+                          stats_sender.BackgroundStatisticsSender,
+                          self.driver_lib, overflow_policy='bogus')
+        self.assertRaises(ValueError,
+                          stats_sender.BackgroundStatisticsSender,
+                          self.driver_lib, max_queue_size=0)
+
+    def test_submit(self):
+        sender = self._sender()
+        self.release.set()
+
+        self.assertTrue(sender.submit('stats1'))
+        self.assertTrue(sender.submit('stats2'))
+        self.assertTrue(sender.close(5))
+
+        self.assertEqual(['stats1', 'stats2'], self.sent)
+        self.assertEqual({'sent': 2, 'dropped': 0, 'failed': 0, 'queued': 0},
+                         sender.counters)
+        self.assertRaises(driver_exceptions.UpdateStatisticsError,
+                          sender.submit, 'stats3')
+
+    def _fill(self, sender):
+        # One update held by the sender thread, then a full queue
+        sender.submit('stats0')
+        self.assertTrue(self.sending.wait(5))
+        sender.submit('stats1')
+        sender.submit('stats2')
+
+    def test_drop_oldest(self):
+        sender = self._sender(max_queue_size=2)
+        self._fill(sender)
+
+        self.assertTrue(sender.submit('stats3'))
+        self.release.set()
+        sender.close(5)
+
+        self.assertEqual(['stats0', 'stats2', 'stats3'], self.sent)
+        self.assertEqual(1, sender.counters['dropped'])
+
+    def test_drop_newest(self):
+        sender = self._sender(
+            max_queue_size=2,
+            overflow_policy=stats_sender.OVERFLOW_DROP_NEWEST)
+        self._fill(sender)
+
+        self.assertFalse(sender.submit('stats3'))
+        self.release.set()
+        sender.close(5)
+
+        self.assertEqual(['stats0', 'stats1', 'stats2'], self.sent)
+        self.assertEqual(1, sender.counters['dropped'])
+
+    def test_block(self):
+        sender = self._sender(max_queue_size=2,
+                              overflow_policy=stats_sender.OVERFLOW_BLOCK)
+        self._fill(sender)
+
+        # Times out while the sender is stuck
+        self.assertFalse(sender.submit('stats3', timeout=0.01))
+        self.assertEqual(1, sender.counters['dropped'])
+
+        # Gets in once the sender makes progress
+        threading.Timer(0.01, self.release.set).start()
+        self.assertTrue(sender.submit('stats4', timeout=5))
+        sender.close(5)
+
+        self.assertEqual(['stats0', 'stats1', 'stats2', 'stats4'], self.sent)
+
+    def test_block_closed_while_waiting(self):
+        sender = self._sender(max_queue_size=2,
+                              overflow_policy=stats_sender.OVERFLOW_BLOCK)
+        self._fill(sender)
+        threading.Timer(0.05, sender.close, args=(0,)).start()
+
+        self.assertFalse(sender.submit('stats3'))
+        self.assertEqual(1, sender.counters['dropped'])
+
+    def test_failed(self):
+        errors = []
+        error = driver_exceptions.UpdateStatisticsError()
+        self.driver_lib.update_listener_statistics.side_effect = error
+        sender = self._sender(
+            on_error=lambda error, stats: errors.append((error, stats)))
+
+        sender.submit('stats1')
+        sender.close(5)
+
+        self.assertEqual([(error, 'stats1')], errors)
+        self.assertEqual({'sent': 0, 'dropped': 0, 'failed': 1, 'queued': 0},
+                         sender.counters)
+
+    def test_failed_without_callback(self):
+        self.driver_lib.update_listener_statistics.side_effect = (
+            driver_exceptions.UpdateStatisticsError())
+        sender = self._sender()
+
+        sender.submit('stats1')
+        sender.submit('stats2')
+        sender.close(5)
+
+        self.assertEqual(2, sender.counters['failed'])
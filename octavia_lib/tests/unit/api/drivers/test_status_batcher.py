@@ -0,0 +1,166 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import threading
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import status_batcher
+from octavia_lib.common import constants
+from octavia_lib.tests.unit import base
+
+
+class TestStatusBatcher(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.driver_lib = mock.MagicMock()
+        self.batcher = status_batcher.StatusBatcher(
+            self.driver_lib, max_objects=3, flush_interval=None)
+
+    def test_merge(self):
+        self.batcher.add({constants.LISTENERS: [
+            {constants.ID: 'listener1',
+             constants.PROVISIONING_STATUS: constants.PENDING_UPDATE}]})
+        self.batcher.add({constants.LISTENERS: [
+            {constants.ID: 'listener1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+        self.batcher.add({constants.LISTENERS: [
+            {constants.ID: 'listener1',
+             constants.OPERATING_STATUS: constants.ONLINE}],
+            constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+        self.driver_lib.update_loadbalancer_status.assert_not_called()
+
+        self.batcher.flush()
+
+        self.driver_lib.update_loadbalancer_status.assert_called_once_with({
+            constants.LISTENERS: [
+                {constants.ID: 'listener1',
+                 constants.PROVISIONING_STATUS: constants.ACTIVE,
+                 constants.OPERATING_STATUS: constants.ONLINE}],
+            constants.LOADBALANCERS: [
+                {constants.ID: 'lb1',
+                 constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+
+        # Nothing left to send
+        self.driver_lib.reset_mock()
+        self.batcher.flush()
+        self.driver_lib.update_loadbalancer_status.assert_not_called()
+
+    def test_add_does_not_keep_caller_dicts(self):
+        record = {constants.ID: 'member1',
+                  constants.OPERATING_STATUS: constants.ONLINE}
+        self.batcher.add({constants.MEMBERS: [record]})
+        self.batcher.add({constants.MEMBERS: [
+            {constants.ID: 'member1',
+             constants.OPERATING_STATUS: constants.ERROR}]})
+
+        self.assertEqual(constants.ONLINE, record[constants.OPERATING_STATUS])
+
+    def test_size_threshold(self):
+        self.batcher.add({constants.MEMBERS: [
+            {constants.ID: 'member1',
+             constants.OPERATING_STATUS: constants.ONLINE},
+            {constants.ID: 'member2',
+             constants.OPERATING_STATUS: constants.ONLINE}]})
+        self.driver_lib.update_loadbalancer_status.assert_not_called()
+
+        self.batcher.add({constants.POOLS: [
+            {constants.ID: 'pool1',
+             constants.OPERATING_STATUS: constants.ONLINE}]})
+
+        self.driver_lib.update_loadbalancer_status.assert_called_once()
+
+    def test_flush_error(self):
+        self.driver_lib.update_loadbalancer_status.side_effect = (
+            driver_exceptions.UpdateStatusError(status_object_id='lb1'))
+        self.batcher.add({constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+
+        error = self.assertRaises(driver_exceptions.UpdateStatusError,
+                                  self.batcher.flush)
+        self.assertEqual('lb1', error.status_object_id)
+
+    def test_interval_flush(self):
+        flushed = threading.Event()
+        self.driver_lib.update_loadbalancer_status.side_effect = (
+            lambda status: flushed.set())
+        batcher = status_batcher.StatusBatcher(
+            self.driver_lib, max_objects=100, flush_interval=0.01)
+        self.addCleanup(batcher.close)
+
+        batcher.add({constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+
+        self.assertTrue(flushed.wait(5))
+        # The flusher thread is reused for later updates
+        flushed.clear()
+        batcher.add({constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.OPERATING_STATUS: constants.ONLINE}]})
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual(2,
+                         self.driver_lib.update_loadbalancer_status.call_count)
+
+    def test_interval_flush_error_callback(self):
+        failed = threading.Event()
+        errors = []
+        error = driver_exceptions.UpdateStatusError()
+        self.driver_lib.update_loadbalancer_status.side_effect = error
+
+        def on_error(error, batch):
+            errors.append((error, batch))
+            failed.set()
+
+        batcher = status_batcher.StatusBatcher(
+            self.driver_lib, flush_interval=0.01, on_error=on_error)
+        status = {constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}
+        batcher.add(status)
+
+        self.assertTrue(failed.wait(5))
+        self.assertEqual([(error, status)], errors)
+        batcher.close()
+
+    def test_interval_flush_deferred_error(self):
+        failed = threading.Event()
+
+        def fail(status):
+            failed.set()
+            raise driver_exceptions.UpdateStatusError()
+
+        self.driver_lib.update_loadbalancer_status.side_effect = fail
+        batcher = status_batcher.StatusBatcher(self.driver_lib,
+                                               flush_interval=0.01)
+        batcher.add({constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+        self.assertTrue(failed.wait(5))
+
+        self.assertRaises(driver_exceptions.UpdateStatusError, batcher.close)
+        # Raised only once
+        batcher.flush()
+
+    def test_close(self):
+        self.batcher.add({constants.LOADBALANCERS: [
+            {constants.ID: 'lb1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]})
+
+        self.batcher.close()
+
+        self.driver_lib.update_loadbalancer_status.assert_called_once()
+        self.assertRaises(driver_exceptions.UpdateStatusError,
+                          self.batcher.add, {})
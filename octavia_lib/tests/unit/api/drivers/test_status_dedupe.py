@@ -0,0 +1,106 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest import mock
+
+from octavia_lib.api.drivers import status_dedupe
+from octavia_lib.common import constants
+from octavia_lib.tests.unit import base
+
+
+def _member(id, operating_status=constants.ONLINE, **fields):
+    return dict({constants.ID: id,
+                 constants.OPERATING_STATUS: operating_status}, **fields)
+
+
+class TestStatusDeduplicator(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.dedupe = status_dedupe.StatusDeduplicator(3)
+
+    def test_invalid_size(self):
+        self.assertRaises(ValueError, status_dedupe.StatusDeduplicator, 0)
+
+    def test_filter(self):
+        status = {constants.MEMBERS: [_member('m1'), _member('m2')],
+                  constants.POOLS: [_member('p1')]}
+
+        self.assertEqual(status, self.dedupe.filter(status))
+        self.dedupe.sent(status)
+
+        self.assertEqual({}, self.dedupe.filter(status))
+        changed = {constants.MEMBERS: [_member('m1'),
+                                       _member('m2', constants.ERROR)],
+                   constants.POOLS: [_member('p1')]}
+        self.assertEqual({constants.MEMBERS: [_member('m2', constants.ERROR)]},
+                         self.dedupe.filter(changed))
+        # Not remembered until sent
+        self.assertEqual({constants.MEMBERS: [_member('m2', constants.ERROR)]},
+                         self.dedupe.filter(changed))
+        self.assertEqual({'sent': 3, 'suppressed': 7, 'size': 3},
+                         self.dedupe.stats())
+
+    def test_filter_partial_records(self):
+        self.dedupe.sent({constants.MEMBERS: [
+            _member('m1', **{constants.PROVISIONING_STATUS:
+                             constants.ACTIVE})]})
+        self.dedupe.sent({constants.MEMBERS: [_member('m1', constants.ERROR)]})
+
+        # Both fields are known, whichever update sent them
+        self.assertEqual({}, self.dedupe.filter({constants.MEMBERS: [
+            _member('m1', constants.ERROR,
+                    **{constants.PROVISIONING_STATUS: constants.ACTIVE})]}))
+        self.assertEqual({}, self.dedupe.filter({constants.MEMBERS: [
+            {constants.ID: 'm1',
+             constants.PROVISIONING_STATUS: constants.ACTIVE}]}))
+        new_field = {constants.MEMBERS: [
+            _member('m1', constants.ERROR, name='bogus')]}
+        self.assertEqual(new_field, self.dedupe.filter(new_field))
+
+    def test_filter_without_id(self):
+        status = {constants.MEMBERS: [{constants.OPERATING_STATUS:
+                                       constants.ONLINE}]}
+        self.dedupe.sent(status)
+
+        self.assertEqual(status, self.dedupe.filter(status))
+        self.assertEqual(0, self.dedupe.stats()['size'])
+
+    def test_bounded(self):
+        for id in ('m1', 'm2', 'm3', 'm4'):
+            self.dedupe.sent({constants.MEMBERS: [_member(id)]})
+
+        # The least recently sent was forgotten
+        self.assertEqual(
+            {constants.MEMBERS: [_member('m1')]},
+            self.dedupe.filter({constants.MEMBERS: [
+                _member(id) for id in ('m1', 'm2', 'm3', 'm4')]}))
+        self.assertEqual(3, self.dedupe.stats()['size'])
+
+    @mock.patch('time.monotonic')
+    def test_resync_interval(self, mock_monotonic):
+        dedupe = status_dedupe.StatusDeduplicator(10, resync_interval=60)
+        status = {constants.MEMBERS: [_member('m1')]}
+        mock_monotonic.return_value = 100
+        dedupe.sent(status)
+
+        mock_monotonic.return_value = 159
+        self.assertEqual({}, dedupe.filter(status))
+        mock_monotonic.return_value = 160
+        self.assertEqual(status, dedupe.filter(status))
+
+    def test_clear(self):
+        status = {constants.MEMBERS: [_member('m1')]}
+        self.dedupe.sent(status)
+
+        self.dedupe.clear()
+
+        self.assertEqual(status, self.dedupe.filter(status))
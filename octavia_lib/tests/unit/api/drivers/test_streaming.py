@@ -0,0 +1,126 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest import mock
+
+from oslo_serialization import jsonutils
+
+from octavia_lib.api.drivers import streaming
+from octavia_lib.tests.unit import base
+
+
+class TestStreaming(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.data = {
+            'loadbalancer_id': 'lb1', 'port': 8080,
+            'listeners': [{'listener_id': 'l1', 'name': 'a "}] é',
+                           'default_pool': {'members': [{'id': 'm0'}]}}],
+            'pools': [
+                {'pool_id': 'p1', 'members': [
+                    {'member_id': 'm%d' % i, 'weight': i * 1.5,
+                     'backup': False, 'tags': None, 'name': '€\U0001f600'}
+                    for i in range(20)]},
+                {'pool_id': 'p2', 'members': []},
+                {'pool_id': 'p3'},
+                {'pool_id': 'p4', 'members': [{'member_id': 'm20'}]}]}
+        self.members = [member for pool in self.data['pools']
+                        for member in pool.get('members', [])]
+        self.payload = jsonutils.dump_as_bytes(self.data)
+
+    def _chunks(self, payload, size):
+        return (memoryview(payload[i:i + size])
+                for i in range(0, len(payload), size))
+
+    def test_iter_json(self):
+        # Chunks split strings, numbers and UTF-8 sequences
+        for size in (1, 2, 7, 64, len(self.payload)):
+            self.assertEqual(self.members, list(streaming.iter_json(
+                self._chunks(self.payload, size), ('pools', 'members'))))
+            self.assertEqual([8080], list(streaming.iter_json(
+                self._chunks(self.payload, size), ('port',))))
+            self.assertEqual([self.data], list(streaming.iter_json(
+                self._chunks(self.payload, size))))
+            self.assertEqual([{'id': 'm0'}], list(streaming.iter_json(
+                self._chunks(self.payload, size),
+                ('listeners', 'default_pool', 'members'))))
+
+    def test_iter_json_list(self):
+        payload = b' [{"id": 1}, {}, null, [2]] '
+
+        self.assertEqual([{'id': 1}, {}, None, [2]],
+                         list(streaming.iter_json(self._chunks(payload, 3))))
+        self.assertEqual([], list(streaming.iter_json([b'[]'])))
+        self.assertEqual([], list(streaming.iter_json([b'{}'], ('pools',))))
+        self.assertEqual([], list(streaming.iter_json([b'"x"'], ('pools',))))
+
+    def test_iter_json_is_incremental(self):
+        def chunks():
+            yield b'{"members": [{"id": 1}, '
+            # The first member is handed out before the rest arrives
+            self.assertEqual([{'id': 1}], received)
+            yield b'{"id": 2}]}'
+
+        received = []
+        for member in streaming.iter_json(chunks(), ('members',)):
+            received.append(member)
+
+        self.assertEqual([{'id': 1}, {'id': 2}], received)
+
+    def test_iter_json_large_values(self):
+        name = 'x\\"' * (256 * 1024)
+        data = {'skipped': name, 'pools': [{'name': name}]}
+        payload = jsonutils.dump_as_bytes(data)
+        copied = []
+        more = streaming._JSONStream.more
+
+        def counting_more(stream):
+            result = more(stream)
+            copied.append(len(stream.text))
+            return result
+
+        with mock.patch.object(streaming._JSONStream, 'more',
+                               counting_more):
+            self.assertEqual([data['pools'][0]], list(streaming.iter_json(
+                self._chunks(payload, 65536), ('pools',))))
+
+        # The text of the values is copied a bounded number of times
+        self.assertLess(sum(copied), 4 * len(payload))
+
+    def test_iter_json_split_numbers(self):
+        payload = b'{"a": -2.5e-3, "b": [10, 1E+2], "c": 0.25}'
+
+        # Cut at every position, after a sign, a dot or an exponent too
+        for index in range(1, len(payload)):
+            chunks = [payload[:index], payload[index:]]
+            self.assertEqual([-2.5e-3], list(streaming.iter_json(
+                iter(chunks), ('a',))))
+            self.assertEqual([10, 100.0], list(streaming.iter_json(
+                iter(chunks), ('b',))))
+            self.assertEqual([0.25], list(streaming.iter_json(
+                iter(chunks), ('c',))))
+        self.assertEqual([-2.5], list(streaming.iter_json(
+            [b'-2.', b'5'])))
+
+    def test_iter_json_invalid(self):
+        for payload in (b'', b'{"a": [1, 2}', b'{"a" 1}', b'[1 2]',
+                        b'{"pools": [', b'{} x', b'{"a": tru}'):
+            self.assertRaises(ValueError, list, streaming.iter_json(
+                self._chunks(payload, 2), ('pools', 'members')))
+
+    def test_iter_decoded(self):
+        self.assertEqual(self.members, list(streaming.iter_decoded(
+            self.data, ('pools', 'members'))))
+        self.assertEqual([self.data],
+                         list(streaming.iter_decoded(self.data)))
+        self.assertEqual([1, 2], list(streaming.iter_decoded([1, 2])))
+        self.assertEqual([], list(streaming.iter_decoded('x', ('pools',))))
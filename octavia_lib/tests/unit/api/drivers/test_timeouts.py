@@ -0,0 +1,86 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from unittest import mock
+
+from octavia_lib.api.drivers import exceptions as driver_exceptions
+from octavia_lib.api.drivers import timeouts
+from octavia_lib.tests.unit import base
+
+
+class TestDeadline(base.TestCase):
+
+    @mock.patch('time.monotonic')
+    def test_deadline(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        deadline = timeouts.Deadline(10)
+
+        mock_monotonic.return_value = 104
+        self.assertEqual(6, deadline.remaining())
+        self.assertEqual(5, deadline.socket_timeout(5))
+        mock_monotonic.return_value = 108
+        self.assertEqual(2, deadline.socket_timeout(5))
+
+        mock_monotonic.return_value = 110
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          deadline.remaining)
+        self.assertRaises(driver_exceptions.DriverAgentTimeout,
+                          deadline.socket_timeout, 5)
+
+
+class TestAdaptiveTimeout(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.adaptive = timeouts.AdaptiveTimeout(1, 30, warmup=3)
+
+    def test_invalid_bounds(self):
+        self.assertRaises(ValueError, timeouts.AdaptiveTimeout, 0, 30)
+        self.assertRaises(ValueError, timeouts.AdaptiveTimeout, 30, 1)
+
+    def test_warmup(self):
+        self.adaptive.observe(0.01)
+        self.adaptive.observe(0.01)
+        self.assertEqual(30, self.adaptive.timeout())
+
+        self.adaptive.observe(0.01)
+        self.assertEqual(1, self.adaptive.timeout())
+
+    def test_adapts(self):
+        for i in range(20):
+            self.adaptive.observe(2)
+        self.assertAlmostEqual(2, self.adaptive.latency)
+        # The deviation decays towards zero with steady latencies
+        self.assertLess(self.adaptive.timeout(), 2.1)
+        self.assertGreater(self.adaptive.timeout(), 2)
+
+        # Jittery latencies widen the margin
+        for i in range(20):
+            self.adaptive.observe(1 if i % 2 else 3)
+        self.assertGreater(self.adaptive.timeout(), 5)
+
+        for i in range(20):
+            self.adaptive.observe(100)
+        self.assertEqual(30, self.adaptive.timeout())
+
+    def test_timed_out(self):
+        for i in range(5):
+            self.adaptive.observe(2)
+        timeout = self.adaptive.timeout()
+
+        self.adaptive.timed_out()
+        self.assertAlmostEqual(timeout * 2, self.adaptive.timeout())
+        for i in range(10):
+            self.adaptive.timed_out()
+        self.assertEqual(30, self.adaptive.timeout())
+
+        self.adaptive.observe(2)
+        self.assertLess(self.adaptive.timeout(), timeout * 2)
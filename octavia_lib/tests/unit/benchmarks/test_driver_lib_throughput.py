@@ -0,0 +1,97 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import os
+import tempfile
+from unittest import mock
+
+from octavia_lib.tests.benchmarks import driver_lib_throughput
+from octavia_lib.tests.unit import base
+
+
+def _results(cases, mode='connect'):
+    return {'version': driver_lib_throughput.FORMAT_VERSION, 'mode': mode,
+            'results': {key: {'ops': 100, 'ops_per_sec': ops_per_sec,
+                              'p50_ms': p50_ms, 'p99_ms': p50_ms * 2}
+                        for key, (ops_per_sec, p50_ms) in cases.items()}}
+
+
+BASELINE = _results({'get a': (1000, 1.0), 'get b': (1000, 1.0),
+                     'get c': (1000, 1.0), 'get d': (1000, 1.0)})
+# Slower by the threshold exactly, fewer operations, a longer p50 and a
+# case the baseline does not have.
+CURRENT = _results({'get a': (800, 1.2), 'get b': (700, 1.0),
+                    'get c': (1000, 1.5), 'get e': (1, 100.0)})
+
+
+class TestDriverLibThroughput(base.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        print_patch = mock.patch('builtins.print')
+        self.mock_print = print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def _save(self, name, results):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(results, f)
+        return path
+
+    def test_compare(self):
+        lines, regressions = driver_lib_throughput.compare(BASELINE, CURRENT)
+
+        self.assertEqual(['get b', 'get c'], regressions)
+        self.assertEqual(3, len(lines))
+        self.assertFalse(lines[0].endswith('REGRESSION'))
+        self.assertTrue(lines[1].endswith('REGRESSION'))
+
+        lines, regressions = driver_lib_throughput.compare(
+            BASELINE, CURRENT, threshold=0.6)
+        self.assertEqual([], regressions)
+
+    def test_main_compare(self):
+        baseline = self._save('baseline.json', BASELINE)
+        current = self._save('current.json', CURRENT)
+
+        self.assertEqual(1, driver_lib_throughput.main(
+            ['--compare', baseline, current]))
+        self.mock_print.assert_called_with('2 regression(s) beyond 20%')
+        self.assertEqual(0, driver_lib_throughput.main(
+            ['--compare', baseline, current, '--threshold', '0.6']))
+        self.assertEqual(0, driver_lib_throughput.main(
+            ['--compare', baseline, baseline]))
+
+    @mock.patch('octavia_lib.tests.benchmarks.driver_lib_throughput.run')
+    def test_main_baseline(self, mock_run):
+        mock_run.return_value = CURRENT
+        baseline = self._save('baseline.json', BASELINE)
+        output = os.path.join(self.tmp_dir, 'output.json')
+
+        self.assertEqual(1, driver_lib_throughput.main(
+            ['--baseline', baseline, '--output', output, '--sizes', '1,2',
+             '--threads', '4']))
+
+        mock_run.assert_called_once_with([1, 2], [4], 1, 'connect')
+        with open(output, encoding='utf-8') as f:
+            self.assertEqual(CURRENT, json.load(f))
+        # Without a baseline nothing is compared
+        self.assertEqual(0, driver_lib_throughput.main([]))
+
+    def test_main_unsupported_format(self):
+        baseline = self._save('baseline.json', dict(BASELINE, version=0))
+
+        self.assertRaises(SystemExit, driver_lib_throughput.main,
+                          ['--compare', baseline, baseline])